@@ -0,0 +1,185 @@
+# ai_jobs.py (Trabajos de análisis IA reanudables con checkpoint por paso)
+#
+# Cada ejecución del análisis IA (VLM por gráfico + síntesis) se guarda como un
+# trabajo en CACHE_DIR/ai_jobs/<id>.json con su contexto, las rutas de las imágenes
+# (con hash del contenido para detectar cambios) y el resultado de cada paso en cuanto
+# termina. El id se deriva del contexto y las entradas: repetir el mismo análisis
+# reutiliza los pasos ya completados y solo repite los que fallaron o faltan.
+#
+# Uso:
+#   python ai_jobs.py list
+#   python ai_jobs.py show <id>
+#   python ai_jobs.py delete <id> | --done
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sys
+
+from app_cache import CACHE_DIR, load_json_cache, save_json_cache
+
+AI_JOBS_DIR = "ai_jobs"
+AI_JOB_VERSION = 1
+SYNTHESIS_STEP = "Synthesis"
+
+
+def is_failed_result(result):
+    """True si el resultado de un paso es un marcador ('[Error...', '[Síntesis no realizada]'...), vacío o no existe: se repite al reanudar."""
+    return not result or (isinstance(result, str) and result.startswith('['))
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec='seconds')
+
+
+def _fingerprint(path):
+    """Identifica una imagen por ruta absoluta y hash de su contenido (una imagen regenerada idéntica conserva el trabajo)."""
+    if not path: return None
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''): digest.update(block)
+        return {"path": os.path.abspath(path), "sha1": digest.hexdigest()}
+    except OSError: return {"path": os.path.abspath(path), "sha1": None}
+
+
+def job_id_for(session_context, graph_paths, models=None):
+    """Id determinista (16 hex) a partir del contexto, las imágenes y los modelos."""
+    key = {"context": session_context, "inputs": {g: _fingerprint(p) for g, p in sorted(graph_paths.items())}, "models": models or {}}
+    return hashlib.sha1(json.dumps(key, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+
+
+class AIJob:
+    """Registro persistente de un análisis IA; cada paso se guarda (escritura atómica) al completarse."""
+
+    def __init__(self, record):
+        self.record = record
+
+    @property
+    def job_id(self): return self.record["job_id"]
+
+    @property
+    def context(self): return self.record["context"]
+
+    @property
+    def graph_paths(self): return {g: (i or {}).get("path") for g, i in self.record["inputs"].items()}
+
+    @property
+    def status(self): return self.record.get("status")
+
+    def _key(self): return os.path.join(AI_JOBS_DIR, f"{self.job_id}.json")
+
+    def save(self):
+        self.record["updated"] = _now()
+        return save_json_cache(self._key(), self.record)
+
+    def result(self, step):
+        """Resultado guardado del paso, o None si no se completó con éxito."""
+        entry = self.record["steps"].get(step)
+        return entry["result"] if entry and entry.get("status") == "done" else None
+
+    def completed_analyses(self):
+        """{tipo_gráfico: análisis} de los pasos VLM ya completados."""
+        return {g: e["result"] for g, e in self.record["steps"].items() if g != SYNTHESIS_STEP and e.get("status") == "done"}
+
+    def checkpoint(self, step, result):
+        """Guarda el resultado de un paso ('done' o 'failed' según el texto devuelto)."""
+        entry = self.record["steps"].setdefault(step, {"attempts": 0})
+        entry.update(result=result, status="failed" if is_failed_result(result) else "done", finished=_now())
+        entry["attempts"] = entry.get("attempts", 0) + 1
+        self.save()
+
+    def finish(self, summary):
+        """Guarda la síntesis y marca el trabajo como terminado (o fallido si la síntesis o algún gráfico falló)."""
+        self.checkpoint(SYNTHESIS_STEP, summary)
+        self.record["status"] = "done" if self.result(SYNTHESIS_STEP) is not None and not self.pending_steps() else "failed"
+        self.save()
+
+    def pending_steps(self):
+        """Pasos VLM con imagen que aún no tienen resultado válido."""
+        return [g for g, p in self.graph_paths.items() if p and self.result(g) is None]
+
+
+def load_job(job_id):
+    """Carga un trabajo por id (o None)."""
+    record = load_json_cache(os.path.join(AI_JOBS_DIR, f"{job_id}.json"))
+    return AIJob(record) if record and record.get("version") == AI_JOB_VERSION else None
+
+
+def open_job(session_context, graph_paths, models=None, resume=True):
+    """
+    Abre el trabajo de estas entradas: lo reanuda si existe (y `resume`) o crea uno nuevo.
+
+    Returns:
+        AIJob: Trabajo con los pasos ya completados (si se reanuda).
+    """
+    job_id = job_id_for(session_context, graph_paths, models)
+    job = load_job(job_id) if resume else None
+    if job is not None:
+        done = [g for g in job.completed_analyses()]
+        print(f"Reanudando trabajo IA {job_id}: {len(done)} paso(s) ya completado(s){' (' + ', '.join(done) + ')' if done else ''}.")
+        if job.status == "done": job.record["status"] = "running" # La síntesis se reutiliza si ya estaba hecha
+        return job
+    record = {"version": AI_JOB_VERSION, "job_id": job_id, "created": _now(), "updated": None, "status": "running",
+              "models": models or {}, "context": session_context,
+              "inputs": {g: _fingerprint(p) for g, p in graph_paths.items()}, "steps": {}}
+    job = AIJob(record); job.save()
+    return job
+
+
+def list_jobs(status=None):
+    """Trabajos guardados, del más reciente al más antiguo."""
+    folder = os.path.join(CACHE_DIR, AI_JOBS_DIR)
+    if not os.path.isdir(folder): return []
+    jobs = [load_job(name[:-5]) for name in os.listdir(folder) if name.endswith('.json')]
+    jobs = [j for j in jobs if j is not None and (status is None or j.status == status)]
+    return sorted(jobs, key=lambda j: j.record.get("updated") or "", reverse=True)
+
+
+def delete_job(job_id):
+    """Borra un trabajo; True si existía."""
+    try: os.remove(os.path.join(CACHE_DIR, AI_JOBS_DIR, f"{job_id}.json")); return True
+    except OSError: return False
+
+
+def describe_job(job):
+    """Línea de resumen: id, estado, pilotos y pasos completados."""
+    ctx = job.context or {}; total = sum(1 for p in job.graph_paths.values() if p)
+    done = len(job.completed_analyses())
+    return (f"{job.job_id}  {job.status:<8} {job.record.get('updated') or '-':<19}  "
+            f"{ctx.get('target_driver', '?')} vs {ctx.get('reference_driver', '?')} ({ctx.get('track_name', 'N/A')})  "
+            f"VLM {done}/{total}{'  +síntesis' if job.result(SYNTHESIS_STEP) is not None else ''}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Trabajos de análisis IA reanudables.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_list = sub.add_parser("list", help="Lista los trabajos")
+    p_list.add_argument("--status", choices=("running", "done", "failed"), default=None)
+    p_show = sub.add_parser("show", help="Muestra un trabajo (JSON)")
+    p_show.add_argument("job_id")
+    p_del = sub.add_parser("delete", help="Borra trabajos")
+    p_del.add_argument("job_id", nargs="?")
+    p_del.add_argument("--done", action="store_true", help="Borra todos los trabajos terminados")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        jobs = list_jobs(args.status)
+        if not jobs: print("Sin trabajos IA guardados.")
+        for job in jobs: print(describe_job(job))
+    elif args.command == "show":
+        job = load_job(args.job_id)
+        if job is None: print(f"Error: Trabajo '{args.job_id}' no encontrado."); return 1
+        print(json.dumps(job.record, indent=2, ensure_ascii=False))
+    else:
+        ids = [j.job_id for j in list_jobs("done")] if args.done else ([args.job_id] if args.job_id else [])
+        if not ids: print("Indica un id o --done."); return 2
+        removed = sum(delete_job(i) for i in ids)
+        print(f"{removed} trabajo(s) borrado(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# analysis_compaction.py (Compactación de los análisis VLM en hallazgos estructurados para la síntesis)
+#
+# Cada análisis por gráfico (texto libre de hasta ~1500 tokens) se divide en frases y de
+# cada frase con un problema reconocible se extrae un hallazgo: zona (curva/sector y fase),
+# problema (léxico de coaching), magnitud (número con unidad) y confianza (especificidad
+# menos lenguaje dubitativo). Los hallazgos con la misma zona y problema en varios canales
+# se fusionan (la evidencia cruzada sube la confianza) y se emiten ordenados por
+# relevancia hasta agotar el presupuesto de tokens del prompt de síntesis. Un análisis sin
+# léxico reconocible (p. ej. en inglés) se conserva entero mientras quepa. Solo se compacta
+# cuando los textos completos superan el presupuesto (needs_compaction). Todo es local y
+# determinista: no añade llamadas al modelo.
+#
+# Uso:
+#   findings = extract_findings({"Freno": texto_freno, "Acelerador": texto_gas, ...})
+#   if needs_compaction(analyses): block, stats = compact_analyses({"Freno": ..., ...}, token_budget=900)
+
+import os
+import re
+import unicodedata
+
+SYNTHESIS_TOKEN_BUDGET = int(os.environ.get("RENNSPORT_SYNTHESIS_TOKENS", 900)) # Tokens para el bloque de hallazgos
+CHARS_PER_TOKEN = 3.5 # Estimación para español con tokenizadores tipo Llama 3
+SNIPPET_CHARS = 140 # Detalle máximo por hallazgo
+BASE_CONFIDENCE = 0.5
+CROSS_CHANNEL_WEIGHT = 0.5 # Peso extra por cada canal adicional que confirma un hallazgo
+
+MAX_ISSUES_PER_SENTENCE = 2
+
+# (problema, patrón) sobre texto en minúsculas y sin tildes; una frase puede aportar hasta MAX_ISSUES_PER_SENTENCE
+ISSUE_PATTERNS = (
+    ("frenada temprana", r"fren\w*\s+(?:\w+\s+){0,3}(?:antes|mas temprano|temprano|pronto|anticipad)"),
+    ("frenada tardía", r"fren\w*\s+(?:\w+\s+){0,3}(?:mas tarde|tarde|tardi)"),
+    ("poca presión de freno", r"(?:menos|menor|poca|insuficiente)\s+presion|presion\s+(?:\w+\s+)?(?:baja|insuficiente|menor)"),
+    ("exceso de freno / bloqueo", r"(?:mas|mayor|excesiva|demasiada)\s+presion|bloque"),
+    ("suelta de freno", r"suelta\w*|trail|liberaci\w+\s+del\s+freno|frenada\s+(?:mas\s+)?(?:larga|prolongad)"),
+    ("aceleración tardía", r"(?:acelera\w*|gas|fondo)\s+(?:\w+\s+){0,3}(?:tarde|tardi|retras)|tarda\w*\s+en\s+(?:\w+\s+){0,2}(?:fondo|acelerar|gas)|retras\w+\s+(?:\w+\s+){0,2}(?:aceler|gas)"),
+    ("acelerador dubitativo", r"(?:aceler\w*|gas)\s+(?:\w+\s+)?(?:parcial|intermitente|dubitativ|inconsistente)|levanta\w*|modula\w*"),
+    ("pérdida de tracción", r"traccion|patina|derrap|sobrevira"),
+    ("cambio anticipado", r"(?:cambi\w*|sube)\s+(?:de\s+marcha\s+)?(?:\w+\s+)?(?:anticipad|antes|temprano|pronto)"),
+    ("cambio tardío", r"cambi\w*\s+(?:de\s+marcha\s+)?(?:\w+\s+)?(?:tard|mas tarde)|limitador|rebote"),
+    ("elección de marcha", r"marcha\s+(?:mas\s+)?(?:larga|corta|alta|baja)|reduc\w*\s+(?:\w+\s+)?marchas?"),
+    ("velocidad de paso baja", r"velocidad\s+(?:minima|de paso|en curva|en el (?:apex|vertice))|(?:apex|vertice)"),
+    ("velocidad punta", r"velocidad\s+(?:punta|maxima)"),
+    ("trazada", r"trazad\w*|se abre|abierta|cerrad\w*|punto de cuerda|ancho de pista|todo el ancho|mas distancia|radio"),
+    ("correcciones de volante", r"correcci\w*|corrige|sobreconduc|brusc\w*|contravolante|serrucho"),
+    ("inconsistencia", r"inconsisten\w*|irregular\w*"),
+)
+_ISSUE_RES = tuple((issue, re.compile(pattern)) for issue, pattern in ISSUE_PATTERNS)
+_CORNER_RE = re.compile(r"\b(?:curva|giro|turn|t)\s*(\d{1,2})\b")
+_NAMED_ZONE_RE = re.compile(r"\b(horquilla|chicane|chicana|primera curva|ultima curva|recta principal|recta opuesta|sector\s*\d)\b")
+_PHASE_RE = (("entrada", re.compile(r"\bentrada\b|\bfrenada\b")), ("apex", re.compile(r"\bapex\b|\bvertice\b|mitad de curva")),
+             ("salida", re.compile(r"\bsalida\b")))
+_MAGNITUDE_RE = re.compile(r"(\d+(?:[.,]\d+)?)\s*(km/h|kmh|metros|m\b|segundos|s\b|decimas|%|rpm|grados|°|bar)")
+_HEDGE_RE = re.compile(r"\b(?:parece|posiblemente|podria|quiza|quizas|probablemente|se sospecha|puede que|no esta claro|aparentemente|tal vez)\b")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-ZÁÉÍÓÚÑ¿¡])|\n+") # No corta en 'aprox. 70%'
+_MARKDOWN_RE = re.compile(r"[*_`#>]+|^\s*(?:[-•]|\d+[.)])\s*")
+
+
+def _fold(text):
+    """Minúsculas sin tildes (para los patrones)."""
+    return ''.join(c for c in unicodedata.normalize('NFD', text.lower()) if unicodedata.category(c) != 'Mn')
+
+
+def estimate_tokens(text):
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def raw_tokens(analyses):
+    """Tokens estimados de los análisis válidos sin compactar."""
+    return sum(estimate_tokens(t) for t in analyses.values() if _valid_analysis(t))
+
+
+def needs_compaction(analyses, token_budget=SYNTHESIS_TOKEN_BUDGET):
+    """True si los textos completos no caben en `token_budget` (si caben, se envían tal cual)."""
+    return raw_tokens(analyses) > token_budget
+
+
+def split_sentences(text):
+    """Frases limpias (sin markdown ni viñetas) de un análisis."""
+    sentences = []
+    for raw in _SENTENCE_SPLIT_RE.split(text or ''):
+        sentence = _MARKDOWN_RE.sub('', raw).strip(" :-\t")
+        if len(sentence) >= 12: sentences.append(sentence)
+    return sentences
+
+
+def _zone(folded):
+    """(zona sin fase, fase o None, True si la zona es concreta)."""
+    corner = _CORNER_RE.search(folded)
+    zone = f"Curva {int(corner.group(1))}" if corner else None
+    if zone is None:
+        named = _NAMED_ZONE_RE.search(folded)
+        zone = named.group(1).capitalize() if named else None
+    phase = next((name for name, regex in _PHASE_RE if regex.search(folded)), None)
+    return zone or "General", phase, zone is not None
+
+
+def parse_findings(sentence, channel):
+    """Hallazgos estructurados de una frase (uno por problema reconocido; lista vacía si no hay ninguno)."""
+    folded = _fold(sentence)
+    issues = [name for name, regex in _ISSUE_RES if regex.search(folded)][:MAX_ISSUES_PER_SENTENCE]
+    if not issues: return []
+    zone, phase, specific = _zone(folded)
+    magnitude = _MAGNITUDE_RE.search(folded)
+    confidence = BASE_CONFIDENCE + (0.2 if specific else 0.0) + (0.15 if magnitude else 0.0) - (0.25 if _HEDGE_RE.search(folded) else 0.0)
+    return [{'zone': zone, 'phase': phase, 'issue': issue, 'magnitude': f"{magnitude.group(1)} {magnitude.group(2)}" if magnitude else None,
+             'confidence': round(min(max(confidence, 0.1), 0.95), 2), 'channels': [channel], 'detail': sentence} for issue in issues]
+
+
+def _valid_analysis(text):
+    return isinstance(text, str) and text.strip() and not text.startswith('[')
+
+
+def extract_findings(analyses):
+    """
+    Hallazgos de todos los canales, fusionados por (zona, problema) y ordenados por relevancia.
+
+    Args:
+        analyses (dict): {nombre de canal: texto del análisis}; se ignoran errores ('[Error...') y vacíos.
+
+    Returns:
+        list[dict]: zone, phase, issue, magnitude, confidence, channels, detail, score.
+    """
+    merged = {}
+    for channel, text in analyses.items():
+        if not _valid_analysis(text): continue
+        sentences = split_sentences(text)
+        found = [f for sentence in sentences for f in parse_findings(sentence, channel)]
+        if not found and sentences: # Sin léxico reconocible: se conserva el análisis completo (se recorta solo si no cabe)
+            found = [{'zone': 'General', 'phase': None, 'issue': 'observación', 'magnitude': None, 'confidence': 0.3, 'channels': [channel],
+                      'detail': ' '.join(sentences), 'unmatched': True}]
+        for finding in found:
+            key = (finding['zone'], finding['issue']) + ((channel,) if finding.get('unmatched') else ()) # La fase no separa hallazgos
+            current = merged.get(key)
+            if current is None: merged[key] = finding; continue
+            current['phase'] = current['phase'] or finding['phase']
+            if channel not in current['channels']: # Evidencia de otro canal: combina confianzas
+                current['channels'].append(channel)
+                current['confidence'] = round(min(1 - (1 - current['confidence']) * (1 - finding['confidence']), 0.95), 2)
+            if finding['confidence'] > current['confidence'] or (current['magnitude'] is None and finding['magnitude']):
+                current['detail'] = finding['detail']; current['magnitude'] = current['magnitude'] or finding['magnitude']
+    findings = list(merged.values())
+    for finding in findings: finding['score'] = finding['confidence'] * (1 + CROSS_CHANNEL_WEIGHT * (len(finding['channels']) - 1))
+    findings.sort(key=lambda f: (-f['score'], f['zone'], f['issue']))
+    return findings
+
+
+def format_finding(finding, with_detail=True, max_chars=SNIPPET_CHARS):
+    """Línea 'zona | problema | magnitud | confianza | canales: detalle' (detalle recortado a `max_chars`; None = completo)."""
+    zone = f"{finding['zone']} ({finding['phase']})" if finding['phase'] else finding['zone']
+    line = f"- {zone} | {finding['issue']} | {finding['magnitude'] or '-'} | conf {finding['confidence']:.2f} | {'+'.join(finding['channels'])}"
+    if not with_detail: return line
+    detail = finding['detail'] if max_chars is None or len(finding['detail']) <= max_chars else finding['detail'][:max_chars - 1].rstrip() + '…'
+    return f"{line}: {detail}"
+
+
+def compact_analyses(analyses, token_budget=SYNTHESIS_TOKEN_BUDGET):
+    """
+    Bloque de texto compacto (una línea por hallazgo) dentro de `token_budget` tokens estimados.
+
+    Returns:
+        tuple: (str bloque, dict stats con raw_tokens, compact_tokens, findings, kept, dropped, channels).
+    """
+    findings = extract_findings(analyses)
+    lines, used, shown_details = [], 0, set()
+    for finding in findings:
+        line = format_finding(finding, with_detail=finding['detail'] not in shown_details) # Misma frase, varios problemas: detalle una vez
+        if finding.get('unmatched'): # Sin hallazgos reconocibles: el texto entero si aún cabe
+            full = format_finding(finding, max_chars=None)
+            if used + estimate_tokens(full) <= token_budget: line = full
+        cost = estimate_tokens(line)
+        if lines and used + cost > token_budget: continue # Los siguientes (más cortos) aún pueden caber
+        lines.append(line); used += cost; shown_details.add(finding['detail'])
+    dropped = len(findings) - len(lines)
+    if dropped: lines.append(f"({dropped} hallazgos de menor relevancia omitidos por presupuesto)")
+    block = '\n'.join(lines)
+    channels = sorted({c for f in findings for c in f['channels']})
+    return block, {'raw_tokens': raw_tokens(analyses), 'compact_tokens': estimate_tokens(block) if block else 0, 'findings': len(findings),
+                   'kept': len(findings) - dropped, 'dropped': dropped, 'channels': channels}
@@ -0,0 +1,40 @@
+# app_cache.py (Caché en disco compartida: estado IA, proyecciones de pista, trabajos...)
+
+import json
+import os
+import time
+
+# Directorio de caché (sobrescribible con la variable de entorno RENNSPORT_CACHE_DIR)
+CACHE_DIR = os.environ.get('RENNSPORT_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.rennsport_telemetry')
+
+
+def cache_path(*parts):
+    """Devuelve una ruta dentro del directorio de caché, creando las carpetas necesarias."""
+    path = os.path.join(CACHE_DIR, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    return path
+
+
+def load_json_cache(name, ttl_seconds=None):
+    """
+    Lee un JSON de la caché. Si `ttl_seconds` está definido y el archivo es más
+    antiguo, devuelve None. Cualquier error de lectura se trata como caché vacía.
+    """
+    path = os.path.join(CACHE_DIR, name)
+    try:
+        if ttl_seconds is not None and time.time() - os.path.getmtime(path) > ttl_seconds: return None
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    except (OSError, ValueError): return None
+
+
+def save_json_cache(name, data):
+    """Escribe un JSON en la caché de forma atómica (archivo temporal + rename)."""
+    try:
+        path = cache_path(name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return True
+    except (OSError, TypeError, ValueError) as e:
+        print(f"Adv: No se pudo escribir caché '{name}': {e}")
+        return False
@@ -0,0 +1,328 @@
+# batch.py (Procesamiento no interactivo: CSVs/carpetas -> tablas de vueltas, gráficos y análisis IA)
+#
+# Ejemplos:
+#   python batch.py sesiones/ --laps best,worst --charts all --output-dir salida
+#   python batch.py Telemetry.csv --compare worst:best --charts dashboard --ai
+#   python batch.py evento/ --laps valid --charts speed,inputs --jobs 8
+#
+# Fase 1 (paralela, un proceso por archivo): carga, cálculo de vueltas y gráficos.
+# Fase 2 (secuencial): análisis IA de cada comparativa contra un único LM Studio.
+
+import os
+os.environ.setdefault("MPLBACKEND", "Agg") # Sin ventanas (también en procesos hijo)
+
+import argparse
+import contextlib
+import glob
+import json
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from data_loader import load_telemetry_csv, read_header_lines, parse_csv_header, TELEMETRY_EXTENSIONS
+from lap_alignment import ALIGNMENT_MODES
+from lap_stats import compute_lap_stats
+from tyre_analysis import analyze_tyres
+from resampling import analyze_sampling, format_sampling_report, resample_uniform
+from grip_analysis import compute_grip_histograms
+from motec_export import export_motec
+from reference_envelope import compute_reference_envelope
+from main import calculate_laps_improved, estimate_min_lap_time, AI_ENABLED
+from plotter import (plot_lap_speed_profile, plot_lap_inputs, plot_lap_engine, plot_comparison_dashboard,
+                     plot_channel_comparison, plot_multi_lap_overlay, plot_tyre_report, plot_track_map, plot_grip_report)
+from profiling import enable_profiling
+
+LAP_CHARTS = {"speed": plot_lap_speed_profile, "inputs": plot_lap_inputs, "engine": plot_lap_engine}
+PAIR_CHARTS = ("dashboard", "trackmap")
+SESSION_CHARTS = ("overlay", "tyres", "grip") # Un gráfico por sesión
+ALL_CHARTS = tuple(LAP_CHARTS) + PAIR_CHARTS + SESSION_CHARTS
+AI_CHANNEL_GRAPHS = ["Brake", "Throttle", "Gear", "Speed", "TrackMap", "Steering"] # Tipos que se pueden generar desde el CSV (TrackMap desde GPS)
+
+
+# --- Resolución de Entradas y Selecciones ---
+def _is_telemetry_file(path):
+    """True si las primeras líneas contienen un encabezado de datos reconocible (descarta laps.csv, lap_stats.csv...)."""
+    try: return parse_csv_header(read_header_lines(path), verbose=False)[1] != -1
+    except (OSError, ValueError, EOFError, ImportError): return False
+
+
+def collect_input_files(inputs, exclude_dir=None):
+    """
+    Expande archivos y carpetas (recursivo) a una lista ordenada de CSVs (también .csv.gz/.zst/.bz2/.xz) sin duplicados.
+    En carpetas se ignora todo lo que cuelgue de exclude_dir (salidas del propio lote) y los CSV sin encabezado de telemetría;
+    los archivos pasados explícitamente se aceptan tal cual.
+    """
+    files = []; skipped = 0
+    exclude = os.path.join(os.path.abspath(exclude_dir), "") if exclude_dir else None
+    for item in inputs:
+        if os.path.isdir(item):
+            for ext in TELEMETRY_EXTENSIONS:
+                for f in glob.glob(os.path.join(item, "**", f"*{ext}"), recursive=True):
+                    if (exclude and os.path.abspath(f).startswith(exclude)) or not _is_telemetry_file(f): skipped += 1
+                    else: files.append(f)
+        elif os.path.isfile(item): files.append(item)
+        else: print(f"Adv: '{item}' no existe, se ignora.")
+    if skipped: print(f"Info: {skipped} archivo(s) sin encabezado de telemetría o dentro de la carpeta de salida ignorados.")
+    seen = set(); unique = []
+    for f in sorted(files, key=lambda p: os.path.abspath(p)):
+        key = os.path.abspath(f)
+        if key not in seen: seen.add(key); unique.append(f)
+    return unique
+
+
+def _valid_timed_laps(laps_info_df):
+    return laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+
+
+def resolve_lap_selector(selector, laps_info_df):
+    """
+    Convierte un selector ('best', 'worst', 'valid', 'all' o número) en lista de vueltas.
+    Devuelve [] si el selector no aplica a esta sesión.
+    """
+    selector = str(selector).strip().lower()
+    valid = _valid_timed_laps(laps_info_df)
+    if selector == "best": return [] if valid.empty else [int(valid.loc[valid['LapTime'].idxmin(), 'Lap'])]
+    if selector == "worst": return [] if valid.empty else [int(valid.loc[valid['LapTime'].idxmax(), 'Lap'])]
+    if selector == "valid": return sorted(valid['Lap'].astype(int).tolist())
+    if selector == "all": return sorted(laps_info_df['Lap'].astype(int).tolist())
+    try: lap = int(selector)
+    except ValueError: raise ValueError(f"Selector de vuelta inválido: '{selector}'")
+    return [lap] if lap in set(laps_info_df['Lap'].astype(int)) else []
+
+
+def resolve_compare_pair(pair, laps_info_df):
+    """'worst:best' -> (vuelta, referencia) o None si no aplica / son la misma vuelta."""
+    if ':' not in pair: raise ValueError(f"Par de comparación inválido (usa A:B): '{pair}'")
+    lap_sel, ref_sel = pair.split(':', 1)
+    laps = resolve_lap_selector(lap_sel, laps_info_df); refs = resolve_lap_selector(ref_sel, laps_info_df)
+    if len(laps) != 1 or len(refs) != 1 or laps[0] == refs[0]: return None
+    return laps[0], refs[0]
+
+
+def _session_output_dir(output_dir, csv_path, used_names):
+    """Carpeta de salida por archivo: '<carpeta>_<nombre>' (los exports suelen llamarse todos Telemetry.csv)."""
+    stem = os.path.basename(csv_path).split('.')[0]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(csv_path)))
+    name = f"{parent}_{stem}" if parent else stem; candidate = name; i = 2
+    while candidate in used_names: candidate = f"{name}_{i}"; i += 1
+    used_names.add(candidate)
+    return os.path.join(output_dir, candidate)
+
+
+# --- Fase 1: Trabajo por Archivo (ejecutado en procesos hijo) ---
+def process_session(csv_path, session_dir, lap_selectors, compare_pairs, charts, ai_images, alignment='distance', resample=None, motec=False,
+                    envelope=False):
+    """
+    Carga un CSV, calcula vueltas y genera los gráficos pedidos en `session_dir`.
+    La salida por consola se guarda en session_dir/batch.log. `resample`: None, 'auto' o Hz.
+    `motec`: exporta además session.ld/.ldx (MoTeC i2). `envelope`: banda p10-p90 de las vueltas válidas en los dashboards.
+
+    Returns:
+        dict: Resumen serializable (estado, vueltas, gráficos, comparativas).
+    """
+    os.makedirs(session_dir, exist_ok=True)
+    result = {"csv": csv_path, "output_dir": session_dir, "status": "error", "charts": [], "comparisons": []}
+    t0 = time.perf_counter()
+    with open(os.path.join(session_dir, "batch.log"), "w", encoding="utf-8") as log, contextlib.redirect_stdout(log):
+        try:
+            df, metadata = load_telemetry_csv(csv_path)
+            if df is None or df.empty: result["error"] = "Error de carga"; return result
+            sampling = analyze_sampling(df); print(format_sampling_report(sampling))
+            result["sampling"] = {k: sampling[k] for k in ("rate_hz", "jitter_pct", "duplicates", "backwards", "gaps", "gap_time_s")}
+            if resample:
+                df, sampling = resample_uniform(df, None if resample == "auto" else resample, report=sampling)
+                result["sampling"]["resampled_rate_hz"] = sampling["resampled_rate_hz"]; print(f"Remuestreado a {sampling['resampled_rate_hz']:g} Hz: {len(df)} filas.")
+            laps_info_df = calculate_laps_improved(df, estimate_min_lap_time(metadata))
+            if laps_info_df.empty: result["error"] = "Sin vueltas"; return result
+            laps_info_df.to_csv(os.path.join(session_dir, "laps.csv"), index=False)
+            compute_lap_stats(df, laps_info_df).to_csv(os.path.join(session_dir, "lap_stats.csv"), index=False)
+            result["metadata"] = metadata
+            result["laps"] = json.loads(laps_info_df.to_json(orient="records"))
+            if motec: result["motec"] = export_motec(df, metadata, os.path.join(session_dir, "session.ld"), laps_info_df)['ld_path']
+
+            # Gráficos por vuelta
+            selected_laps = sorted({lap for sel in lap_selectors for lap in resolve_lap_selector(sel, laps_info_df)})
+            for lap in selected_laps:
+                lap_info = laps_info_df[laps_info_df['Lap'] == lap].iloc[0]
+                df_lap = df[(df['Time'] >= lap_info['StartTime']) & (df['Time'] <= lap_info['EndTime'])]
+                if df_lap.empty: continue
+                for chart in charts:
+                    if chart not in LAP_CHARTS: continue
+                    path = os.path.join(session_dir, f"V{lap}_{chart}.png")
+                    LAP_CHARTS[chart](df_lap, metadata, lap, save_path=path)
+                    if os.path.exists(path): result["charts"].append(path)
+
+            # Superposición de todas las vueltas válidas
+            if "overlay" in charts:
+                path = os.path.join(session_dir, "overlay_valid_laps.png")
+                plot_multi_lap_overlay(df, metadata, laps_info_df, save_path=path, alignment=alignment)
+                if os.path.exists(path): result["charts"].append(path)
+
+            # Informe de neumáticos (tabla por stint + gráfico)
+            if "tyres" in charts:
+                tyre_report = analyze_tyres(df, laps_info_df)
+                if not tyre_report['laps'].empty:
+                    tyre_report['stint_summary'].to_csv(os.path.join(session_dir, "tyre_stints.csv"), index=False)
+                    path = os.path.join(session_dir, "tyre_report.png")
+                    plot_tyre_report(tyre_report['laps'], tyre_report['balance'], metadata, save_path=path)
+                    if os.path.exists(path): result["charts"].append(path)
+
+            # Uso de adherencia (G-G e histogramas de entradas de las vueltas válidas)
+            if "grip" in charts:
+                path = os.path.join(session_dir, "grip_report.png")
+                plot_grip_report(compute_grip_histograms(df, laps_info_df), metadata, save_path=path)
+                if os.path.exists(path): result["charts"].append(path)
+
+            # Comparativas (con banda de referencia de todas las vueltas válidas si se pide)
+            reference_bands = {} # Por posición, una banda por vuelta de referencia (misma base de distancia que el dashboard)
+            def reference_band_for(ref):
+                if not (envelope and "dashboard" in charts): return None
+                key = ref if alignment == 'position' else None
+                if key not in reference_bands:
+                    reference_bands[key] = band = compute_reference_envelope(df, laps_info_df, alignment=alignment, reference_lap=ref)
+                    if band: result.setdefault("envelope_outside_pct", {str(lap): pcts for lap, pcts in band["outside_pct"].items()})
+                return reference_bands[key]
+            for pair in compare_pairs:
+                resolved = resolve_compare_pair(pair, laps_info_df)
+                if resolved is None: print(f"Adv: Comparativa '{pair}' no aplicable en esta sesión."); continue
+                lap, ref = resolved
+                comparison = {"pair": pair, "lap": lap, "reference_lap": ref, "charts": [], "ai_images": {}}
+                for key, num in (("lap_time", lap), ("reference_lap_time", ref)):
+                    comparison[key] = laps_info_df.loc[laps_info_df['Lap'] == num, 'FormattedTime'].iloc[0]
+                if "dashboard" in charts:
+                    path = os.path.join(session_dir, f"V{lap}_vs_V{ref}_dashboard.png")
+                    plot_comparison_dashboard(df, metadata, lap, ref, save_path=path, alignment=alignment, envelope=reference_band_for(ref))
+                    if os.path.exists(path): comparison["charts"].append(path)
+                if "trackmap" in charts:
+                    path = os.path.join(session_dir, f"V{lap}_vs_V{ref}_trackmap_delta.png")
+                    plot_track_map(df, metadata, lap, 'Delta', ref, laps_info_df, save_path=path)
+                    if os.path.exists(path): comparison["charts"].append(path)
+                if ai_images:
+                    for graph_type in AI_CHANNEL_GRAPHS:
+                        path = os.path.join(session_dir, f"V{lap}_vs_V{ref}_{graph_type}.png")
+                        if graph_type == "TrackMap": plot_track_map(df, metadata, lap, None, ref, laps_info_df, save_path=path)
+                        else: plot_channel_comparison(df, metadata, lap, ref, graph_type, save_path=path)
+                        if os.path.exists(path): comparison["ai_images"][graph_type] = path
+                result["comparisons"].append(comparison)
+            result["status"] = "ok"
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"; traceback.print_exc(file=log)
+        finally:
+            result["seconds"] = time.perf_counter() - t0
+    return result
+
+
+# --- Fase 2: Análisis IA (secuencial) ---
+def run_ai_phase(results, resume=True):
+    """
+    Ejecuta VLM + síntesis para cada comparativa con imágenes generadas (trabajos reanudables, ver ai_jobs).
+    Las peticiones se agrupan por modelo (main.run_ai_analyses_scheduled): todos los análisis VLM y
+    después todas las síntesis, una sola carga de cada modelo en LM Studio para todo el lote.
+    """
+    from main import build_session_context, run_ai_analyses_scheduled
+    from ai_jobs import open_job
+    from llm_integration import check_models_status, DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL
+
+    statuses = check_models_status([DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL]) # El VLM (primero en usarse) queda cargado
+    vlm_ok = "Error" not in statuses[DEFAULT_VLM_MODEL]; text_llm_ok = "Error" not in statuses[DEFAULT_TEXT_MODEL]
+    if not vlm_ok: print("ERROR: VLM no disponible, se omite el análisis IA."); return
+    pending = []
+    for result in results:
+        if result.get("status") != "ok": continue
+        driver = result.get("metadata", {}).get("Driver") or "Piloto"
+        track = result.get("metadata", {}).get("Track", "N/A")
+        for comp in result["comparisons"]:
+            if not comp["ai_images"]: continue
+            context = build_session_context(track, f"{driver} V{comp['lap']}", comp["lap_time"],
+                                            f"{driver} V{comp['reference_lap']}", comp["reference_lap_time"])
+            job = open_job(context, comp["ai_images"], models={"vlm": DEFAULT_VLM_MODEL, "text": DEFAULT_TEXT_MODEL}, resume=resume)
+            pending.append((result, comp, context, job))
+    if not pending: return
+    print(f"\n=== IA: {len(pending)} comparativa(s), peticiones agrupadas por modelo ===")
+    outputs, stats = run_ai_analyses_scheduled([(context, comp["ai_images"], job) for _, comp, context, job in pending], text_llm_ok)
+    print(f"IA: {stats['requests']} tareas, {stats['loads']} carga(s) de modelo ({' -> '.join(stats['order']) or 'ninguna'}).")
+    for (result, comp, context, job), (analyses, summary) in zip(pending, outputs):
+        out_path = os.path.join(result["output_dir"], f"V{comp['lap']}_vs_V{comp['reference_lap']}_ai.json")
+        with open(out_path, "w", encoding="utf-8") as f:
+            json.dump({"context": context, "analyses": analyses, "summary": summary, "job_id": job.job_id}, f, indent=2, ensure_ascii=False)
+        comp["ai_result"] = out_path; comp["ai_job"] = job.job_id
+
+
+# --- CLI ---
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Procesamiento batch (sin prompts) de telemetría Rennsport.")
+    parser.add_argument("inputs", nargs="+", help="Archivos CSV o carpetas (búsqueda recursiva)")
+    parser.add_argument("--laps", default="best", help="Vueltas a graficar: best,worst,valid,all o números (coma)")
+    parser.add_argument("--compare", action="append", default=[], metavar="A:B",
+                        help="Par vuelta:referencia (ej. worst:best, 7:best). Repetible")
+    parser.add_argument("--charts", default="all", help=f"Gráficos: {','.join(ALL_CHARTS)} o 'all'")
+    parser.add_argument("--alignment", choices=ALIGNMENT_MODES, default="distance",
+                        help="Alineación de dashboard/superposición: LapDist o posición GPS")
+    parser.add_argument("--output-dir", default="batch_output", help="Directorio de salida")
+    parser.add_argument("--ai", action="store_true", help="Análisis IA de cada comparativa (requiere --compare)")
+    parser.add_argument("--ai-fresh", action="store_true", help="No reutilizar trabajos IA guardados (repite todos los pasos)")
+    parser.add_argument("--envelope", action="store_true", help="Dashboards con la banda p10-p90 de todas las vueltas válidas")
+    parser.add_argument("--motec", action="store_true", help="Exportar cada sesión a MoTeC i2 (session.ld + session.ldx)")
+    parser.add_argument("--resample", default=None, metavar="auto|HZ", help="Remuestrear cada sesión a frecuencia fija (detectada o en Hz)")
+    parser.add_argument("--jobs", type=int, default=0, help="Procesos en paralelo (0 = nº de CPUs)")
+    parser.add_argument("--profile", action="store_true", help="Perfilado por etapas del proceso principal")
+    parser.add_argument("--profile-memory", action="store_true", help="Con --profile, mide también la memoria pico (tracemalloc, más lento)")
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    if args.profile or args.profile_memory: enable_profiling(trace_memory=args.profile_memory or None)
+    charts = list(ALL_CHARTS) if args.charts.strip().lower() == "all" else [c.strip().lower() for c in args.charts.split(",") if c.strip()]
+    unknown = [c for c in charts if c not in ALL_CHARTS]
+    if unknown: print(f"Error: Gráficos desconocidos: {unknown}"); return 2
+    lap_selectors = [s for s in args.laps.split(",") if s.strip()]
+    if args.ai and not AI_ENABLED: print("Error: --ai pedido pero la funcionalidad IA no está disponible."); return 2
+    if args.ai and not args.compare: print("Error: --ai requiere al menos un --compare A:B."); return 2
+
+    files = collect_input_files(args.inputs, exclude_dir=args.output_dir)
+    if not files: print("Error: No se encontraron archivos de telemetría."); return 1
+    os.makedirs(args.output_dir, exist_ok=True)
+    used_names = set()
+    jobs = [(f, _session_output_dir(args.output_dir, f, used_names)) for f in files]
+    workers = max(1, min(args.jobs or os.cpu_count() or 1, len(jobs)))
+    print(f"Procesando {len(jobs)} archivo(s) con {workers} proceso(s)...")
+
+    t0 = time.perf_counter(); results = []
+    resample = args.resample.strip().lower() if args.resample else None
+    if resample and resample != "auto":
+        try: resample = float(resample)
+        except ValueError: print(f"Error: --resample debe ser 'auto' o una frecuencia en Hz ({args.resample})."); return 2
+    job_args = (lap_selectors, args.compare, charts, args.ai, args.alignment, resample, args.motec, args.envelope)
+    if workers == 1:
+        for csv_path, session_dir in jobs:
+            results.append(process_session(csv_path, session_dir, *job_args)); _print_job(results[-1])
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_session, csv_path, session_dir, *job_args) for csv_path, session_dir in jobs]
+            for future in as_completed(futures):
+                results.append(future.result()); _print_job(results[-1])
+    results.sort(key=lambda r: r["csv"])
+    elapsed = time.perf_counter() - t0
+
+    if args.ai: run_ai_phase(results, resume=not args.ai_fresh)
+
+    ok = sum(1 for r in results if r["status"] == "ok")
+    summary_path = os.path.join(args.output_dir, "batch_summary.json")
+    with open(summary_path, "w", encoding="utf-8") as f:
+        json.dump({"args": vars(args), "elapsed_s": elapsed, "ok": ok, "failed": len(results) - ok, "sessions": results},
+                  f, indent=2, ensure_ascii=False, default=str)
+    print(f"\nBatch terminado: {ok}/{len(results)} OK en {elapsed:.1f} s ({len(results) / max(elapsed, 1e-9):.2f} archivos/s).")
+    print(f"Resumen: {summary_path}")
+    return 0 if ok == len(results) else 1
+
+
+def _print_job(result):
+    status = "OK" if result["status"] == "ok" else f"ERROR ({result.get('error')})"
+    n_charts = len(result["charts"]) + sum(len(c["charts"]) + len(c["ai_images"]) for c in result["comparisons"])
+    print(f"- {result['csv']}: {status}, {n_charts} gráfico(s), {result.get('seconds', 0):.1f} s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
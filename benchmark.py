@@ -0,0 +1,181 @@
+# benchmark.py (Benchmarks repetibles de carga, vueltas, slicing, ploteo y codificación de imagen)
+#
+# Uso:
+#   python benchmark.py                                  # Genera CSV sintético (20 vueltas @ 60 Hz) y mide
+#   python benchmark.py --csv Telemetry.csv --repeat 5   # Mide sobre un archivo real
+#   python benchmark.py --output bench_v2.json --compare bench_v1.json
+#
+# Cada etapa se mide `repeat` veces (tiempo de pared: min/mediana/media) y una
+# vez adicional con tracemalloc para obtener el pico de memoria Python.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import matplotlib
+matplotlib.use("Agg") # Sin ventanas: plt.show() no bloquea
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from data_loader import load_telemetry_csv
+from main import calculate_laps_improved
+from plotter import plot_comparison_dashboard
+from synthetic_telemetry import generate_session_csv
+
+DEFAULT_BENCH_LAPS = 20
+DEFAULT_BENCH_RATE_HZ = 60
+
+
+def _git_revision():
+    """Commit actual del repositorio (o 'unknown')."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, timeout=5).decode().strip()
+    except Exception: return "unknown"
+
+
+def _silenced(func, *args, **kwargs):
+    """Ejecuta `func` descartando su salida por consola (los módulos imprimen mucho)."""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return func(*args, **kwargs)
+
+
+def measure(func, repeat=3, warmup=1):
+    """
+    Mide `func()` y devuelve dict con tiempos (s) y pico de memoria (MB).
+    El resultado de la última ejecución se devuelve en la clave 'result'.
+    """
+    result = None
+    for _ in range(warmup): result = _silenced(func)
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter(); result = _silenced(func); timings.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        _silenced(func); _, peak = tracemalloc.get_traced_memory()
+    finally: tracemalloc.stop()
+    return {"min_s": min(timings), "median_s": statistics.median(timings), "mean_s": statistics.mean(timings),
+            "runs": repeat, "peak_mem_mb": peak / 1e6, "result": result}
+
+
+def run_benchmarks(csv_path, repeat=3, stages=None):
+    """Ejecuta las etapas del benchmark sobre `csv_path`. Devuelve dict serializable."""
+    stages = stages or ["load", "laps", "slice", "plot", "encode"]
+    results = {}
+    file_bytes = os.path.getsize(csv_path)
+
+    print(f"[load] {os.path.basename(csv_path)} ({file_bytes / 1e6:.1f} MB)...")
+    r = measure(lambda: load_telemetry_csv(csv_path), repeat=repeat if "load" in stages else 1, warmup=0)
+    df, metadata = r.pop("result")
+    if df is None: raise RuntimeError(f"No se pudo cargar {csv_path}")
+    r["throughput_mb_s"] = file_bytes / 1e6 / r["median_s"]
+    if "load" in stages: results["load"] = r
+
+    print("[laps] calculate_laps_improved...")
+    r = measure(lambda: calculate_laps_improved(df), repeat=repeat)
+    laps_df = r.pop("result")
+    if "laps" in stages: results["laps"] = r
+    timed = laps_df[laps_df["IsTimeValid"] & (laps_df["LapType"] == "Timed Lap")]
+    if len(timed) < 2: raise RuntimeError("Se necesitan al menos 2 vueltas válidas para slicing/plot.")
+    best = timed.loc[timed["LapTime"].idxmin()]; worst = timed.loc[timed["LapTime"].idxmax()]
+
+    if "slice" in stages:
+        print("[slice] Filtrado por tiempo de todas las vueltas (como main)...")
+        def slice_all():
+            return [df[(df["Time"] >= row.StartTime) & (df["Time"] <= row.EndTime)] for row in laps_df.itertuples()]
+        r = measure(slice_all, repeat=repeat); r.pop("result"); r["laps"] = len(laps_df)
+        results["slice"] = r
+
+    if "plot" in stages:
+        print("[plot] plot_comparison_dashboard (Agg)...")
+        def plot_dashboard():
+            plot_comparison_dashboard(df, metadata, int(best["Lap"]), int(worst["Lap"]))
+            plt.gcf().canvas.draw(); plt.close("all") # Forzar render completo (Agg no dibuja en show)
+        r = measure(plot_dashboard, repeat=repeat); r.pop("result")
+        results["plot"] = r
+
+    if "encode" in stages:
+        try:
+            from llm_integration import encode_image_to_base64
+            from PIL import Image
+        except ImportError as e: print(f"[encode] Omitido (dependencia no disponible: {e})")
+        else:
+            print("[encode] encode_image_to_base64 sobre dashboard renderizado...")
+            _silenced(plot_comparison_dashboard, df, metadata, int(best["Lap"]), int(worst["Lap"]))
+            fig = plt.gcf(); buf = io.BytesIO(); fig.savefig(buf, format="png", dpi=100); plt.close("all")
+            buf.seek(0); img = Image.open(buf); img.load()
+            r = measure(lambda: encode_image_to_base64(img), repeat=repeat)
+            r["payload_bytes"] = len(r.pop("result")); r["image_size"] = list(img.size)
+            results["encode"] = r
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_revision": _git_revision(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "pandas": pd.__version__, "numpy": np.__version__, "matplotlib": matplotlib.__version__,
+            "csv": os.path.abspath(csv_path), "csv_bytes": file_bytes, "rows": int(len(df)),
+            "columns": int(len(df.columns)), "laps": int(len(laps_df)), "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def print_results(report, baseline=None):
+    """Imprime tabla de resultados y, si hay baseline, el ratio respecto a ella."""
+    print(f"\n--- Benchmark ({report['meta']['git_revision']}, {report['meta']['rows']} filas) ---")
+    header = f"{'Etapa':<8} {'min (s)':>9} {'mediana (s)':>12} {'pico MB':>9}"
+    if baseline: header += f" {'vs base':>9}"
+    print(header)
+    for stage, r in report["results"].items():
+        line = f"{stage:<8} {r['min_s']:>9.4f} {r['median_s']:>12.4f} {r['peak_mem_mb']:>9.1f}"
+        base = (baseline or {}).get("results", {}).get(stage)
+        if base: line += f" {r['median_s'] / base['median_s']:>8.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks de RennsportTelemetryTool.")
+    parser.add_argument("--csv", help="CSV a medir (por defecto se genera uno sintético)")
+    parser.add_argument("--laps", type=int, default=DEFAULT_BENCH_LAPS, help="Vueltas del CSV sintético")
+    parser.add_argument("--rate", type=float, default=DEFAULT_BENCH_RATE_HZ, help="Frecuencia (Hz) del CSV sintético")
+    parser.add_argument("--size-mb", type=float, default=None, help="Tamaño objetivo del CSV sintético (MB)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por etapa")
+    parser.add_argument("--stages", default="load,laps,slice,plot,encode", help="Etapas separadas por comas")
+    parser.add_argument("--output", default="bench_results.json", help="Archivo JSON de resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    csv_path = args.csv; tmp_dir = None
+    if not csv_path:
+        tmp_dir = tempfile.TemporaryDirectory(prefix="rennsport_bench_")
+        csv_path = os.path.join(tmp_dir.name, "Telemetry.csv")
+        generate_session_csv(csv_path, n_laps=args.laps, rate_hz=args.rate, target_size_mb=args.size_mb, seed=0)
+    try:
+        report = run_benchmarks(csv_path, repeat=args.repeat, stages=[s.strip() for s in args.stages.split(",") if s.strip()])
+        if not args.csv: report["meta"]["synthetic"] = {"laps": args.laps, "rate_hz": args.rate, "size_mb": args.size_mb}
+    finally:
+        if tmp_dir: tmp_dir.cleanup()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f: baseline = json.load(f)
+    print_results(report, baseline)
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2)
+    print(f"\nResultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# channel_store.py (Almacén binario por canal con memory-mapping, compartible entre procesos)
+#
+# Formato (directorio):
+#   manifest.json     -> metadatos de sesión, canales (archivo, dtype) y offsets de fila por vuelta
+#   <Canal>.bin       -> array contiguo little-endian de tipo fijo (una muestra por fila)
+#
+# Los lectores abren cada canal con np.memmap (solo lectura): varios procesos que
+# abren el mismo almacén comparten las mismas páginas físicas (page cache del SO)
+# y obtienen vistas sin copia de las muestras de una vuelta.
+#
+# Uso:
+#   python channel_store.py export Telemetry.csv sesion.rts [--float32]
+#   python channel_store.py info sesion.rts
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+STORE_FORMAT = "rennsport-channel-store"
+STORE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+BOOL_NA_VALUE = -1 # Booleanos nullable -> int8 (1/0, -1 = NA)
+
+
+def _lap_row_ranges(df, laps_info_df=None):
+    """Rangos de fila [inicio, fin) por vuelta sobre df ordenado por Time."""
+    times = df['Time'].to_numpy()
+    ranges = []
+    if laps_info_df is not None and not laps_info_df.empty:
+        starts = np.searchsorted(times, laps_info_df['StartTime'].to_numpy(dtype=float), side='left')
+        ends = np.searchsorted(times, laps_info_df['EndTime'].to_numpy(dtype=float), side='right')
+        for row, start, end in zip(laps_info_df.itertuples(index=False), starts, ends):
+            entry = {"Lap": int(row.Lap), "row_start": int(start), "row_end": int(end)}
+            for key in ('LapType', 'LapTime', 'FormattedTime', 'IsTimeValid', 'IsLapValidSource', 'IsComplete'):
+                value = getattr(row, key, None)
+                if value is not None: entry[key] = value.item() if hasattr(value, 'item') else value
+            ranges.append(entry)
+        return ranges
+    laps = df['Lap'].to_numpy()
+    change = np.flatnonzero(laps[1:] != laps[:-1]) + 1
+    starts = np.concatenate([[0], change]); ends = np.concatenate([change, [len(laps)]])
+    return [{"Lap": int(laps[s]), "row_start": int(s), "row_end": int(e)} for s, e in zip(starts, ends)]
+
+
+def export_channel_store(df, metadata, store_dir, laps_info_df=None, float_dtype='float64'):
+    """
+    Escribe df (salida de load_telemetry_csv) como almacén por canal en `store_dir`.
+
+    Args:
+        df (pandas.DataFrame): Telemetría limpia (requiere 'Time' y 'Lap').
+        metadata (dict): Metadatos del encabezado CSV.
+        store_dir (str): Directorio destino (se crea).
+        laps_info_df (pandas.DataFrame, opcional): Tabla de calculate_laps_improved para los offsets por vuelta.
+        float_dtype (str): 'float64' (exacto) o 'float32' (mitad de tamaño).
+
+    Returns:
+        dict: Manifiesto escrito.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    df = df.sort_values('Time', kind='stable').reset_index(drop=True)
+    channels = {}
+    for col in df.columns:
+        series = df[col]; safe_name = "".join(c if c.isalnum() or c in "_-" else "_" for c in col)
+        if isinstance(series.dtype, pd.BooleanDtype) or pd.api.types.is_bool_dtype(series):
+            arr = series.astype('Int8').fillna(BOOL_NA_VALUE).to_numpy(dtype=np.int8); kind = "bool"
+        elif pd.api.types.is_integer_dtype(series):
+            arr = series.to_numpy(dtype=np.int64); kind = "int"
+        elif pd.api.types.is_float_dtype(series):
+            arr = series.to_numpy(dtype=float_dtype); kind = "float"
+        else: continue # Columnas de texto no se almacenan
+        arr = np.ascontiguousarray(arr.astype(arr.dtype.newbyteorder('<'), copy=False))
+        file_name = f"{safe_name}.bin"
+        arr.tofile(os.path.join(store_dir, file_name))
+        channels[col] = {"file": file_name, "dtype": arr.dtype.str, "kind": kind}
+
+    manifest = {"format": STORE_FORMAT, "version": STORE_VERSION, "rows": int(len(df)),
+                "metadata": metadata or {}, "channels": channels, "laps": _lap_row_ranges(df, laps_info_df)}
+    tmp_path = os.path.join(store_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f: json.dump(manifest, f, indent=1, ensure_ascii=False, default=str)
+    os.replace(tmp_path, os.path.join(store_dir, MANIFEST_NAME)) # El manifiesto se escribe el último
+    return manifest
+
+
+class ChannelStore:
+    """Lector de un almacén por canal. Los canales se mapean en memoria al primer acceso."""
+
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, MANIFEST_NAME), "r", encoding="utf-8") as f: self.manifest = json.load(f)
+        if self.manifest.get("format") != STORE_FORMAT: raise ValueError(f"'{store_dir}' no es un almacén de canales válido.")
+        self.rows = self.manifest["rows"]
+        self.metadata = self.manifest.get("metadata", {})
+        self._maps = {}
+        self._laps = {entry["Lap"]: entry for entry in self.manifest["laps"]}
+
+    @property
+    def channels(self):
+        return list(self.manifest["channels"])
+
+    @property
+    def laps(self):
+        return list(self._laps)
+
+    def channel(self, name):
+        """Array completo del canal (np.memmap de solo lectura, sin copia)."""
+        if name not in self._maps:
+            info = self.manifest["channels"].get(name)
+            if info is None: raise KeyError(f"Canal no encontrado: {name}")
+            path = os.path.join(self.store_dir, info["file"])
+            self._maps[name] = np.memmap(path, dtype=np.dtype(info["dtype"]), mode='r', shape=(self.rows,)) if self.rows else np.empty(0, dtype=info["dtype"])
+        return self._maps[name]
+
+    def lap_rows(self, lap_number):
+        """slice de filas de una vuelta."""
+        entry = self._laps.get(int(lap_number))
+        if entry is None: raise KeyError(f"Vuelta no encontrada: {lap_number}")
+        return slice(entry["row_start"], entry["row_end"])
+
+    def lap_channel(self, lap_number, name):
+        """Vista sin copia de las muestras de `name` en la vuelta indicada."""
+        return self.channel(name)[self.lap_rows(lap_number)]
+
+    def lap_info(self, lap_number):
+        return dict(self._laps[int(lap_number)])
+
+    def laps_dataframe(self):
+        """Tabla de vueltas guardada (mismas columnas que calculate_laps_improved si se exportó con ella)."""
+        return pd.DataFrame(self.manifest["laps"])
+
+    def to_dataframe(self, channels=None, lap_number=None):
+        """DataFrame (copia) con los canales pedidos, de la sesión completa o de una vuelta."""
+        rows = self.lap_rows(lap_number) if lap_number is not None else slice(None)
+        data = {}
+        for name in (channels or self.channels):
+            arr = np.asarray(self.channel(name)[rows])
+            if self.manifest["channels"][name]["kind"] == "bool":
+                arr = pd.array(np.where(arr == BOOL_NA_VALUE, None, arr == 1), dtype=pd.BooleanDtype())
+            data[name] = arr
+        return pd.DataFrame(data)
+
+    def close(self):
+        self._maps.clear()
+
+
+def open_channel_store(store_dir):
+    """Abre un almacén por canal para lectura mapeada en memoria."""
+    return ChannelStore(store_dir)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Almacén binario por canal (memory-mapped).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_exp = sub.add_parser("export", help="Convierte un Telemetry.csv en almacén por canal")
+    p_exp.add_argument("csv"); p_exp.add_argument("store_dir")
+    p_exp.add_argument("--float32", action="store_true", help="Guardar canales flotantes en float32")
+    p_info = sub.add_parser("info", help="Muestra el contenido de un almacén")
+    p_info.add_argument("store_dir")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from data_loader import load_telemetry_csv
+        from main import calculate_laps_improved, estimate_min_lap_time
+        df, metadata = load_telemetry_csv(args.csv)
+        if df is None: return 1
+        laps_info_df = calculate_laps_improved(df, estimate_min_lap_time(metadata))
+        manifest = export_channel_store(df, metadata, args.store_dir, laps_info_df,
+                                        float_dtype='float32' if args.float32 else 'float64')
+        print(f"Almacén escrito en {args.store_dir}: {manifest['rows']} filas, {len(manifest['channels'])} canales, {len(manifest['laps'])} vueltas.")
+    else:
+        store = open_channel_store(args.store_dir)
+        size = sum(os.path.getsize(os.path.join(args.store_dir, c["file"])) for c in store.manifest["channels"].values())
+        print(f"{args.store_dir}: {store.rows} filas, {len(store.channels)} canales, {size / 1e6:.1f} MB")
+        print(store.laps_dataframe().to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# cross_session.py (Comparativa piloto vs piloto entre archivos distintos sin concatenar sesiones)
+#
+# Cada sesión se abre como fuente de vueltas: un Telemetry.csv o un almacén por canal
+# (channel_store). Del CSV se indexan una vez las columnas Time/Lap/IsLapValid (rango de
+# filas por vuelta, guardado en CACHE_DIR/session_index/) y después se leen SOLO las
+# filas y columnas de la vuelta pedida (skiprows/nrows/usecols). Del almacén se toman
+# vistas memmap de la vuelta. Las dos vueltas se alinean sobre una rejilla común de
+# distancia (lap_alignment.align_lap_frames) y se dibujan con el dashboard comparativo.
+# Con --overlay se superponen N vueltas de varias sesiones o pilotos (selectores 'valid',
+# 'all' o '3,5,7' por archivo): del CSV se leen todas las vueltas pedidas en una sola
+# lectura del rango de filas que las contiene, y el gráfico es plotter.plot_lap_overlay
+# (color por tiempo de vuelta, la más rápida resaltada).
+#
+# Uso:
+#   python cross_session.py mio/Telemetry.csv:best companero/Telemetry.csv:best
+#   python cross_session.py mio/Telemetry.csv:7 ref.rts:best --alignment position --save comp.png
+#   python cross_session.py mio/Telemetry.csv:best ref:Hockenheim        # Biblioteca de referencias
+#   python cross_session.py a/Telemetry.csv:valid b/Telemetry.csv:3,5,7 ref:Hockenheim --overlay
+
+import argparse
+import hashlib
+import os
+import sys
+
+from app_cache import load_json_cache, save_json_cache
+from data_loader import (RENAME_MAP, parse_csv_header, convert_numeric_columns, convert_bool_columns,
+                         open_telemetry_stream, read_header_lines)
+from lap_alignment import align_lap_frames, build_distance_grid
+from lazy_imports import lazy_import
+from profiling import profiled, span
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+DASHBOARD_CHANNELS = ('Time', 'LapDist', 'Speed', 'Throttle', 'Brake', 'RPM', 'Gear', 'Steer')
+POSITION_CHANNELS = ('Latitude', 'Longitude')
+OVERLAY_CHANNELS = ('Time', 'LapDist', 'Speed', 'Throttle', 'Brake', 'Gear')
+INDEX_COLUMNS = {'Time (s)': 'Time', 'Lap Number': 'Lap', 'Is lap valid': 'IsLapValid'}
+SESSION_INDEX_CACHE_DIR = "session_index"
+SESSION_INDEX_VERSION = 1
+CROSS_GRID_STEP_M = 2.0 # Rejilla de la comparativa (m)
+
+
+def _resolve_lap(selector, laps_info_df):
+    """'best', 'worst' o número de vuelta -> número de vuelta (ValueError si no existe)."""
+    selector = str(selector).strip().lower()
+    valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+    if selector in ('best', 'worst'):
+        if valid.empty: raise ValueError("La sesión no tiene vueltas válidas cronometradas.")
+        return int(valid.loc[valid['LapTime'].idxmin() if selector == 'best' else valid['LapTime'].idxmax(), 'Lap'])
+    lap = int(selector)
+    if lap not in set(laps_info_df['Lap'].astype(int)): raise ValueError(f"Vuelta {lap} no encontrada.")
+    return lap
+
+
+def _resolve_laps(selector, laps_info_df):
+    """Selector de varias vueltas -> lista: 'valid' (cronometradas válidas), 'all', '3,5,7' o cualquier selector de _resolve_lap."""
+    selector = str(selector).strip().lower()
+    if selector == 'valid':
+        valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+        if valid.empty: raise ValueError("La sesión no tiene vueltas válidas cronometradas.")
+        return sorted(valid['Lap'].astype(int).tolist())
+    if selector == 'all': return sorted(laps_info_df['Lap'].astype(int).tolist())
+    return [_resolve_lap(part, laps_info_df) for part in selector.split(',') if part.strip()]
+
+
+class CsvLapSource:
+    """Telemetry.csv indexado por vuelta: lee solo las filas de la vuelta pedida."""
+
+    def __init__(self, path, refresh=False):
+        self.path = path
+        index = None if refresh else load_json_cache(self._cache_key())
+        if not index or index.get('version') != SESSION_INDEX_VERSION: index = self._build_index()
+        self.metadata = index['metadata']; self.delimiter = index['delimiter']
+        self.header_row_index = index['header_row_index']; self.columns = index['columns']
+        self.laps_info_df = pd.DataFrame(index['laps'])
+
+    def _open(self):
+        """Flujo del CSV (descomprimido en streaming si está archivado: cada lectura recorre el archivo desde el inicio)."""
+        return open_telemetry_stream(self.path)
+
+    def _cache_key(self):
+        st = os.stat(self.path)
+        key = f"{os.path.abspath(self.path)}|{st.st_size}|{int(st.st_mtime)}"
+        return os.path.join(SESSION_INDEX_CACHE_DIR, hashlib.sha1(key.encode('utf-8')).hexdigest()[:16] + ".json")
+
+    @profiled("session_index")
+    def _build_index(self):
+        """Lee solo Time/Lap/IsLapValid, calcula la tabla de vueltas y el rango de filas de cada una."""
+        from main import calculate_laps_improved, estimate_min_lap_time
+        metadata, header_row_index, delimiter = parse_csv_header(read_header_lines(self.path), verbose=False)
+        if header_row_index == -1: raise ValueError(f"No se encontró el encabezado de datos en {self.path}")
+        with span("session_index_read", bytes_read=os.path.getsize(self.path)):
+            with self._open() as source: columns = [c.strip() for c in pd.read_csv(source, delimiter=delimiter, skiprows=header_row_index, nrows=0).columns]
+            positions = [i for i, c in enumerate(columns) if c in INDEX_COLUMNS]
+            with self._open() as source: # Posición de fila = línea tras el encabezado
+                df = pd.read_csv(source, delimiter=delimiter, skiprows=header_row_index, usecols=positions, skip_blank_lines=False, low_memory=False)
+        df.columns = [INDEX_COLUMNS[c.strip()] for c in df.columns]
+        convert_numeric_columns(df); convert_bool_columns(df)
+        df['Row'] = np.arange(len(df))
+        df = df.dropna(subset=['Time', 'Lap']); df['Lap'] = df['Lap'].astype(int)
+        laps_info_df = calculate_laps_improved(df, estimate_min_lap_time(metadata, verbose=False))
+        rows = df.groupby('Lap')['Row'].agg(['min', 'max'])
+        laps = []
+        for record in laps_info_df.to_dict('records'):
+            lap = int(record['Lap'])
+            if lap not in rows.index: continue
+            record = {k: (v.item() if hasattr(v, 'item') else v) for k, v in record.items()}
+            record.update(row_start=int(rows.at[lap, 'min']), row_end=int(rows.at[lap, 'max']) + 1)
+            laps.append(record)
+        index = {'version': SESSION_INDEX_VERSION, 'path': os.path.abspath(self.path), 'metadata': metadata,
+                 'delimiter': delimiter, 'header_row_index': header_row_index, 'columns': columns, 'laps': laps}
+        save_json_cache(self._cache_key(), index)
+        return index
+
+    def lap_frame(self, lap_number, channels=DASHBOARD_CHANNELS):
+        """DataFrame de una vuelta con los canales pedidos (renombrados y convertidos como en load_telemetry_csv)."""
+        return self.lap_frames([lap_number], channels)[int(lap_number)]
+
+    def lap_frames(self, lap_numbers, channels=DASHBOARD_CHANNELS):
+        """{vuelta: DataFrame} de varias vueltas con UNA lectura del rango de filas que las contiene."""
+        lap_numbers = [int(l) for l in lap_numbers]
+        entries = self.laps_info_df[self.laps_info_df['Lap'].isin(lap_numbers)]
+        missing = set(lap_numbers) - set(entries['Lap'].astype(int))
+        if missing: raise KeyError(f"Vuelta no encontrada: {min(missing)}")
+        row_start, row_end = int(entries['row_start'].min()), int(entries['row_end'].max())
+        renamed = [RENAME_MAP.get(c, c) for c in self.columns]
+        wanted = set(channels) | {'Lap', 'Speed_ms'}
+        positions = [i for i, name in enumerate(renamed) if name in wanted]
+        with span("lap_rows_read", rows=row_end - row_start, columns=len(positions)):
+            with self._open() as source:
+                df = pd.read_csv(source, delimiter=self.delimiter, skiprows=self.header_row_index + 1 + row_start,
+                                 nrows=row_end - row_start, header=None, names=renamed, usecols=positions,
+                                 skip_blank_lines=False, low_memory=False)
+        convert_numeric_columns(df); convert_bool_columns(df)
+        if 'Speed' not in df.columns and 'Speed_ms' in df.columns: df['Speed'] = df['Speed_ms'] * 3.6
+        groups = dict(tuple(df[df['Lap'].isin(lap_numbers)].groupby('Lap', sort=False)))
+        return {lap: (groups[lap] if lap in groups else df.iloc[:0]).sort_values('Time', kind='stable').reset_index(drop=True) for lap in lap_numbers}
+
+
+class StoreLapSource:
+    """Almacén por canal (channel_store): la vuelta se lee de las vistas memmap."""
+
+    def __init__(self, path):
+        from channel_store import open_channel_store
+        self.path = path; self.store = open_channel_store(path)
+        self.metadata = self.store.metadata; self.laps_info_df = self.store.laps_dataframe()
+
+    def lap_frame(self, lap_number, channels=DASHBOARD_CHANNELS):
+        available = [c for c in dict.fromkeys(tuple(channels) + ('Lap',)) if c in self.store.channels]
+        return self.store.to_dataframe(available, lap_number=lap_number)
+
+
+class FrameLapSource:
+    """Sesión ya cargada en memoria (load_telemetry_csv): se extraen solo las filas de la vuelta."""
+
+    def __init__(self, df, metadata, laps_info_df, path="sesion"):
+        self.df = df; self.metadata = metadata or {}; self.laps_info_df = laps_info_df; self.path = path
+
+    def lap_frame(self, lap_number, channels=DASHBOARD_CHANNELS):
+        columns = [c for c in dict.fromkeys(tuple(channels) + ('Lap',)) if c in self.df.columns]
+        return self.df.loc[self.df['Lap'] == int(lap_number), columns].sort_values('Time', kind='stable').reset_index(drop=True)
+
+
+def open_lap_source(path, refresh=False):
+    """Fuente de vueltas para un CSV, un directorio de almacén por canal o 'ref:<id o texto>' (reference_library)."""
+    if path.startswith('ref:'):
+        from reference_library import open_reference_source
+        return open_reference_source(path)
+    if os.path.isdir(path): return StoreLapSource(path)
+    return CsvLapSource(path, refresh=refresh)
+
+
+def parse_lap_spec(spec):
+    """'ruta:selector' -> (ruta, selector); sin ':' se usa la mejor vuelta. 'ref:...' es una sola vuelta de la biblioteca."""
+    if spec.startswith('ref:'): return spec, 'best'
+    path, sep, selector = spec.rpartition(':')
+    if not sep or not path or os.sep in selector or '/' in selector: return spec, 'best' # 'C:\\...' o sin selector
+    return path, selector
+
+
+def _lap_label(source, lap_number):
+    driver = source.metadata.get('Driver') or os.path.basename(os.path.dirname(os.path.abspath(source.path))) or 'Piloto'
+    info = source.laps_info_df[source.laps_info_df['Lap'] == lap_number]
+    lap_time = info['FormattedTime'].iloc[0] if not info.empty and 'FormattedTime' in info else None
+    return f"{driver} V{lap_number}" + (f" ({lap_time})" if lap_time else "")
+
+
+def _lap_time(source, lap_number):
+    info = source.laps_info_df[source.laps_info_df['Lap'] == lap_number]
+    return float(info['LapTime'].iloc[0]) if not info.empty and pd.notna(info['LapTime'].iloc[0]) else np.nan
+
+
+@profiled("load_cross_session_laps")
+def load_cross_session_laps(lap_specs, channels=DASHBOARD_CHANNELS, alignment='distance', grid_step=CROSS_GRID_STEP_M, multi_lap=False):
+    """
+    Carga y alinea vueltas de sesiones distintas.
+
+    Args:
+        lap_specs (list): [(ruta o fuente, selector de vuelta)]; la primera es la vuelta analizada y la última la referencia.
+        alignment (str): 'distance' (LapDist) o 'position' (GPS, referencia = última vuelta).
+        multi_lap (bool): Los selectores pueden dar varias vueltas ('valid', 'all', '3,5,7'), leídas juntas por fuente.
+
+    Returns:
+        tuple: (lista de DataFrames alineados con 'LapDist' = rejilla, etiquetas, fuentes); una entrada por vuelta,
+        con su tiempo de vuelta en attrs['LapTime'].
+    """
+    sources, frames, labels, lap_times = [], [], [], []
+    wanted = tuple(channels) + (POSITION_CHANNELS if alignment == 'position' else ())
+    for source, selector in lap_specs:
+        if isinstance(source, str): source = open_lap_source(source)
+        lap_numbers = _resolve_laps(selector, source.laps_info_df) if multi_lap else [_resolve_lap(selector, source.laps_info_df)]
+        if hasattr(source, 'lap_frames'): lap_frames = source.lap_frames(lap_numbers, wanted)
+        else: lap_frames = {lap: source.lap_frame(lap, wanted) for lap in lap_numbers}
+        for lap_number in lap_numbers:
+            frame = lap_frames[lap_number]
+            if frame.empty: raise ValueError(f"Vuelta {lap_number} sin datos en {source.path}")
+            sources.append(source); frames.append(frame); labels.append(_lap_label(source, lap_number))
+            lap_times.append(_lap_time(source, lap_number))
+    if alignment == 'position':
+        from spatial_index import position_aligned_distance
+        reference = frames[-1]
+        for k, frame in enumerate(frames[:-1]):
+            try: frames[k] = frame.assign(LapDist=position_aligned_distance(reference, frame)).sort_values('LapDist', kind='stable')
+            except (KeyError, ValueError) as e_align: print(f"Adv: Alineación por posición no disponible ({e_align}); se usa LapDist.")
+    channels = [c for c in channels if c != 'LapDist']
+    max_dist = max(float(np.nanmax(f['LapDist'].to_numpy(dtype=float))) for f in frames)
+    grid, aligned = align_lap_frames(frames, channels, grid=build_distance_grid(max_dist, grid_step))
+    aligned_frames = [pd.DataFrame({'LapDist': grid, **{c: aligned[c][k] for c in aligned}}) for k in range(len(frames))]
+    for aligned_frame, lap_time in zip(aligned_frames, lap_times): aligned_frame.attrs['LapTime'] = lap_time
+    return aligned_frames, labels, sources
+
+
+def compare_session_laps(lap_spec, reference_spec, alignment='distance', grid_step=CROSS_GRID_STEP_M, save_path=None):
+    """Dashboard comparativo entre una vuelta y una referencia de archivos distintos ((ruta, selector) cada una)."""
+    from plotter import plot_dashboard_frames
+    frames, labels, sources = load_cross_session_laps([lap_spec, reference_spec], alignment=alignment, grid_step=grid_step)
+    plot_dashboard_frames(frames[0], frames[1], dict(sources[-1].metadata), labels[0], labels[1], save_path=save_path)
+    return frames, labels
+
+
+def overlay_session_laps(lap_specs, channels=OVERLAY_CHANNELS, alignment='distance', grid_step=CROSS_GRID_STEP_M, save_path=None):
+    """
+    Superposición de N vueltas de varias sesiones/pilotos ((ruta, selector) cada una; selectores de varias vueltas
+    permitidos) con plotter.plot_lap_overlay: color por tiempo de vuelta y la más rápida resaltada.
+    Con alignment='position' la referencia es la última vuelta de la lista.
+    """
+    from plotter import plot_lap_overlay
+    frames, labels, sources = load_cross_session_laps(lap_specs, channels=channels, alignment=alignment, grid_step=grid_step, multi_lap=True)
+    if len(frames) < 2: raise ValueError("Se necesitan al menos 2 vueltas para la superposición.")
+    grid = frames[0]['LapDist'].to_numpy()
+    aligned = {c: np.vstack([f[c].to_numpy(dtype=float) for f in frames]) for c in frames[0].columns if c != 'LapDist'}
+    lap_times = [f.attrs.get('LapTime', np.nan) for f in frames]
+    n_sessions = len({s.path for s in sources})
+    title = f"Superposición de {len(frames)} vueltas de {n_sessions} sesión(es)\n{sources[-1].metadata.get('Vehicle', 'Vehículo')} @ {sources[-1].metadata.get('Track', 'Pista')}"
+    plot_lap_overlay(grid, aligned, labels, lap_times, dict(sources[-1].metadata), title=title, save_path=save_path)
+    return frames, labels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Comparativa de vueltas entre archivos de telemetría distintos.")
+    parser.add_argument("laps", nargs='+', help="Vuelta analizada y referencia: ruta[:best|worst|N] (CSV o almacén por canal); "
+                                                "con --overlay, N rutas[:best|worst|N|valid|all|3,5,7]")
+    parser.add_argument("--overlay", action="store_true", help="Superponer todas las vueltas pedidas (color por tiempo de vuelta)")
+    parser.add_argument("--alignment", choices=('distance', 'position'), default='distance')
+    parser.add_argument("--grid-step", type=float, default=CROSS_GRID_STEP_M, help="Paso de la rejilla de distancia (m)")
+    parser.add_argument("--save", default=None, help="Guardar PNG en lugar de mostrar")
+    args = parser.parse_args(argv)
+    if not args.overlay and len(args.laps) != 2: parser.error("sin --overlay se necesitan exactamente 2 vueltas (analizada y referencia)")
+    if args.save: import matplotlib; matplotlib.use("Agg")
+    specs = [parse_lap_spec(spec) for spec in args.laps]
+    try:
+        if args.overlay: overlay_session_laps(specs, alignment=args.alignment, grid_step=args.grid_step, save_path=args.save)
+        else: compare_session_laps(specs[0], specs[1], args.alignment, args.grid_step, args.save)
+    except (OSError, KeyError, ValueError) as e: print(f"Error: {e}"); return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,280 @@
-import pandas as pd
 import os
 import io
 import re # Importar regular expressions para limpieza más avanzada
+import time
+
+from lazy_imports import lazy_import, is_module_available
+from profiling import span
+
+pd = lazy_import('pandas') # Import diferido: solo se paga al cargar el primer CSV
+
+# --- ARCHIVOS COMPRIMIDOS ---
+# La compresión se detecta por los bytes mágicos (no por la extensión) y se descomprime en streaming
+COMPRESSION_MAGIC = ((b'\x1f\x8b', 'gzip'), (b'\x28\xb5\x2f\xfd', 'zstd'), (b'BZh', 'bz2'), (b'\xfd7zXZ\x00', 'xz'))
+TELEMETRY_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.csv.bz2', '.csv.xz') # Lo que buscan main/batch
+HEADER_SCAN_LINES = 20 # Líneas leídas para metadatos y encabezado
+
+# --- MAPA DE RENOMBRADO EXTENDIDO ---
+# Añade/modifica según sea necesario basado en tus columnas exactas
+RENAME_MAP = {
+    # Core / Timing
+    'Time (s)': 'Time',
+    'Server Time (s)': 'ServerTime',
+    'Lap Number': 'Lap',
+    'Current Lap Distance (m)': 'LapDist',
+    'Current Lap Distance Pct': 'LapDistPct',
+    'Best Lap Time (s)': 'BestLapTime',
+    'Best Lap Number': 'BestLapNum',
+    'Is lap valid': 'IsLapValid', # Booleano
+
+    # Inputs
+    'Throttle Pedal Pos': 'Throttle',
+    'Brake Pedal Pos': 'Brake',
+    'Clutch Pedal Pos': 'Clutch',
+    'Steering Wheel Angle (deg)': 'Steer',
+    'Steering Shaft Torque (Nm)': 'SteerTorque',
+    'Normalized Steering Shaft Torque': 'SteerTorqueNorm',
+    'Gear Index': 'Gear',
+
+    # Physics / Motion
+    'Speed (m/s)': 'Speed_ms', # Mantener m/s para cálculos si es necesario
+    'Speed (Kmh)': 'Speed', # Usar Kmh como principal si existe
+    'Lateral Acceleration (m/s^2)': 'G_Lat',
+    'Longitudinal Acceleration (m/s^2)': 'G_Lon',
+    'Vertical Acceleration (m/s^2)': 'G_Vert',
+    'Rotation Pitch (rad)': 'Pitch',
+    'Rotation Pitch Rate (rad/s)': 'PitchRate',
+    'Rotation Roll (rad)': 'Roll',
+    'Rotation Roll Rate (rad/s)': 'RollRate',
+    'Rotation Yaw (rad)': 'Yaw',
+    'Rotation Yaw Rate (rad/s)': 'YawRate',
+
+    # Engine / Fuel
+    'Engine Revolituions Per Minute (RPM)': 'RPM', # Corregir typo común
+    'Engine Revolutions Per Minute (RPM)': 'RPM', # Nombre correcto
+    'Fuel Level (l)': 'Fuel',
+
+    # Wheels (Ejemplo para LF, replicar para RF, LR, RR)
+    'LF Ride Height (m)': 'LF_RideHeight',
+    'LF Pressure (kPa)': 'LF_Pressure',
+    'LF Inner Average Temperature (C)': 'LF_Temp_Inner', # Simplificado
+    'LF Surface Average Temperature (C)': 'LF_Temp_Surface', # Simplificado
+    'LF Wear': 'LF_Wear',
+    'LF Slip Angle (rad)': 'LF_SlipAngle',
+    'LF Revolutions per minute (RPM)': 'LF_WheelRPM',
+    'RF Ride Height (m)': 'RF_RideHeight',
+    'RF Pressure (kPa)': 'RF_Pressure',
+    'RF Inner Average Temperature (C)': 'RF_Temp_Inner',
+    'RF Surface Average Temperature (C)': 'RF_Temp_Surface',
+    'RF Wear': 'RF_Wear',
+    'RF Slip Angle (rad)': 'RF_SlipAngle',
+    'RF Revolutions per minute (RPM)': 'RF_WheelRPM',
+    'LR Ride Height (m)': 'LR_RideHeight',
+    'LR Pressure (kPa)': 'LR_Pressure',
+    'LR Inner Average Temperature (C)': 'LR_Temp_Inner',
+    'LR Surface Average Temperature (C)': 'LR_Temp_Surface',
+    'LR Wear': 'LR_Wear',
+    'LR Slip Angle (rad)': 'LR_SlipAngle',
+    'LR Revolutions per minute (RPM)': 'LR_WheelRPM',
+    'RR Ride Height (m)': 'RR_RideHeight',
+    'RR Pressure (kPa)': 'RR_Pressure',
+    'RR Inner Average Temperature (C)': 'RR_Temp_Inner',
+    'RR Surface Average Temperature (C)': 'RR_Temp_Surface',
+    'RR Wear': 'RR_Wear',
+    'RR Slip Angle (rad)': 'RR_SlipAngle',
+    'RR Revolutions per minute (RPM)': 'RR_WheelRPM',
+
+    # Position
+    'Altitude (m)': 'Altitude',
+    'Latitude (deg)': 'Latitude',
+    'Longitude (deg)': 'Longitude',
+
+    # Assists / Status
+    'ABS Active': 'ABSActive', # Booleano
+    'ABS Enabled': 'ABSEnabled', # Booleano
+    'ABS Level': 'ABSLevel',
+    'Traction Control Active': 'TCActive', # Booleano
+    'Traction Control Enabled': 'TCEnabled', # Booleano
+    'Traction Control Level': 'TCLevel',
+    'Speed Limiter On': 'SpeedLimiter', # Booleano
+    'Brake Bias': 'BrakeBias',
+    'Driver Marker': 'DriverMarker' # Booleano?
+}
+
+# Lista más completa para conversión numérica
+NUMERIC_COLUMNS = [
+    'Time', 'ServerTime', 'Lap', 'LapDist', 'LapDistPct', 'BestLapTime', 'BestLapNum',
+    'Throttle', 'Brake', 'Clutch', 'Steer', 'SteerTorque', 'SteerTorqueNorm', 'Gear',
+    'Speed_ms', 'Speed', 'G_Lat', 'G_Lon', 'G_Vert',
+    'Pitch', 'PitchRate', 'Roll', 'RollRate', 'Yaw', 'YawRate',
+    'RPM', 'Fuel',
+    'LF_RideHeight', 'LF_Pressure', 'LF_Temp_Inner', 'LF_Temp_Surface', 'LF_Wear', 'LF_SlipAngle', 'LF_WheelRPM',
+    'RF_RideHeight', 'RF_Pressure', 'RF_Temp_Inner', 'RF_Temp_Surface', 'RF_Wear', 'RF_SlipAngle', 'RF_WheelRPM',
+    'LR_RideHeight', 'LR_Pressure', 'LR_Temp_Inner', 'LR_Temp_Surface', 'LR_Wear', 'LR_SlipAngle', 'LR_WheelRPM',
+    'RR_RideHeight', 'RR_Pressure', 'RR_Temp_Inner', 'RR_Temp_Surface', 'RR_Wear', 'RR_SlipAngle', 'RR_WheelRPM',
+    'Altitude', 'Latitude', 'Longitude',
+    'ABSLevel', 'TCLevel', 'BrakeBias'
+]
+
+# Columnas booleanas (strings 'True'/'False' en el CSV)
+BOOL_COLUMNS = [
+    'ABSActive', 'ABSEnabled', 'TCActive', 'TCEnabled',
+    'SpeedLimiter', 'DriverMarker', 'IsLapValid'
+]
+
+
+def detect_compression(filepath):
+    """'gzip', 'zstd', 'bz2', 'xz' según los bytes mágicos del archivo, o None si es texto plano."""
+    with open(filepath, 'rb') as f: head = f.read(6)
+    for magic, kind in COMPRESSION_MAGIC:
+        if head.startswith(magic): return kind
+    return None
+
+
+def is_telemetry_file(filepath):
+    """True si el nombre es un CSV de telemetría, plano o archivado (TELEMETRY_EXTENSIONS)."""
+    return filepath.lower().endswith(TELEMETRY_EXTENSIONS)
+
+
+class _CountingReader(io.RawIOBase):
+    """Archivo comprimido en disco que cuenta los bytes consumidos por el descompresor."""
+
+    def __init__(self, raw):
+        self.raw = raw; self.bytes_read = 0
+
+    def readable(self): return True
+
+    def readinto(self, b):
+        n = self.raw.readinto(b) or 0
+        self.bytes_read += n
+        return n
+
+    def close(self):
+        self.raw.close(); super().close()
+
+
+class DecompressedStream(io.RawIOBase):
+    """
+    Flujo binario descomprimido de un CSV archivado (sin copia temporal en disco).
+
+    Acumula bytes comprimidos/descomprimidos y el tiempo dedicado a descomprimir
+    para informar del rendimiento (throughput_mb_s).
+    """
+
+    def __init__(self, filepath, compression):
+        self.compression = compression; self.compressed = _CountingReader(open(filepath, 'rb'))
+        self.bytes_out = 0; self.decompress_s = 0.0
+        if compression == 'gzip':
+            import gzip; self.decoder = gzip.GzipFile(fileobj=self.compressed)
+        elif compression == 'bz2':
+            import bz2; self.decoder = bz2.BZ2File(self.compressed)
+        elif compression == 'xz':
+            import lzma; self.decoder = lzma.LZMAFile(self.compressed)
+        elif compression == 'zstd':
+            if not is_module_available('zstandard'):
+                self.compressed.close(); raise ImportError("Archivo .zst: instala 'zstandard' (pip install zstandard).")
+            import zstandard; self.decoder = zstandard.ZstdDecompressor().stream_reader(self.compressed, read_across_frames=True)
+        else:
+            self.compressed.close(); raise ValueError(f"Compresión no soportada: {compression}")
+
+    def readable(self): return True
+
+    def readinto(self, b):
+        t0 = time.perf_counter()
+        data = self.decoder.read(len(b))
+        self.decompress_s += time.perf_counter() - t0
+        n = len(data); b[:n] = data; self.bytes_out += n
+        return n
+
+    def close(self):
+        if not self.closed: self.decoder.close(); self.compressed.close()
+        super().close()
+
+    @property
+    def throughput_mb_s(self):
+        return self.bytes_out / 1e6 / self.decompress_s if self.decompress_s > 0 else None
+
+    def summary(self):
+        """Texto de rendimiento: tamaños, ratio y MB/s descomprimidos."""
+        ratio = self.bytes_out / self.compressed.bytes_read if self.compressed.bytes_read else 0.0
+        rate = self.throughput_mb_s
+        return (f"Descompresión {self.compression}: {self.compressed.bytes_read / 1e6:.1f} MB -> {self.bytes_out / 1e6:.1f} MB "
+                f"(x{ratio:.1f}) en {self.decompress_s:.2f} s" + (f" ({rate:.0f} MB/s)" if rate else ""))
+
+
+def open_telemetry_stream(filepath, compression=None):
+    """Flujo binario con búfer del contenido (descomprimido si hace falta). `compression` se detecta si es None."""
+    compression = compression or detect_compression(filepath)
+    if compression is None: return open(filepath, 'rb')
+    return io.BufferedReader(DecompressedStream(filepath, compression), buffer_size=1 << 20)
+
+
+def read_header_lines(filepath, n_lines=HEADER_SCAN_LINES):
+    """Primeras líneas de texto del CSV (plano o comprimido; solo se descomprime el principio)."""
+    with open_telemetry_stream(filepath) as raw, io.TextIOWrapper(raw, encoding='utf-8', errors='ignore') as f:
+        return [f.readline() for _ in range(n_lines)]
+
+
+def parse_csv_header(lines, verbose=True):
+    """
+    Analiza las primeras líneas de un Telemetry.csv: metadatos ('Clave:;Valor'),
+    delimitador y fila del encabezado de datos.
+
+    Returns:
+        tuple: (dict metadatos, int índice de la fila de encabezado o -1, str delimitador o None)
+    """
+    metadata = {}
+    header_row_index = -1
+    delimiter = None
+    for i, line in enumerate(lines):
+        line = line.strip()
+        if not line: continue
+        if delimiter is None:
+            if ';' in line and line.count(';') > 1: delimiter = ';'
+            elif ',' in line and line.count(',') > 1: delimiter = ','
+        current_delimiter = delimiter if delimiter else ';'
+        if ':' in line and current_delimiter in line:
+             parts = line.split(current_delimiter, 1)
+             key = parts[0].replace(':', '').strip()
+             value = parts[1].strip() if len(parts) > 1 else ''
+             if key and value: metadata[key] = value
+        # Usamos nombres clave del encabezado para identificarlo
+        if 'Time (s)' in line and 'Lap Number' in line and 'Speed (m/s)' in line and current_delimiter in line:
+            header_row_index = i
+            if delimiter:
+                if verbose: print(f"Detectado delimitador: '{delimiter}'")
+            else:
+                delimiter = ';'
+                if verbose: print("Advertencia: Delimitador no detectado, usando ';'")
+            if verbose: print(f"Detectada fila de encabezado de datos en línea: {header_row_index + 1}")
+            break
+    return metadata, header_row_index, delimiter
+
+
+def rename_telemetry_columns(df):
+    """Renombra in-place las columnas de RENAME_MAP presentes en df. Devuelve el mapa aplicado."""
+    actual_rename_map = {k: v for k, v in RENAME_MAP.items() if k in df.columns}
+    df.rename(columns=actual_rename_map, inplace=True)
+    return actual_rename_map
+
+
+def convert_numeric_columns(df):
+    """Convierte in-place a numérico (NaN si no se puede) las columnas de NUMERIC_COLUMNS presentes."""
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+
+def convert_bool_columns(df):
+    """Convierte in-place las columnas de BOOL_COLUMNS ('True'/'False') a booleano nullable."""
+    for col in BOOL_COLUMNS:
+        if col in df.columns:
+             # Convertir 'True'/'False' strings a booleanos, manejar otros casos como NaN/None
+             if pd.api.types.is_string_dtype(df[col]):
+                 df[col] = df[col].str.lower().map({'true': True, 'false': False}).astype(pd.BooleanDtype()) # Usar tipo Booleano nullable
+             elif pd.api.types.is_bool_dtype(df[col]):
+                  df[col] = df[col].astype(pd.BooleanDtype()) # Asegurar tipo nullable
+
 
 def load_telemetry_csv(filepath):
     """
@@ -9,7 +282,7 @@ def load_telemetry_csv(filepath):
     y extrae los metadatos del encabezado. Limpia y renombra columnas comunes.
 
     Args:
-        filepath (str): Ruta completa al archivo Telemetry.csv.
+        filepath (str): Ruta completa al archivo Telemetry.csv (plano o comprimido: gzip, zstd, bz2, xz).
 
     Returns:
         tuple: (pandas.DataFrame or None, dict or None)
@@ -19,7 +292,6 @@ def load_telemetry_csv(filepath):
     print(f"Intentando cargar archivo: {filepath}")
     metadata = {}
     header_row_index = -1
-    delimiter = None
 
     if not os.path.exists(filepath):
         print(f"Error: El archivo no existe en la ruta: {filepath}")
@@ -27,30 +299,14 @@ def load_telemetry_csv(filepath):
 
     try:
         # Leer primeras líneas para metadatos y encabezado
-        with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-            potential_header_lines = [f.readline() for _ in range(20)]
-
-        print("--- Analizando encabezado del CSV ---")
-        # (Lógica de detección de metadatos y encabezado - sin cambios)
-        for i, line in enumerate(potential_header_lines):
-            line = line.strip()
-            if not line: continue
-            if delimiter is None:
-                if ';' in line and line.count(';') > 1: delimiter = ';'
-                elif ',' in line and line.count(',') > 1: delimiter = ','
-            current_delimiter = delimiter if delimiter else ';'
-            if ':' in line and current_delimiter in line:
-                 parts = line.split(current_delimiter, 1)
-                 key = parts[0].replace(':', '').strip()
-                 value = parts[1].strip() if len(parts) > 1 else ''
-                 if key and value: metadata[key] = value
-            # Usamos nombres clave del encabezado para identificarlo
-            if 'Time (s)' in line and 'Lap Number' in line and 'Speed (m/s)' in line and current_delimiter in line:
-                header_row_index = i
-                if delimiter: print(f"Detectado delimitador: '{delimiter}'")
-                else: delimiter = ';'; print("Advertencia: Delimitador no detectado, usando ';'")
-                print(f"Detectada fila de encabezado de datos en línea: {header_row_index + 1}")
-                break
+        with span("csv_header_scan") as header_span:
+            compression = detect_compression(filepath)
+            if compression: print(f"Archivo comprimido detectado ({compression}): descompresión en streaming.")
+            potential_header_lines = read_header_lines(filepath)
+            header_span.add(bytes_read=sum(len(l.encode('utf-8')) for l in potential_header_lines))
+
+            print("--- Analizando encabezado del CSV ---")
+            metadata, header_row_index, delimiter = parse_csv_header(potential_header_lines)
 
         if header_row_index == -1:
             print("Error: No se pudo encontrar la fila del encabezado de datos.")
@@ -58,106 +314,29 @@ def load_telemetry_csv(filepath):
 
         # Cargar datos con pandas
         print(f"\n--- Cargando datos tabulares con pandas (skiprows={header_row_index}) ---")
-        df = pd.read_csv(filepath,
-                         delimiter=delimiter,
-                         skiprows=header_row_index,
-                         low_memory=False)
+        with span("read_csv", bytes_read=os.path.getsize(filepath), compression=compression) as read_span:
+            source = open_telemetry_stream(filepath, compression) if compression else filepath
+            try:
+                df = pd.read_csv(source,
+                                 delimiter=delimiter,
+                                 skiprows=header_row_index,
+                                 low_memory=False)
+            finally:
+                if compression: source.close()
+            read_span.add(rows=len(df), columns=len(df.columns))
+            if compression:
+                stream = source.raw
+                read_span.add(bytes_decompressed=stream.bytes_out, decompress_s=stream.decompress_s)
+                print(stream.summary())
         print(f"Archivo CSV '{os.path.basename(filepath)}' leído, procesando...")
 
         # --- Limpieza y Preparación ---
         df.columns = df.columns.str.strip() # Limpiar espacios
 
-        # --- MAPA DE RENOMBRADO EXTENDIDO ---
-        # Añade/modifica según sea necesario basado en tus columnas exactas
-        rename_map = {
-            # Core / Timing
-            'Time (s)': 'Time',
-            'Server Time (s)': 'ServerTime',
-            'Lap Number': 'Lap',
-            'Current Lap Distance (m)': 'LapDist',
-            'Current Lap Distance Pct': 'LapDistPct',
-            'Best Lap Time (s)': 'BestLapTime',
-            'Best Lap Number': 'BestLapNum',
-            'Is lap valid': 'IsLapValid', # Booleano
-
-            # Inputs
-            'Throttle Pedal Pos': 'Throttle',
-            'Brake Pedal Pos': 'Brake',
-            'Clutch Pedal Pos': 'Clutch',
-            'Steering Wheel Angle (deg)': 'Steer',
-            'Steering Shaft Torque (Nm)': 'SteerTorque',
-            'Normalized Steering Shaft Torque': 'SteerTorqueNorm',
-            'Gear Index': 'Gear',
-
-            # Physics / Motion
-            'Speed (m/s)': 'Speed_ms', # Mantener m/s para cálculos si es necesario
-            'Speed (Kmh)': 'Speed', # Usar Kmh como principal si existe
-            'Lateral Acceleration (m/s^2)': 'G_Lat',
-            'Longitudinal Acceleration (m/s^2)': 'G_Lon',
-            'Vertical Acceleration (m/s^2)': 'G_Vert',
-            'Rotation Pitch (rad)': 'Pitch',
-            'Rotation Pitch Rate (rad/s)': 'PitchRate',
-            'Rotation Roll (rad)': 'Roll',
-            'Rotation Roll Rate (rad/s)': 'RollRate',
-            'Rotation Yaw (rad)': 'Yaw',
-            'Rotation Yaw Rate (rad/s)': 'YawRate',
-
-            # Engine / Fuel
-            'Engine Revolituions Per Minute (RPM)': 'RPM', # Corregir typo común
-            'Engine Revolutions Per Minute (RPM)': 'RPM', # Nombre correcto
-            'Fuel Level (l)': 'Fuel',
-
-            # Wheels (Ejemplo para LF, replicar para RF, LR, RR)
-            'LF Ride Height (m)': 'LF_RideHeight',
-            'LF Pressure (kPa)': 'LF_Pressure',
-            'LF Inner Average Temperature (C)': 'LF_Temp_Inner', # Simplificado
-            'LF Surface Average Temperature (C)': 'LF_Temp_Surface', # Simplificado
-            'LF Wear': 'LF_Wear',
-            'LF Slip Angle (rad)': 'LF_SlipAngle',
-            'LF Revolutions per minute (RPM)': 'LF_WheelRPM',
-            'RF Ride Height (m)': 'RF_RideHeight',
-            'RF Pressure (kPa)': 'RF_Pressure',
-            'RF Inner Average Temperature (C)': 'RF_Temp_Inner',
-            'RF Surface Average Temperature (C)': 'RF_Temp_Surface',
-            'RF Wear': 'RF_Wear',
-            'RF Slip Angle (rad)': 'RF_SlipAngle',
-            'RF Revolutions per minute (RPM)': 'RF_WheelRPM',
-            'LR Ride Height (m)': 'LR_RideHeight',
-            'LR Pressure (kPa)': 'LR_Pressure',
-            'LR Inner Average Temperature (C)': 'LR_Temp_Inner',
-            'LR Surface Average Temperature (C)': 'LR_Temp_Surface',
-            'LR Wear': 'LR_Wear',
-            'LR Slip Angle (rad)': 'LR_SlipAngle',
-            'LR Revolutions per minute (RPM)': 'LR_WheelRPM',
-            'RR Ride Height (m)': 'RR_RideHeight',
-            'RR Pressure (kPa)': 'RR_Pressure',
-            'RR Inner Average Temperature (C)': 'RR_Temp_Inner',
-            'RR Surface Average Temperature (C)': 'RR_Temp_Surface',
-            'RR Wear': 'RR_Wear',
-            'RR Slip Angle (rad)': 'RR_SlipAngle',
-            'RR Revolutions per minute (RPM)': 'RR_WheelRPM',
-
-            # Position
-            'Altitude (m)': 'Altitude',
-            'Latitude (deg)': 'Latitude',
-            'Longitude (deg)': 'Longitude',
-
-            # Assists / Status
-            'ABS Active': 'ABSActive', # Booleano
-            'ABS Enabled': 'ABSEnabled', # Booleano
-            'ABS Level': 'ABSLevel',
-            'Traction Control Active': 'TCActive', # Booleano
-            'Traction Control Enabled': 'TCEnabled', # Booleano
-            'Traction Control Level': 'TCLevel',
-            'Speed Limiter On': 'SpeedLimiter', # Booleano
-            'Brake Bias': 'BrakeBias',
-            'Driver Marker': 'DriverMarker' # Booleano?
-        }
-
         # Aplicar renombrado solo si la columna original existe
-        actual_rename_map = {k: v for k, v in rename_map.items() if k in df.columns}
-        df.rename(columns=actual_rename_map, inplace=True)
-        print(f"Columnas renombradas (mapeadas): {len(actual_rename_map)} de {len(rename_map)}")
+        with span("rename_columns"):
+            actual_rename_map = rename_telemetry_columns(df)
+        print(f"Columnas renombradas (mapeadas): {len(actual_rename_map)} de {len(RENAME_MAP)}")
 
         # --- Conversión de Tipos y Limpieza ---
         if 'Time' not in df.columns or 'Lap' not in df.columns:
@@ -165,38 +344,14 @@ def load_telemetry_csv(filepath):
             print(f"Error: Faltan columnas esenciales ('Time', 'Lap') después del renombrado. Columnas encontradas: {df.columns.tolist()}")
             return None, metadata
 
-        # Lista más completa para conversión numérica
-        numeric_cols_to_check = [
-            'Time', 'ServerTime', 'Lap', 'LapDist', 'LapDistPct', 'BestLapTime', 'BestLapNum',
-            'Throttle', 'Brake', 'Clutch', 'Steer', 'SteerTorque', 'SteerTorqueNorm', 'Gear',
-            'Speed_ms', 'Speed', 'G_Lat', 'G_Lon', 'G_Vert',
-            'Pitch', 'PitchRate', 'Roll', 'RollRate', 'Yaw', 'YawRate',
-            'RPM', 'Fuel',
-            'LF_RideHeight', 'LF_Pressure', 'LF_Temp_Inner', 'LF_Temp_Surface', 'LF_Wear', 'LF_SlipAngle', 'LF_WheelRPM',
-            'RF_RideHeight', 'RF_Pressure', 'RF_Temp_Inner', 'RF_Temp_Surface', 'RF_Wear', 'RF_SlipAngle', 'RF_WheelRPM',
-            'LR_RideHeight', 'LR_Pressure', 'LR_Temp_Inner', 'LR_Temp_Surface', 'LR_Wear', 'LR_SlipAngle', 'LR_WheelRPM',
-            'RR_RideHeight', 'RR_Pressure', 'RR_Temp_Inner', 'RR_Temp_Surface', 'RR_Wear', 'RR_SlipAngle', 'RR_WheelRPM',
-            'Altitude', 'Latitude', 'Longitude',
-            'ABSLevel', 'TCLevel', 'BrakeBias'
-        ]
         print("Convirtiendo columnas a numérico (si aplica)...")
-        for col in numeric_cols_to_check:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
+        with span("numeric_conversion"):
+            convert_numeric_columns(df)
 
         # Conversión de booleanos (True/False strings)
-        bool_cols_to_check = [
-            'ABSActive', 'ABSEnabled', 'TCActive', 'TCEnabled',
-            'SpeedLimiter', 'DriverMarker', 'IsLapValid'
-        ]
         print("Convirtiendo columnas a booleano (si aplica)...")
-        for col in bool_cols_to_check:
-            if col in df.columns:
-                 # Convertir 'True'/'False' strings a booleanos, manejar otros casos como NaN/None
-                 if pd.api.types.is_string_dtype(df[col]):
-                     df[col] = df[col].str.lower().map({'true': True, 'false': False}).astype(pd.BooleanDtype()) # Usar tipo Booleano nullable
-                 elif pd.api.types.is_bool_dtype(df[col]):
-                      df[col] = df[col].astype(pd.BooleanDtype()) # Asegurar tipo nullable
+        with span("bool_conversion"):
+            convert_bool_columns(df)
 
 
         rows_before_drop = len(df)
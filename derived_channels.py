@@ -0,0 +1,275 @@
+# derived_channels.py (Canales derivados declarativos con dependencias, cálculo diferido y caché)
+#
+# Cada canal derivado se registra con @derived_channel indicando de qué canales depende
+# (brutos o derivados). ChannelSet resuelve un canal bajo demanda: primero la columna del
+# DataFrame si existe, si no su definición, calculando antes sus dependencias. El resultado
+# (np.ndarray float sobre todas las filas) queda en caché, así que cada análisis solo paga
+# los canales que usa y los comparte con los demás. Las derivadas temporales se calculan
+# de una vez sobre toda la sesión y se anulan en la primera muestra de cada vuelta.
+#
+# Uso:
+#   channels = channels_for(df, laps_info_df)       # ChannelSet compartido para ese DataFrame
+#   channels['BrakeReleaseRate']                    # Sesión completa (np.ndarray)
+#   channels.lap('DistToNextBrake', 7)              # Vista de la vuelta 7 (sin recalcular)
+#   python derived_channels.py Telemetry.csv:best --channels G_Lat_g Jerk_Lon DistToNextBrake
+
+import argparse
+import sys
+import time
+import weakref
+
+from lap_stats import BRAKE_THRESHOLD, lap_segments
+from lazy_imports import lazy_import
+from plotter import GRAVITY
+from tyre_analysis import CORNERS, DEFAULT_WHEEL_RADIUS_M, wheel_slip_ratio
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+class DerivedChannel:
+    """Definición de un canal derivado: nombre, dependencias, unidad y función de cálculo."""
+    __slots__ = ('name', 'dependencies', 'unit', 'description', 'compute')
+
+    def __init__(self, name, dependencies, compute, unit='', description=''):
+        self.name = name; self.dependencies = tuple(dependencies); self.compute = compute
+        self.unit = unit; self.description = description
+
+    def __repr__(self):
+        return f"<DerivedChannel {self.name} <- {', '.join(self.dependencies)}>"
+
+
+DERIVED_CHANNELS = {} # {nombre: DerivedChannel}
+
+
+def derived_channel(name, dependencies, unit='', description=''):
+    """Decorador: registra `compute(channels, *arrays_dependencias) -> np.ndarray` como canal derivado."""
+    def register(compute):
+        DERIVED_CHANNELS[name] = DerivedChannel(name, dependencies, compute, unit, description or (compute.__doc__ or '').strip())
+        return compute
+    return register
+
+
+def _as_float(series):
+    if isinstance(series.dtype, pd.BooleanDtype) or pd.api.types.is_bool_dtype(series): series = series.astype('Float64')
+    return series.to_numpy(dtype=float, na_value=np.nan)
+
+
+class ChannelSet:
+    """
+    Acceso a canales brutos y derivados de un DataFrame (sesión o vuelta) con caché por canal.
+
+    Los tramos de vuelta salen de lap_segments (laps_info_df o columna Lap); sin ninguno de
+    los dos, todo el DataFrame es un único tramo.
+    """
+
+    def __init__(self, df, laps_info_df=None, wheel_radius_m=DEFAULT_WHEEL_RADIUS_M):
+        self.df = df; self.laps_info_df = laps_info_df; self.wheel_radius_m = wheel_radius_m
+        self._cache = {}; self._segments = None; self._resolving = set()
+        self.compute_times = {} # {canal derivado: segundos de cálculo (sin dependencias)}
+
+    def __len__(self):
+        return len(self.df)
+
+    def __contains__(self, name):
+        return self.available(name)
+
+    def __getitem__(self, name):
+        cached = self._cache.get(name)
+        if cached is not None: return cached
+        if name in self.df.columns: values = _as_float(self.df[name])
+        elif name in DERIVED_CHANNELS:
+            if name in self._resolving: raise KeyError(f"Dependencia circular en el canal '{name}'.")
+            channel = DERIVED_CHANNELS[name]; self._resolving.add(name)
+            try: inputs = [self[dep] for dep in channel.dependencies]
+            finally: self._resolving.discard(name)
+            t0 = time.perf_counter()
+            values = np.asarray(channel.compute(self, *inputs), dtype=float)
+            self.compute_times[name] = time.perf_counter() - t0
+        else: raise KeyError(f"Canal no disponible: '{name}'")
+        self._cache[name] = values
+        return values
+
+    def available(self, name, _seen=None):
+        """True si el canal existe en el DataFrame o todas sus dependencias son resolubles (sin calcular nada)."""
+        if name in self._cache or name in self.df.columns: return True
+        channel = DERIVED_CHANNELS.get(name)
+        _seen = _seen or set()
+        if channel is None or name in _seen: return False
+        return all(self.available(dep, _seen | {name}) for dep in channel.dependencies)
+
+    def get(self, name, default=None):
+        """Como channels[name] pero devuelve `default` si el canal no se puede resolver."""
+        return self[name] if self.available(name) else default
+
+    @property
+    def segments(self):
+        """(lap_numbers, starts, ends) de lap_segments; un único tramo si no hay información de vueltas."""
+        if self._segments is None:
+            if (self.laps_info_df is not None and not self.laps_info_df.empty) or 'Lap' in self.df.columns:
+                self._segments = lap_segments(self.df, self.laps_info_df)
+            else: self._segments = (np.array([0]), np.array([0]), np.array([len(self.df)]))
+        return self._segments
+
+    def segment_starts_mask(self):
+        """Máscara (n,) con True en la primera fila de cada vuelta (donde una diferencia no tiene sentido)."""
+        mask = np.zeros(len(self.df), dtype=bool)
+        starts = self.segments[1]; mask[starts[starts < len(mask)]] = True
+        if len(mask): mask[0] = True
+        return mask
+
+    def segment_ids(self):
+        """Identificador de tramo por fila (cambia en cada inicio de vuelta)."""
+        return np.cumsum(self.segment_starts_mask())
+
+    def lap(self, name, lap_number):
+        """Valores del canal en una vuelta: vista sobre el array de la sesión (calculado una vez)."""
+        laps, starts, ends = self.segments
+        k = np.flatnonzero(laps == int(lap_number))
+        if k.size == 0: raise KeyError(f"Vuelta no encontrada: {lap_number}")
+        return self[name][starts[k[0]]:ends[k[0]]]
+
+    def frame(self, names):
+        """DataFrame con los canales pedidos (se calculan solo los que falten en caché)."""
+        return pd.DataFrame({name: self[name] for name in names}, index=self.df.index)
+
+    def time_derivative(self, values):
+        """d(values)/dt por diferencia hacia atrás; NaN en el inicio de cada vuelta y con dt <= 0."""
+        t = self['Time']
+        dv = np.empty_like(values); dt = np.empty_like(t)
+        dv[0] = dt[0] = np.nan
+        np.subtract(values[1:], values[:-1], out=dv[1:]); np.subtract(t[1:], t[:-1], out=dt[1:])
+        dt[self.segment_starts_mask() | ~(dt > 0)] = np.nan
+        return dv / dt
+
+
+_CHANNEL_SETS = {} # {id(DataFrame): (weakref al DataFrame, ChannelSet)}; se limpia al liberar el DataFrame
+
+
+def channels_for(df, laps_info_df=None):
+    """ChannelSet compartido para `df` (misma caché entre análisis mientras viva el DataFrame)."""
+    key = id(df); entry = _CHANNEL_SETS.get(key)
+    if entry is None or entry[0]() is not df or entry[1].laps_info_df is not laps_info_df:
+        # El ChannelSet guarda un proxy débil: la caché no mantiene vivo al DataFrame
+        entry = _CHANNEL_SETS[key] = (weakref.ref(df), ChannelSet(weakref.proxy(df), laps_info_df))
+        weakref.finalize(df, _CHANNEL_SETS.pop, key, None)
+    return entry[1]
+
+
+def required_columns(names):
+    """Columnas brutas que hay que leer para poder calcular `names` (primera alternativa definida)."""
+    needed = []
+    def visit(name, seen):
+        channel = DERIVED_CHANNELS.get(name)
+        if channel is None or name in seen:
+            if name not in needed: needed.append(name)
+            return
+        for dep in channel.dependencies: visit(dep, seen | {name})
+    for name in names: visit(name, frozenset())
+    return needed
+
+
+# --- Definiciones ---
+
+@derived_channel('Speed', ('Speed_ms',), 'km/h')
+def _speed_kmh(channels, speed_ms):
+    """Velocidad en km/h a partir de m/s."""
+    return speed_ms * 3.6
+
+
+@derived_channel('Speed_ms', ('Speed',), 'm/s')
+def _speed_ms(channels, speed_kmh):
+    """Velocidad en m/s a partir de km/h."""
+    return speed_kmh / 3.6
+
+
+for _axis in ('Lat', 'Lon', 'Vert'):
+    derived_channel(f'G_{_axis}_g', (f'G_{_axis}',), 'g', f"Aceleración G_{_axis} en unidades g.")(lambda channels, accel: accel / GRAVITY)
+
+
+@derived_channel('G_Total_g', ('G_Lat_g', 'G_Lon_g'), 'g')
+def _g_total(channels, g_lat, g_lon):
+    """Aceleración combinada en el plano (círculo de fricción)."""
+    return np.hypot(g_lat, g_lon)
+
+
+@derived_channel('Jerk_Lon', ('G_Lon',), 'm/s^3')
+def _jerk_lon(channels, g_lon):
+    """Jerk longitudinal: derivada temporal de la aceleración longitudinal."""
+    return channels.time_derivative(g_lon)
+
+
+@derived_channel('BrakeReleaseRate', ('Brake',), '1/s')
+def _brake_release_rate(channels, brake):
+    """Velocidad de liberación del freno (fracción de pedal por segundo; 0 mientras se aplica o mantiene)."""
+    return np.maximum(-channels.time_derivative(brake), 0.0)
+
+
+@derived_channel('ThrottleApplicationRate', ('Throttle',), '1/s')
+def _throttle_application_rate(channels, throttle):
+    """Velocidad de aplicación del acelerador (fracción de pedal por segundo; 0 al soltar o mantener)."""
+    return np.maximum(channels.time_derivative(throttle), 0.0)
+
+
+@derived_channel('SteerVelocity', ('Steer',), 'deg/s')
+def _steer_velocity(channels, steer):
+    """Velocidad de giro del volante."""
+    return channels.time_derivative(steer)
+
+
+for _corner in CORNERS:
+    derived_channel(f'{_corner}_SlipRatio', (f'{_corner}_WheelRPM', 'Speed_ms'), '',
+                    f"Ratio de deslizamiento longitudinal de la rueda {_corner} (tyre_analysis.wheel_slip_ratio).")(
+        lambda channels, wheel_rpm, speed_ms: wheel_slip_ratio(wheel_rpm[None, :], speed_ms, channels.wheel_radius_m)[0])
+
+
+@derived_channel('DistToNextBrake', ('LapDist', 'Brake'), 'm')
+def _dist_to_next_brake(channels, lap_dist, brake):
+    """Distancia hasta la siguiente muestra con freno (0 mientras se frena; NaN si no se vuelve a frenar en la vuelta)."""
+    braking = np.flatnonzero(brake > BRAKE_THRESHOLD)
+    out = np.full(len(lap_dist), np.nan)
+    if braking.size == 0: return out
+    pos = np.searchsorted(braking, np.arange(len(lap_dist)), side='left')
+    has_next = pos < braking.size
+    nxt = braking[np.minimum(pos, braking.size - 1)]
+    segment = channels.segment_ids()
+    same_lap = has_next & (segment[nxt] == segment)
+    out[same_lap] = lap_dist[nxt[same_lap]] - lap_dist[same_lap]
+    return out
+
+
+def main(argv=None):
+    from cross_session import _resolve_lap, open_lap_source, parse_lap_spec
+    parser = argparse.ArgumentParser(description="Calcula canales derivados de una vuelta (solo se leen las columnas necesarias).")
+    parser.add_argument("lap", nargs='?', help="ruta[:best|worst|N] (CSV, almacén por canal o ref:...)")
+    parser.add_argument("--channels", nargs='+', default=['G_Lat_g', 'G_Lon_g', 'Jerk_Lon', 'BrakeReleaseRate',
+                                                          'ThrottleApplicationRate', 'SteerVelocity', 'DistToNextBrake'])
+    parser.add_argument("--list", action="store_true", help="Lista los canales derivados registrados")
+    args = parser.parse_args(argv)
+    if args.list or not args.lap:
+        for channel in DERIVED_CHANNELS.values():
+            print(f"{channel.name:<24} [{channel.unit or '-'}] <- {', '.join(channel.dependencies):<28} {channel.description}")
+        return 0
+    unknown = [c for c in args.channels if c not in DERIVED_CHANNELS]
+    if unknown: print(f"Aviso: no son canales derivados (se leen tal cual): {', '.join(unknown)}")
+    path, selector = parse_lap_spec(args.lap)
+    try:
+        source = open_lap_source(path); lap = _resolve_lap(selector, source.laps_info_df)
+        lap_df = source.lap_frame(lap, tuple(required_columns(args.channels)) + ('Time',))
+    except (OSError, KeyError, ValueError) as e: print(f"Error: {e}"); return 1
+    channels = ChannelSet(lap_df)
+    print(f"Vuelta {lap} ({len(lap_df)} muestras, columnas leídas: {', '.join(c for c in lap_df.columns)})")
+    print(f"{'Canal':<24} {'Unidad':<7} {'Media':>10} {'P05':>10} {'P95':>10} {'Máx':>10} {'ms':>7}")
+    for name in args.channels:
+        if not channels.available(name): print(f"{name:<24} (faltan dependencias: {', '.join(required_columns([name]))})"); continue
+        values = channels[name]; finite = values[np.isfinite(values)]
+        unit = DERIVED_CHANNELS[name].unit if name in DERIVED_CHANNELS else ''
+        if finite.size == 0: print(f"{name:<24} {unit:<7} (sin datos)"); continue
+        p05, p95 = np.percentile(finite, [5, 95])
+        print(f"{name:<24} {unit:<7} {finite.mean():>10.3f} {p05:>10.3f} {p95:>10.3f} {finite.max():>10.3f} "
+              f"{channels.compute_times.get(name, 0.0) * 1000:>7.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
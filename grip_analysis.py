@@ -0,0 +1,114 @@
+# grip_analysis.py (Uso de adherencia de la sesión: diagrama G-G, histogramas de pedales y densidad velocidad/volante)
+#
+# Todas las vueltas seleccionadas se binan de una vez sobre rejillas fijas: el índice de
+# celda de cada muestra se calcula aritméticamente (bins uniformes) y los conteos se
+# acumulan con np.bincount por bloques de HISTOGRAM_CHUNK_ROWS filas, así que la memoria
+# no crece con el tamaño de la sesión. El resultado son matrices de conteo pequeñas que
+# plotter.plot_grip_report dibuja como imágenes de densidad (sin millones de puntos).
+
+from derived_channels import channels_for
+from lap_stats import BRAKE_THRESHOLD, lap_segments
+from lazy_imports import lazy_import
+from profiling import profiled
+
+np = lazy_import('numpy')
+
+HISTOGRAM_CHUNK_ROWS = 1_000_000 # Filas por bloque al acumular conteos
+GG_RANGE_G = (-3.0, 3.0) # Rango de G lateral/longitudinal (g)
+GG_BINS = 120
+PEDAL_BINS = 50 # Bins del histograma de pedal (0-1)
+SPEED_STEER_BINS = (100, 120) # (velocidad, volante)
+STEER_RANGE_DEG = (-270.0, 270.0)
+GRIP_ENVELOPE_PCT = 99.0 # Percentil de G combinada usado como círculo de adherencia
+
+
+def _uniform_bin(values, lo, hi, bins):
+    """Índice de bin uniforme en [lo, hi] (el borde superior entra en el último); -1 fuera de rango o NaN."""
+    idx = np.floor((values - lo) * (bins / (hi - lo)))
+    idx[values == hi] = bins - 1
+    ok = (idx >= 0) & (idx < bins)
+    return np.where(ok, idx, -1).astype(np.int64)
+
+
+def histogram_2d(x, y, x_range, y_range, bins, rows=None):
+    """
+    Conteos 2D sobre bins uniformes acumulados por bloques (equivale a np.histogram2d con bins fijos).
+
+    Args:
+        rows (np.ndarray, opcional): Índices de fila a incluir (vueltas seleccionadas); None = todas.
+
+    Returns:
+        np.ndarray: (bins_x, bins_y) int64.
+    """
+    bx, by = (bins, bins) if np.isscalar(bins) else bins
+    counts = np.zeros(bx * by, dtype=np.int64)
+    n = len(x) if rows is None else len(rows)
+    for start in range(0, n, HISTOGRAM_CHUNK_ROWS):
+        take = slice(start, start + HISTOGRAM_CHUNK_ROWS) if rows is None else rows[start:start + HISTOGRAM_CHUNK_ROWS]
+        ix = _uniform_bin(x[take], *x_range, bx); iy = _uniform_bin(y[take], *y_range, by)
+        ok = (ix >= 0) & (iy >= 0)
+        counts += np.bincount(ix[ok] * by + iy[ok], minlength=bx * by)
+    return counts.reshape(bx, by)
+
+
+def histogram_1d(x, x_range, bins, rows=None):
+    """Conteos 1D sobre bins uniformes (mismo esquema por bloques que histogram_2d)."""
+    counts = np.zeros(bins, dtype=np.int64)
+    n = len(x) if rows is None else len(rows)
+    for start in range(0, n, HISTOGRAM_CHUNK_ROWS):
+        take = slice(start, start + HISTOGRAM_CHUNK_ROWS) if rows is None else rows[start:start + HISTOGRAM_CHUNK_ROWS]
+        idx = _uniform_bin(x[take], *x_range, bins)
+        counts += np.bincount(idx[idx >= 0], minlength=bins)
+    return counts
+
+
+def selected_rows(df, laps_info_df=None, lap_numbers=None):
+    """Índices de fila de las vueltas pedidas (por defecto, las cronometradas válidas) y la lista de vueltas usada."""
+    if lap_numbers is None and laps_info_df is not None and not laps_info_df.empty:
+        valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+        lap_numbers = valid['Lap'].astype(int).tolist() or None
+    laps, starts, ends = lap_segments(df, laps_info_df)
+    keep = np.ones(len(laps), dtype=bool) if lap_numbers is None else np.isin(laps, list(lap_numbers))
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts): return np.zeros(0, dtype=np.int64), []
+    lengths = ends - starts
+    rows = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths) + np.arange(lengths.sum())
+    return rows, laps[keep].astype(int).tolist()
+
+
+@profiled("grip_histograms")
+def compute_grip_histograms(df, laps_info_df=None, lap_numbers=None):
+    """
+    Histogramas de uso de adherencia y entradas sobre las vueltas seleccionadas.
+
+    Returns:
+        dict: 'laps', 'samples'; 'gg' (conteos G_Lat x G_Lon, bordes en g), 'speed_steer' (conteos velocidad x volante),
+        'throttle'/'brake' (conteos 0-1), 'grip_envelope_g' (percentil 'grip_envelope_pct' de G combinada),
+        'braking_pct' y 'full_throttle_pct'. Las entradas sin canal quedan en None.
+    """
+    rows, laps = selected_rows(df, laps_info_df, lap_numbers)
+    channels = channels_for(df, laps_info_df)
+    result = {'laps': laps, 'samples': int(len(rows)), 'gg': None, 'speed_steer': None, 'throttle': None, 'brake': None,
+              'grip_envelope_g': None, 'grip_envelope_pct': GRIP_ENVELOPE_PCT, 'braking_pct': None, 'full_throttle_pct': None}
+    if not len(rows): return result
+    if channels.available('G_Lat_g') and channels.available('G_Lon_g'):
+        g_lat, g_lon = channels['G_Lat_g'], channels['G_Lon_g']
+        edges = np.linspace(*GG_RANGE_G, GG_BINS + 1)
+        result['gg'] = {'counts': histogram_2d(g_lat, g_lon, GG_RANGE_G, GG_RANGE_G, GG_BINS, rows), 'x_edges': edges, 'y_edges': edges}
+        g_total = channels['G_Total_g'][rows]; g_total = g_total[np.isfinite(g_total)]
+        if g_total.size: result['grip_envelope_g'] = float(np.percentile(g_total, GRIP_ENVELOPE_PCT))
+    if channels.available('Speed') and channels.available('Steer'):
+        speed = channels['Speed']; speed_max = np.nanmax(speed[rows]) if len(rows) else np.nan
+        speed_range = (0.0, float(np.ceil(speed_max / 10.0) * 10.0) if np.isfinite(speed_max) and speed_max > 0 else 300.0)
+        result['speed_steer'] = {'counts': histogram_2d(speed, channels['Steer'], speed_range, STEER_RANGE_DEG, SPEED_STEER_BINS, rows),
+                                 'x_edges': np.linspace(*speed_range, SPEED_STEER_BINS[0] + 1),
+                                 'y_edges': np.linspace(*STEER_RANGE_DEG, SPEED_STEER_BINS[1] + 1)}
+    pedal_edges = np.linspace(0.0, 1.0, PEDAL_BINS + 1)
+    for pedal in ('Throttle', 'Brake'):
+        if not channels.available(pedal): continue
+        counts = histogram_1d(channels[pedal], (0.0, 1.0), PEDAL_BINS, rows)
+        result[pedal.lower()] = {'counts': counts, 'edges': pedal_edges}
+    total = result['samples']
+    if result['brake'] is not None: result['braking_pct'] = 100.0 * result['brake']['counts'][pedal_edges[:-1] >= BRAKE_THRESHOLD].sum() / total
+    if result['throttle'] is not None: result['full_throttle_pct'] = 100.0 * result['throttle']['counts'][-1] / total
+    return result
@@ -0,0 +1,118 @@
+# lap_alignment.py (Alineación por lotes de N vueltas sobre una rejilla común de distancia)
+#
+# Todas las vueltas se interpolan en UNA sola llamada a np.interp por canal:
+# cada muestra recibe la clave `indice_vuelta * SPAN + distancia`, de modo que las
+# vueltas quedan concatenadas en un único eje monótono y la rejilla de consulta
+# se desplaza igual. Así no se filtra el DataFrame una vez por vuelta.
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+DEFAULT_GRID_STEP_M = 5.0 # Resolución de la rejilla de distancia (m)
+DEFAULT_OVERLAY_CHANNELS = ("Speed", "Throttle", "Brake", "Gear")
+ALIGNMENT_MODES = ('distance', 'position') # LapDist o posición GPS (spatial_index)
+STEP_CHANNELS = ("Gear", "Lap", "IsLapValid", "ABSActive", "TCActive") # Canales discretos: se mantiene el último valor
+
+
+def build_distance_grid(max_distance_m, step_m=DEFAULT_GRID_STEP_M):
+    """Rejilla [0, max_distance_m] con paso `step_m`."""
+    return np.arange(0.0, float(max_distance_m) + step_m * 0.5, step_m)
+
+
+def align_lap_arrays(lap_index, dist, channel_values, n_laps, grid, step_channels=STEP_CHANNELS):
+    """
+    Núcleo de la alineación por lotes.
+
+    Args:
+        lap_index (np.ndarray): Índice 0..n_laps-1 de vuelta de cada muestra.
+        dist (np.ndarray): Distancia en vuelta de cada muestra (m).
+        channel_values (dict): {canal: np.ndarray} con los valores de cada muestra.
+        n_laps (int): Número de vueltas.
+        grid (np.ndarray): Rejilla común de distancia.
+        step_channels (iterable): Canales interpolados con 'mantener último valor'.
+
+    Returns:
+        dict: {canal: np.ndarray (n_laps, len(grid))}; NaN fuera del rango cubierto por cada vuelta.
+    """
+    lap_index = np.asarray(lap_index, dtype=np.int64); dist = np.asarray(dist, dtype=float)
+    ok = np.isfinite(dist) & (lap_index >= 0)
+    lap_index, dist = lap_index[ok], dist[ok]
+    values = {name: np.asarray(arr, dtype=float)[ok] for name, arr in channel_values.items()}
+    n_grid = len(grid)
+    out = {name: np.full((n_laps, n_grid), np.nan) for name in values}
+    if dist.size == 0 or n_grid == 0: return out
+
+    span = max(float(dist.max()), float(grid[-1])) - min(float(dist.min()), float(grid[0])) + 1.0
+    base = min(float(dist.min()), float(grid[0]))
+    keys = lap_index * span + (dist - base)
+    order = np.argsort(keys, kind='stable'); keys = keys[order]; sorted_laps = lap_index[order]
+    query = (np.arange(n_laps)[:, None] * span + (grid - base)[None, :]).ravel()
+
+    # Rango de distancia cubierto por cada vuelta (reducción segmentada sobre las claves ordenadas)
+    present, starts = np.unique(sorted_laps, return_index=True)
+    ends = np.append(starts[1:], len(keys)) - 1
+    lap_min = np.full(n_laps, np.inf); lap_max = np.full(n_laps, -np.inf)
+    lap_min[present] = keys[starts]; lap_max[present] = keys[ends]
+    q_lap = np.repeat(np.arange(n_laps), n_grid)
+    inside = (query >= lap_min[q_lap]) & (query <= lap_max[q_lap])
+
+    step_set = set(step_channels or ())
+    for name, arr in values.items():
+        arr = arr[order]; finite = np.isfinite(arr)
+        if not finite.any(): continue
+        k, v = (keys, arr) if finite.all() else (keys[finite], arr[finite])
+        if name in step_set:
+            idx = np.clip(np.searchsorted(k, query, side='right') - 1, 0, len(k) - 1)
+            result = v[idx]
+        else:
+            result = np.interp(query, k, v)
+        result[~inside] = np.nan
+        out[name] = result.reshape(n_laps, n_grid)
+    return out
+
+
+def align_session_laps(df, lap_numbers, channels=DEFAULT_OVERLAY_CHANNELS, grid=None, grid_step=DEFAULT_GRID_STEP_M,
+                       dist_col='LapDist', lap_col='Lap', alignment='distance', reference_lap=None):
+    """
+    Alinea varias vueltas de una misma sesión sobre una rejilla de distancia.
+
+    Con alignment='position' la distancia de cada muestra se toma del punto GPS más cercano
+    de `reference_lap` (por defecto la primera de `lap_numbers`) en lugar de LapDist.
+
+    Returns:
+        tuple: (grid, {canal: np.ndarray (n_laps, n_grid)}, lista de vueltas en el orden de las filas)
+    """
+    lap_numbers = [int(l) for l in lap_numbers]
+    channels = [c for c in channels if c in df.columns]
+    laps = df[lap_col].to_numpy()
+    mask = np.isin(laps, lap_numbers)
+    order = np.argsort(lap_numbers, kind='stable') # Vuelta -> fila por búsqueda binaria sobre las vueltas ordenadas
+    lap_index = order[np.searchsorted(np.asarray(lap_numbers, dtype=np.int64)[order], laps[mask].astype(np.int64))]
+    if alignment == 'position' and mask.any():
+        from spatial_index import position_aligned_distance
+        reference_lap = lap_numbers[0] if reference_lap is None else int(reference_lap)
+        dist = position_aligned_distance(df[df[lap_col] == reference_lap], df[mask], lap_col=lap_col, dist_col=dist_col)
+    else:
+        dist = df[dist_col].to_numpy(dtype=float)[mask]
+    if grid is None: grid = build_distance_grid(np.nanmax(dist) if dist.size else 0.0, grid_step)
+    values = {c: df[c].to_numpy(dtype=float, na_value=np.nan)[mask] for c in channels}
+    return grid, align_lap_arrays(lap_index, dist, values, len(lap_numbers), grid), lap_numbers
+
+
+def align_lap_frames(lap_frames, channels=DEFAULT_OVERLAY_CHANNELS, grid=None, grid_step=DEFAULT_GRID_STEP_M, dist_col='LapDist'):
+    """
+    Alinea vueltas procedentes de DataFrames distintos (otras sesiones o pilotos).
+
+    Args:
+        lap_frames (list): DataFrames de una vuelta cada uno.
+
+    Returns:
+        tuple: (grid, {canal: np.ndarray (n_laps, n_grid)})
+    """
+    channels = [c for c in channels if all(c in f.columns for f in lap_frames)]
+    dist = np.concatenate([f[dist_col].to_numpy(dtype=float) for f in lap_frames]) if lap_frames else np.empty(0)
+    lap_index = np.repeat(np.arange(len(lap_frames)), [len(f) for f in lap_frames])
+    if grid is None: grid = build_distance_grid(np.nanmax(dist) if dist.size else 0.0, grid_step)
+    values = {c: np.concatenate([f[c].to_numpy(dtype=float, na_value=np.nan) for f in lap_frames]) for c in channels}
+    return grid, align_lap_arrays(lap_index, dist, values, len(lap_frames), grid)
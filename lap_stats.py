@@ -0,0 +1,139 @@
+# lap_stats.py (Estadísticas por vuelta en una sola pasada con reducciones segmentadas)
+#
+# Las vueltas son tramos contiguos de filas (ordenadas por Time), así que cada
+# estadística se calcula con np.<ufunc>.reduceat sobre los índices de inicio de
+# cada vuelta, sin filtrar el DataFrame vuelta a vuelta.
+
+from lazy_imports import lazy_import
+from plotter import GRAVITY
+from profiling import profiled
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+FULL_THROTTLE_THRESHOLD = 0.98 # Acelerador >= umbral -> a fondo
+BRAKE_THRESHOLD = 0.05 # Freno > umbral -> frenando
+COAST_THRESHOLD = 0.05 # Sin acelerador ni freno (< umbral) -> inercia
+
+# Columnas de la tabla (orden de impresión)
+LAP_STATS_COLUMNS = ['Lap', 'SpeedMax', 'SpeedMin', 'SpeedMean', 'FullThrottlePct', 'BrakingPct', 'CoastingTime',
+                     'GearShifts', 'ABSActivations', 'TCActivations', 'FuelUsed', 'PeakLatG', 'PeakLonG']
+
+
+def lap_segments(df, laps_info_df=None):
+    """
+    Índices [inicio, fin) de cada vuelta sobre `df` ordenado por Time. Si `df` viene de
+    resample_uniform (df.attrs['time_base'] con las mismas filas), los cortes salen de la rejilla sin búsquedas.
+
+    Returns:
+        tuple: (lap_numbers, starts, ends) como np.ndarray.
+    """
+    if laps_info_df is not None and not laps_info_df.empty:
+        time_base = df.attrs.get('time_base')
+        if time_base is not None and len(time_base) == len(df) and df['Time'].iat[0] == time_base.t0:
+            search = time_base.searchsorted
+        else:
+            times = df['Time'].to_numpy(dtype=float)
+            def search(values, side): return np.searchsorted(times, values, side=side)
+        starts = search(laps_info_df['StartTime'].to_numpy(dtype=float), side='left')
+        ends = search(laps_info_df['EndTime'].to_numpy(dtype=float), side='right')
+        return laps_info_df['Lap'].to_numpy(dtype=int), starts, ends
+    laps = df['Lap'].to_numpy()
+    change = np.flatnonzero(laps[1:] != laps[:-1]) + 1
+    starts = np.concatenate([[0], change]).astype(int); ends = np.concatenate([change, [len(laps)]]).astype(int)
+    return laps[starts].astype(int), starts, ends
+
+
+def _column(df, name, fill=float('nan')):
+    """Columna como float (NA -> fill); None si no existe."""
+    if name not in df.columns: return None
+    values = df[name]
+    if isinstance(values.dtype, pd.BooleanDtype) or pd.api.types.is_bool_dtype(values): values = values.astype('Float64')
+    return values.to_numpy(dtype=float, na_value=fill)
+
+
+@profiled("lap_stats")
+def compute_lap_stats(df, laps_info_df=None):
+    """
+    Calcula estadísticas por vuelta (velocidad, pedales, inercia, cambios, ABS/TC, combustible, G pico).
+
+    Args:
+        df (pandas.DataFrame): Telemetría limpia.
+        laps_info_df (pandas.DataFrame, opcional): Tabla de calculate_laps_improved (define los tramos).
+
+    Returns:
+        pandas.DataFrame: Una fila por vuelta con LAP_STATS_COLUMNS (NaN si falta el canal).
+    """
+    if df is None or df.empty or 'Time' not in df.columns: return pd.DataFrame(columns=LAP_STATS_COLUMNS)
+    if not df['Time'].is_monotonic_increasing: df = df.sort_values('Time', kind='stable')
+    lap_numbers, starts, ends = lap_segments(df, laps_info_df)
+    keep = ends > starts # reduceat no admite tramos vacíos
+    lap_numbers, starts, ends = lap_numbers[keep], starts[keep], ends[keep]
+    stats = pd.DataFrame({'Lap': lap_numbers})
+    if len(starts) == 0: return stats.reindex(columns=LAP_STATS_COLUMNS)
+    n_rows = len(df)
+
+    # dt de cada muestra (0 en la última fila de cada vuelta: no cruza a la siguiente)
+    time = df['Time'].to_numpy(dtype=float)
+    dt = np.clip(np.diff(time, append=time[-1]), 0, None); dt[ends - 1] = 0.0
+    lap_duration = np.add.reduceat(dt, starts)
+    safe_duration = np.where(lap_duration > 0, lap_duration, np.nan)
+    # Marca las transiciones internas de cada vuelta (la primera fila de cada tramo no cuenta)
+    first_row = np.zeros(n_rows, dtype=bool); first_row[starts] = True
+
+    def seg_sum(values): return np.add.reduceat(values, starts)
+
+    def seg_time_pct(mask): return 100.0 * seg_sum(np.where(mask, dt, 0.0)) / safe_duration
+
+    def seg_edges(values):
+        """Número de flancos de subida (False->True) dentro de cada vuelta."""
+        active = np.nan_to_num(values, nan=0.0) > 0.5
+        rising = np.empty(n_rows, dtype=bool); rising[0] = active[0]; rising[1:] = active[1:] & ~active[:-1]
+        rising[first_row] = False
+        return seg_sum(rising.astype(np.int64))
+
+    speed = _column(df, 'Speed')
+    if speed is not None:
+        finite = np.isfinite(speed); counts = seg_sum(finite.astype(np.int64))
+        stats['SpeedMax'] = np.where(counts > 0, np.maximum.reduceat(np.where(finite, speed, -np.inf), starts), np.nan)
+        stats['SpeedMin'] = np.where(counts > 0, np.minimum.reduceat(np.where(finite, speed, np.inf), starts), np.nan)
+        stats['SpeedMean'] = seg_sum(np.where(finite, speed, 0.0)) / np.where(counts > 0, counts, np.nan)
+
+    throttle, brake = _column(df, 'Throttle'), _column(df, 'Brake')
+    if throttle is not None: stats['FullThrottlePct'] = seg_time_pct(throttle >= FULL_THROTTLE_THRESHOLD)
+    if brake is not None: stats['BrakingPct'] = seg_time_pct(brake > BRAKE_THRESHOLD)
+    if throttle is not None and brake is not None:
+        stats['CoastingTime'] = seg_sum(np.where((throttle < COAST_THRESHOLD) & (brake < COAST_THRESHOLD), dt, 0.0))
+
+    gear = _column(df, 'Gear')
+    if gear is not None:
+        gear_filled = pd.Series(gear).ffill().to_numpy() # Huecos NaN no cuentan como cambio
+        shifts = np.zeros(n_rows, dtype=np.int64)
+        shifts[1:] = (gear_filled[1:] != gear_filled[:-1]) & np.isfinite(gear_filled[1:]) & np.isfinite(gear_filled[:-1])
+        shifts[first_row] = 0
+        stats['GearShifts'] = seg_sum(shifts)
+
+    for col, out_col in (('ABSActive', 'ABSActivations'), ('TCActive', 'TCActivations')):
+        values = _column(df, col)
+        if values is not None: stats[out_col] = seg_edges(values)
+
+    fuel = _column(df, 'Fuel')
+    if fuel is not None: stats['FuelUsed'] = fuel[starts] - fuel[ends - 1]
+
+    for col, out_col in (('G_Lat', 'PeakLatG'), ('G_Lon', 'PeakLonG')):
+        values = _column(df, col)
+        if values is not None: stats[out_col] = np.maximum.reduceat(np.nan_to_num(np.abs(values), nan=0.0), starts) / GRAVITY
+
+    return stats.reindex(columns=LAP_STATS_COLUMNS)
+
+
+def format_lap_stats_table(laps_info_df, lap_stats_df):
+    """Tabla de texto: vuelta, tipo, tiempo, validez y estadísticas principales."""
+    base = laps_info_df[['Lap', 'LapType', 'FormattedTime', 'IsTimeValid']].rename(columns={'FormattedTime': 'T Fmt', 'IsTimeValid': 'Valida'})
+    table = base.merge(lap_stats_df, on='Lap', how='left').rename(columns={
+        'SpeedMax': 'Vmax', 'SpeedMin': 'Vmin', 'SpeedMean': 'Vmed', 'FullThrottlePct': 'Fondo%', 'BrakingPct': 'Freno%',
+        'CoastingTime': 'Inercia s', 'GearShifts': 'Cambios', 'ABSActivations': 'ABS', 'TCActivations': 'TC',
+        'FuelUsed': 'Comb. l', 'PeakLatG': 'GLat', 'PeakLonG': 'GLon'})
+    for col in ('Cambios', 'ABS', 'TC'): table[col] = table[col].round().astype('Int64')
+    table = table.round({'Vmax': 1, 'Vmin': 1, 'Vmed': 1, 'Fondo%': 1, 'Freno%': 1, 'Inercia s': 1, 'Comb. l': 2, 'GLat': 2, 'GLon': 2})
+    return table.to_string(index=False, na_rep='-')
@@ -0,0 +1,47 @@
+# lazy_imports.py (Importación diferida de módulos pesados para arranque rápido)
+
+import importlib
+import importlib.util
+import sys
+
+
+class _LazyModule:
+    """Proxy que importa el módulo real en el primer acceso a un atributo."""
+    __slots__ = ('_lazy_name', '_lazy_module')
+
+    def __init__(self, name):
+        object.__setattr__(self, '_lazy_name', name)
+        object.__setattr__(self, '_lazy_module', None)
+
+    def _load(self):
+        module = object.__getattribute__(self, '_lazy_module')
+        if module is None:
+            module = importlib.import_module(object.__getattribute__(self, '_lazy_name'))
+            object.__setattr__(self, '_lazy_module', module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        name = object.__getattribute__(self, '_lazy_name')
+        state = 'cargado' if object.__getattribute__(self, '_lazy_module') is not None else 'diferido'
+        return f"<lazy module '{name}' ({state})>"
+
+
+def lazy_import(name):
+    """
+    Devuelve el módulo `name` si ya está importado; si no, un proxy que lo
+    importa en el primer uso (ej. `pd = lazy_import('pandas')`).
+    """
+    if name in sys.modules: return sys.modules[name]
+    return _LazyModule(name)
+
+
+def is_module_available(name):
+    """Comprueba si un módulo es importable sin llegar a importarlo."""
+    try: return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError): return False
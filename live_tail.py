@@ -0,0 +1,283 @@
+# live_tail.py (Modo seguimiento: lee un Telemetry.csv mientras se escribe y actualiza vueltas y gráficos)
+#
+# Uso:
+#   python live_tail.py Telemetry.csv              # Tabla de vueltas + gráfico de la vuelta en curso
+#   python live_tail.py Telemetry.csv --no-plot --interval 2
+#
+# Cada actualización lee solo los bytes añadidos desde la anterior, parsea las
+# líneas completas y actualiza un estado de vueltas incremental con la misma
+# semántica que calculate_laps_improved(). El coste es proporcional a los datos nuevos.
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import parse_csv_header, rename_telemetry_columns, convert_numeric_columns, convert_bool_columns, HEADER_SCAN_LINES
+from main import estimate_min_lap_time, format_time
+
+LAP_TABLE_COLUMNS = ['Lap', 'LapType', 'StartTime', 'EndTime', 'LapTime', 'FormattedTime', 'IsLapValidSource', 'IsTimeValid', 'IsComplete']
+LIVE_PLOT_COLUMNS = ['Time', 'Lap', 'LapDist', 'Speed', 'Throttle', 'Brake']
+
+
+class TelemetryTail:
+    """Lector incremental: mantiene el archivo abierto y devuelve solo las filas nuevas en cada poll()."""
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.metadata = {}
+        self.columns = None
+        self.delimiter = None
+        self._file = None
+        self._pending = b"" # Línea incompleta al final de la última lectura
+        self.bytes_read = 0
+
+    def _open_and_read_header(self):
+        """Intenta leer el bloque de encabezado. Devuelve False si aún no está completo."""
+        if self._file is None:
+            if not os.path.exists(self.filepath): return False
+            self._file = open(self.filepath, 'rb')
+        self._file.seek(0)
+        lines = []
+        for _ in range(HEADER_SCAN_LINES):
+            raw = self._file.readline()
+            if not raw.endswith(b"\n"): break # Encabezado aún incompleto
+            lines.append(raw.decode('utf-8', errors='ignore'))
+        metadata, header_row_index, delimiter = parse_csv_header(lines, verbose=False)
+        if header_row_index == -1: return False
+        self.metadata, self.delimiter = metadata, delimiter
+        self.columns = [c.strip() for c in lines[header_row_index].strip().split(delimiter)]
+        # Posicionar justo después de la fila de encabezado
+        self._file.seek(0)
+        for _ in range(header_row_index + 1): self._file.readline()
+        self.bytes_read = self._file.tell()
+        return True
+
+    def poll(self):
+        """Lee los bytes añadidos y devuelve un DataFrame limpio con las filas completas nuevas (o None)."""
+        if self.columns is None and not self._open_and_read_header(): return None
+        chunk = self._file.read()
+        if not chunk: return None
+        self.bytes_read += len(chunk)
+        data = self._pending + chunk
+        last_newline = data.rfind(b"\n")
+        if last_newline == -1: self._pending = data; return None
+        self._pending = data[last_newline + 1:]
+        df = pd.read_csv(io.BytesIO(data[:last_newline + 1]), sep=self.delimiter, header=None, names=self.columns,
+                         low_memory=False)
+        rename_telemetry_columns(df); convert_numeric_columns(df); convert_bool_columns(df)
+        if 'Time' not in df.columns or 'Lap' not in df.columns: return None
+        df = df.dropna(subset=['Time', 'Lap'])
+        return df if not df.empty else None
+
+    def close(self):
+        if self._file is not None: self._file.close(); self._file = None
+
+
+class IncrementalLapTracker:
+    """
+    Estado de vueltas incremental. Misma semántica que calculate_laps_improved():
+    la vuelta va de la primera a la última muestra con el mismo 'Lap'; LapTime es
+    el tiempo entre la última muestra de la vuelta anterior y la última de esta;
+    la primera es 'Out Lap'; la vuelta abierta se muestra como 'In Lap' (la última
+    de la sesión) y pasa a 'Timed Lap' cuando aparece la siguiente.
+    """
+
+    def __init__(self, min_lap_time_threshold=60):
+        self.min_lap_time_threshold = min_lap_time_threshold
+        self.closed_laps = [] # dicts de vueltas cerradas (orden de aparición)
+        self.current = None   # vuelta abierta: dict con lap, start, end, prev_end, valid
+        self.last_end_time = None
+
+    def update(self, df_new):
+        """Incorpora filas nuevas (ordenadas por Time). Devuelve la lista de vueltas cerradas en esta actualización."""
+        if df_new is None or df_new.empty: return []
+        laps = df_new['Lap'].to_numpy()
+        times = df_new['Time'].to_numpy(dtype=float)
+        if 'IsLapValid' in df_new.columns: valid = df_new['IsLapValid'].fillna(False).to_numpy(dtype=bool)
+        else: valid = np.ones(len(df_new), dtype=bool)
+
+        # Segmentos contiguos de 'Lap' dentro del bloque nuevo
+        change = np.flatnonzero(laps[1:] != laps[:-1]) + 1
+        starts = np.concatenate([[0], change]); ends = np.concatenate([change, [len(laps)]]) - 1
+        seg_valid = np.logical_and.reduceat(valid, starts)
+
+        newly_closed = []
+        for seg_start, seg_end, seg_ok in zip(starts, ends, seg_valid):
+            lap_num = int(laps[seg_start])
+            if self.current is not None and self.current['lap'] == lap_num: # Continúa la vuelta abierta
+                self.current['end'] = times[seg_end]; self.current['valid'] &= bool(seg_ok)
+                continue
+            if self.current is not None: # Cambio de vuelta: cerrar la abierta
+                newly_closed.append(self._close_current())
+            self.current = {'lap': lap_num, 'start': times[seg_start], 'end': times[seg_end],
+                            'prev_end': self.last_end_time, 'valid': bool(seg_ok)}
+        return newly_closed
+
+    def _close_current(self):
+        lap = self.current; is_out = not self.closed_laps
+        record = self._lap_record(lap, 'Out Lap' if is_out else 'Timed Lap')
+        self.closed_laps.append(record)
+        self.last_end_time = lap['end']; self.current = None
+        return record
+
+    def _lap_record(self, lap, lap_type):
+        # Out Lap: tiempo desde la primera muestra (igual que calculate_laps_improved con cut_indices[0] = 0)
+        t_start_lap = lap['prev_end'] if lap['prev_end'] is not None else lap['start']
+        lap_time = lap['end'] - t_start_lap
+        is_complete = lap_type == 'Timed Lap'
+        is_time_valid = False
+        if lap_type == 'Timed Lap' and pd.notna(lap_time) and lap_time >= self.min_lap_time_threshold: is_time_valid = lap['valid']
+        else: is_complete = False
+        return {'Lap': lap['lap'], 'LapType': lap_type, 'StartTime': lap['start'], 'EndTime': lap['end'],
+                'LapTime': lap_time, 'FormattedTime': format_time(lap_time), 'IsLapValidSource': lap['valid'],
+                'IsTimeValid': is_time_valid, 'IsComplete': is_complete}
+
+    def to_dataframe(self):
+        """Tabla de vueltas equivalente a calculate_laps_improved (la vuelta abierta como 'In Lap')."""
+        records = list(self.closed_laps)
+        if self.current is not None:
+            records.append(self._lap_record(self.current, 'Out Lap' if not self.closed_laps else 'In Lap'))
+        return pd.DataFrame(records, columns=LAP_TABLE_COLUMNS)
+
+
+class LiveLapBuffer:
+    """
+    Guarda solo las muestras de la vuelta en curso y de la última vuelta cerrada (memoria O(vuelta)).
+    La vuelta en curso vive en arrays preasignados que crecen al doble: cada update() copia solo las
+    filas nuevas (coste amortizado O(nuevas)) y current_frame() devuelve vistas sin copia.
+    """
+
+    def __init__(self, columns=LIVE_PLOT_COLUMNS, initial_capacity=4096):
+        self.columns = columns; self.initial_capacity = initial_capacity
+        self.buffers = {}; self.size = 0; self.current_lap = None
+        self.previous = None; self.previous_lap = None
+
+    def _append(self, seg):
+        n_new = len(seg)
+        if not self.buffers: self.buffers = {c: np.empty(max(self.initial_capacity, n_new)) for c in seg.columns}
+        capacity = len(next(iter(self.buffers.values())))
+        if self.size + n_new > capacity: # Crecimiento geométrico: cada muestra se copia O(1) veces en promedio
+            capacity = max(2 * capacity, self.size + n_new)
+            for c, buf in self.buffers.items(): grown = np.empty(capacity); grown[:self.size] = buf[:self.size]; self.buffers[c] = grown
+        for c, buf in self.buffers.items(): buf[self.size:self.size + n_new] = seg[c].to_numpy(dtype=float, na_value=np.nan)
+        self.size += n_new
+
+    def update(self, df_new):
+        cols = [c for c in self.columns if c in df_new.columns]
+        data = df_new[cols]
+        laps = data['Lap'].to_numpy()
+        change = np.flatnonzero(laps[1:] != laps[:-1]) + 1
+        for part in np.split(np.arange(len(data)), change):
+            seg = data.iloc[part]; lap_num = int(seg['Lap'].iloc[0])
+            if self.current_lap is not None and lap_num != self.current_lap:
+                self.previous = self.current_frame().copy(); self.previous_lap = self.current_lap; self.size = 0 # Se reutilizan los arrays
+            self.current_lap = lap_num; self._append(seg)
+
+    def current_frame(self):
+        """Vuelta en curso como DataFrame de vistas sobre los arrays (válido hasta el siguiente update())."""
+        if not self.size: return None
+        return pd.DataFrame({c: buf[:self.size] for c, buf in self.buffers.items()}, copy=False)
+
+
+class LivePlot:
+    """Figura interactiva (Velocidad + Pedales vs Distancia) actualizada con set_data."""
+
+    def __init__(self, metadata):
+        import matplotlib.pyplot as plt
+        from plotter import get_track_length_m
+        self.plt = plt
+        plt.ion()
+        self.fig, (self.ax_speed, self.ax_pedals) = plt.subplots(2, 1, figsize=(14, 8), sharex=True)
+        self.fig.suptitle(f"EN VIVO - {metadata.get('Vehicle', 'Vehículo')} @ {metadata.get('Track', 'Pista')}")
+        self.prev_speed, = self.ax_speed.plot([], [], color='orange', ls='--', lw=1.2, label='Vuelta anterior')
+        self.cur_speed, = self.ax_speed.plot([], [], color='blue', lw=1.5, label='Vuelta actual')
+        self.cur_thr, = self.ax_pedals.plot([], [], color='green', lw=1.3, label='Acelerador')
+        self.cur_brk, = self.ax_pedals.plot([], [], color='red', lw=1.3, label='Freno')
+        self.ax_speed.set_ylabel('Kmh'); self.ax_pedals.set_ylabel('Pedal (0-1)'); self.ax_pedals.set_ylim(-0.05, 1.05)
+        self.ax_pedals.set_xlabel('Distancia (m)')
+        for ax in (self.ax_speed, self.ax_pedals): ax.grid(True, linestyle=':', alpha=0.7); ax.legend(loc='upper right')
+        track_length_m = get_track_length_m(metadata)
+        if track_length_m: self.ax_pedals.set_xlim(0, track_length_m)
+
+    def refresh(self, buffer):
+        cur = buffer.current_frame()
+        if cur is not None and 'LapDist' in cur.columns:
+            self.cur_speed.set_data(cur['LapDist'], cur.get('Speed', pd.Series(dtype=float)))
+            if 'Throttle' in cur.columns: self.cur_thr.set_data(cur['LapDist'], cur['Throttle'])
+            if 'Brake' in cur.columns: self.cur_brk.set_data(cur['LapDist'], cur['Brake'])
+            self.cur_speed.set_label(f'Vuelta actual (V{buffer.current_lap})')
+        if buffer.previous is not None and 'LapDist' in buffer.previous.columns:
+            self.prev_speed.set_data(buffer.previous['LapDist'], buffer.previous.get('Speed', pd.Series(dtype=float)))
+            self.prev_speed.set_label(f'Vuelta anterior (V{buffer.previous_lap})')
+        self.ax_speed.relim(); self.ax_speed.autoscale_view(scalex=False); self.ax_speed.legend(loc='upper right')
+        self.fig.canvas.draw_idle()
+
+    def pause(self, seconds):
+        self.plt.pause(seconds)
+
+    def is_open(self):
+        return self.plt.fignum_exists(self.fig.number)
+
+
+def print_lap_table(tracker):
+    laps_df = tracker.to_dataframe()
+    if laps_df.empty: return
+    display = laps_df[['Lap', 'LapType', 'FormattedTime', 'IsTimeValid']].rename(columns={'FormattedTime': 'T Fmt', 'IsTimeValid': 'Valida'})
+    print("\n" + display.to_string(index=False))
+    valid = laps_df[laps_df['IsTimeValid'] & (laps_df['LapType'] == 'Timed Lap')]
+    if not valid.empty:
+        best = valid.loc[valid['LapTime'].idxmin()]
+        print(f"Mejor Válida: V{int(best['Lap'])} ({best['FormattedTime']})")
+
+
+def follow(filepath, interval=1.0, plot=True, idle_timeout=None):
+    """
+    Sigue `filepath` hasta Ctrl+C (o `idle_timeout` segundos sin datos nuevos).
+    Devuelve el IncrementalLapTracker final.
+    """
+    tail = TelemetryTail(filepath)
+    tracker = None; buffer = LiveLapBuffer(); live_plot = None
+    last_data_time = time.monotonic()
+    print(f"Siguiendo {filepath} (Ctrl+C para salir)...")
+    try:
+        while True:
+            df_new = tail.poll()
+            if tracker is None and tail.columns is not None:
+                tracker = IncrementalLapTracker(estimate_min_lap_time(tail.metadata))
+                print(f"Encabezado detectado. Metadatos: {tail.metadata}")
+                if plot: live_plot = LivePlot(tail.metadata)
+            if df_new is not None:
+                last_data_time = time.monotonic()
+                closed = tracker.update(df_new); buffer.update(df_new)
+                if closed: print_lap_table(tracker)
+                if live_plot is not None: live_plot.refresh(buffer)
+            elif idle_timeout is not None and time.monotonic() - last_data_time > idle_timeout:
+                print("Sin datos nuevos, fin del seguimiento."); break
+            if live_plot is not None:
+                if not live_plot.is_open(): break
+                live_plot.pause(interval)
+            else: time.sleep(interval)
+    except KeyboardInterrupt: print("\nSeguimiento detenido.")
+    finally: tail.close()
+    if tracker is not None: print_lap_table(tracker)
+    return tracker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Seguimiento en vivo de un Telemetry.csv en escritura.")
+    parser.add_argument("csv", help="Archivo Telemetry.csv (puede no existir aún)")
+    parser.add_argument("--interval", type=float, default=1.0, help="Segundos entre lecturas")
+    parser.add_argument("--no-plot", action="store_true", help="Solo tabla de vueltas (sin gráfico)")
+    parser.add_argument("--idle-timeout", type=float, default=None, help="Terminar tras N segundos sin datos nuevos")
+    args = parser.parse_args(argv)
+    follow(args.csv, interval=args.interval, plot=not args.no_plot, idle_timeout=args.idle_timeout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
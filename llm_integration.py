@@ -2,22 +2,44 @@
 
 import os
 import base64
-import requests
 import json
 import subprocess
 import sys
+import threading
+import time
 import traceback
-import pytesseract # Para OCR
-from PIL import Image # Para abrir imágenes con pytesseract
 import io # Para manejo de bytes de imagen
 import re # Para expresiones regulares (parseo OCR)
-import numpy as np # Para float('inf') en conversión de tiempo
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from lazy_imports import lazy_import, is_module_available
+from app_cache import load_json_cache, save_json_cache
+from profiling import span
+from llm_metrics import chat_completion, queued_request
+from analysis_compaction import compact_analyses, needs_compaction, SYNTHESIS_TOKEN_BUDGET
+
+# Módulos pesados: se importan en el primer uso (arranque rápido)
+requests = lazy_import('requests')
+pytesseract = lazy_import('pytesseract') # Para OCR
+Image = lazy_import('PIL.Image') # Para abrir imágenes con pytesseract
 
 # --- Constantes Simples ---
 # Asegúrate de que estos nombres coincidan EXACTAMENTE con los modelos CARGADOS en LM Studio
 DEFAULT_VLM_MODEL = "llava-v1.6-mistral-7b"       # Modelo VLM para analizar gráficos
 DEFAULT_TEXT_MODEL = "meta-llama-3-8b-instruct"  # Modelo LLM Texto para la síntesis
 DEFAULT_PORT = 1234                              # Puerto por defecto de LM Studio API
+LM_STUDIO_URL_OVERRIDE = os.environ.get("RENNSPORT_LM_STUDIO_URL") # Endpoint fijo (p. ej. mock_lm_studio.py); sin detección
+
+# --- Caché de Estado IA (endpoint + salud de modelos) ---
+AI_STATUS_CACHE_FILE = "ai_status.json"
+AI_STATUS_CACHE_TTL = float(os.environ.get("RENNSPORT_AI_CACHE_TTL", 300)) # Segundos
+AI_DEPENDENCIES = ("requests", "pytesseract", "PIL")
+
+
+def missing_ai_dependencies():
+    """Devuelve la lista de dependencias IA no instaladas (sin importarlas)."""
+    return [name for name in AI_DEPENDENCIES if not is_module_available(name)]
 
 # --- CONFIGURACIÓN TESSERACT (OPCIONAL) ---
 # Si Tesseract no está en tu PATH de sistema, descomenta la siguiente línea
@@ -57,14 +79,40 @@ def detect_windows_host_ip():
     return host_ip
 
 _cached_endpoint = None
-def get_lm_studio_endpoint():
-    """Detecta y devuelve la URL completa del endpoint de LM Studio, cacheando."""
+_status_lock = threading.Lock()
+_background_check_thread = None
+_resident_model = None # Último modelo que respondió (LM Studio lo mantiene cargado)
+
+def _load_ai_status_cache():
+    """Lee la caché de estado IA si no ha expirado (dict vacío si no hay)."""
+    return load_json_cache(AI_STATUS_CACHE_FILE, ttl_seconds=AI_STATUS_CACHE_TTL) or {}
+
+def _update_ai_status_cache(**updates):
+    """Fusiona `updates` en la caché de estado IA en disco."""
+    with _status_lock:
+        status = _load_ai_status_cache()
+        for key, value in updates.items():
+            if isinstance(value, dict) and isinstance(status.get(key), dict): status[key].update(value)
+            else: status[key] = value
+        save_json_cache(AI_STATUS_CACHE_FILE, status)
+
+def get_lm_studio_endpoint(verbose=True):
+    """Detecta y devuelve la URL completa del endpoint de LM Studio, cacheando (memoria + disco con TTL)."""
     global _cached_endpoint
+    if _cached_endpoint is None and LM_STUDIO_URL_OVERRIDE:
+        _cached_endpoint = LM_STUDIO_URL_OVERRIDE.rstrip('/')
+        if verbose: print(f"Endpoint de LM Studio (RENNSPORT_LM_STUDIO_URL): {_cached_endpoint}")
     if _cached_endpoint is None:
-        host_ip = detect_windows_host_ip()
-        _cached_endpoint = f"http://{host_ip}:{DEFAULT_PORT}"
-        # Imprimir solo la primera vez
-        print(f"Endpoint de LM Studio determinado como: {_cached_endpoint}")
+        cached = _load_ai_status_cache().get("endpoint")
+        if cached:
+            _cached_endpoint = cached
+            if verbose: print(f"Endpoint de LM Studio (caché): {_cached_endpoint}")
+        else:
+            host_ip = detect_windows_host_ip()
+            _cached_endpoint = f"http://{host_ip}:{DEFAULT_PORT}"
+            _update_ai_status_cache(endpoint=_cached_endpoint)
+            # Imprimir solo la primera vez
+            if verbose: print(f"Endpoint de LM Studio determinado como: {_cached_endpoint}")
     return _cached_endpoint
 
 # --- Funciones de Utilidad (Imagen) ---
@@ -82,9 +130,12 @@ def encode_image_to_base64(image_source):
         # Convertir a RGB si es necesario (para JPEG)
         if img.mode in ['RGBA', 'P', 'LA']: img = img.convert('RGB')
 
-        buffer = io.BytesIO()
-        img.save(buffer, format='JPEG', quality=90) # Usar JPEG por eficiencia
-        return base64.b64encode(buffer.getvalue()).decode('utf-8')
+        with span("image_encode") as encode_span:
+            buffer = io.BytesIO()
+            img.save(buffer, format='JPEG', quality=90) # Usar JPEG por eficiencia
+            encoded = base64.b64encode(buffer.getvalue()).decode('utf-8')
+            encode_span.add(image_size=list(img.size), payload_bytes=len(encoded))
+        return encoded
     except FileNotFoundError as e: print(f"Error B64: {e}"); raise
     except Exception as e: print(f"Error B64 ({type(e).__name__}): {e}"); raise
 
@@ -131,7 +182,8 @@ def extract_context_from_laptime_image(image_path):
         try:
              custom_config = r'--psm 6' # Asumir bloque de texto uniforme
              if 'TESSERACT_CMD_PATH' in globals() and TESSERACT_CMD_PATH: pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD_PATH
-             raw_text = pytesseract.image_to_string(Image.open(image_path), lang='eng+spa', config=custom_config)
+             with span("ocr_laptimes", bytes_read=os.path.getsize(image_path) if os.path.exists(image_path) else 0):
+                 raw_text = pytesseract.image_to_string(Image.open(image_path), lang='eng+spa', config=custom_config)
         except pytesseract.TesseractNotFoundError: print("\nERROR CRÍTICO: 'tesseract' no encontrado..."); return None
         except FileNotFoundError: print(f"Error OCR: Archivo no encontrado - {image_path}"); return None
         except Exception as ocr_err: print(f"Error Tesseract/PIL: {ocr_err}"); return None
@@ -206,6 +258,7 @@ def analyze_telemetry_comparison_graph(
     model_name=DEFAULT_VLM_MODEL
 ):
     """Analiza gráfico VLM con prompt personalizado y contexto completo."""
+    t_prep = time.perf_counter() # Preparación de imagen/prompt (prep_s en llm_metrics)
     endpoint = model_endpoint or get_lm_studio_endpoint()
     if not endpoint:
         return "[Error: Endpoint LM Studio no determinado]"
@@ -305,41 +358,39 @@ Responde de forma estructurada y precisa.
         ]
 
         print(f"Enviando petición VLM a {endpoint} (Timeout: 300s)...")
-        response = requests.post(
-            f"{endpoint}/v1/chat/completions",
-            headers={"Content-Type": "application/json"},
-            json={
-                "model": model_name,
-                "messages": messages,
-                "max_tokens": 1500,
-                "temperature": 0.3,
-                "stream": False
-            },
-            timeout=300
-        )
+        with span(f"vlm_request:{graph_type}", model=model_name, payload_bytes=len(image_data_url) + len(prompt_text)):
+            response, response_json = _model_request(
+                endpoint,
+                {
+                    "model": model_name,
+                    "messages": messages,
+                    "max_tokens": 1500,
+                    "temperature": 0.3
+                },
+                timeout=300, call_type="vlm", label=graph_type,
+                image_bytes=len(image_data_url), prep_s=time.perf_counter() - t_prep
+            )
         print(f"[{graph_type}] VLM Response Status Code: {response.status_code}")
         response.raise_for_status()
 
         # --- Procesamiento de la respuesta ---
-        response_text = response.text
-        try:
-            response_json = json.loads(response_text)
-            choices = response_json.get("choices", [])
-            if choices and isinstance(choices, list):
-                content = choices[0].get("message", {}).get("content")
-                if content and isinstance(content, str):
-                    print(f"[{graph_type}] Análisis VLM OK.")
-                    return content.strip()
-
-            print(f"¡¡¡ ADVERTENCIA [{graph_type}] !!! Contenido VLM vacío/inesperado.")
-            print(f"JSON Recibido: {response_json}")
-            return f"[Error: Contenido VLM vacío/inesperado ({graph_type})]"
-
-        except json.JSONDecodeError as json_err:
-            print(f"¡¡¡ ERROR [{graph_type}] !!! Error decodificando JSON: {json_err}")
-            print(f"Texto de respuesta (parcial): {response_text[:1000]}")
+        if response_json is None:
+            print(f"¡¡¡ ERROR [{graph_type}] !!! Respuesta sin JSON válido.")
             return f"[Error: JSON inválido recibido ({graph_type})]"
-
+        choices = response_json.get("choices", [])
+        if choices and isinstance(choices, list):
+            content = choices[0].get("message", {}).get("content")
+            if content and isinstance(content, str):
+                print(f"[{graph_type}] Análisis VLM OK.")
+                return content.strip()
+
+        print(f"¡¡¡ ADVERTENCIA [{graph_type}] !!! Contenido VLM vacío/inesperado.")
+        print(f"JSON Recibido: {response_json}")
+        return f"[Error: Contenido VLM vacío/inesperado ({graph_type})]"
+
+    except json.JSONDecodeError as json_err:
+        print(f"¡¡¡ ERROR [{graph_type}] !!! Error decodificando JSON: {json_err}")
+        return f"[Error: JSON inválido recibido ({graph_type})]"
     except Exception as e:
         print(f"¡¡¡ ERROR [{graph_type}] !!! Excepción general: {e}")
         traceback.print_exc()
@@ -350,8 +401,13 @@ Responde de forma estructurada y precisa.
 # --- Función de Síntesis Final (PROMPT MEJORADO - Versión Final) ---
 def synthesize_driving_advice(
     initial_context, brake_analysis, throttle_analysis, gear_analysis,
-    speed_analysis, trackmap_analysis, steering_analysis=None, model_endpoint=None, model_name=DEFAULT_TEXT_MODEL ):
-    """Genera resumen final conciso estilo Race Coach Pro."""
+    speed_analysis, trackmap_analysis, steering_analysis=None, model_endpoint=None, model_name=DEFAULT_TEXT_MODEL,
+    compact=True, token_budget=SYNTHESIS_TOKEN_BUDGET ):
+    """
+    Genera resumen final conciso estilo Race Coach Pro.
+    compact=True: si los textos completos superan `token_budget` tokens, se reducen a hallazgos estructurados
+    (analysis_compaction) dentro del presupuesto; si caben, o con compact=False, se envían completos.
+    """
     endpoint = model_endpoint or get_lm_studio_endpoint()
     if not endpoint: return "[Error: Endpoint no determinado para síntesis]"
     required_keys = ["target_driver", "reference_driver", "faster_driver", "slower_driver", "target_lap_time", "reference_lap_time"]
@@ -367,6 +423,15 @@ def synthesize_driving_advice(
         if analysis and isinstance(analysis, str) and not analysis.startswith('['): status = analysis; analysis_count += 1
         analysis_text += f"--- Análisis de {key} ---\n{status}\n\n"
     if analysis_count == 0: return "[Error: No hay análisis válidos para la síntesis]" # No llamar a LLM si no hay nada que sintetizar
+    analysis_header = "📊 **Análisis IA por Canal (Generado automáticamente por IA de Visión):**"
+    if compact and needs_compaction(analysis_map, token_budget):
+        findings_block, stats = compact_analyses(analysis_map, token_budget)
+        missing = [k for k, a in analysis_map.items() if k not in stats['channels']]
+        analysis_text = findings_block + (f"\n(Sin análisis: {', '.join(missing)})" if missing else "")
+        analysis_header = ("📊 **Hallazgos de los análisis por canal** (una línea por hallazgo: zona | problema | magnitud | "
+                           "confianza 0-1 | canales que lo detectan: detalle; ordenados por relevancia):")
+        print(f"Contexto de síntesis compactado: ~{stats['raw_tokens']} -> ~{stats['compact_tokens']} tokens "
+              f"({stats['kept']}/{stats['findings']} hallazgos)")
 
     # Prompt de síntesis final
     synthesis_prompt = (
@@ -379,7 +444,7 @@ def synthesize_driving_advice(
         f"- Piloto Referencia (más rápido): {initial_context['reference_driver']} (Vuelta: {initial_context['reference_lap_time']})\n"
         f"- Delta total: {initial_context.get('delta_time', 'N/A')} s\n\n"
 
-        f"📊 **Análisis IA por Canal (Generado automáticamente por IA de Visión):**\n\n"
+        f"{analysis_header}\n\n"
         f"{analysis_text.strip()}\n\n"
         f"---\n\n"
 
@@ -398,13 +463,12 @@ def synthesize_driving_advice(
     )
 
     try:
-        response = requests.post(
-            f"{endpoint}/v1/chat/completions", headers={"Content-Type": "application/json"},
-            json={ "model": model_name, "messages": [{"role": "user", "content": synthesis_prompt}],
-                   "max_tokens": 1500, "temperature": 0.5, "stream": False },
-            timeout=300 )
+        with span("llm_synthesis_request", model=model_name, payload_bytes=len(synthesis_prompt.encode('utf-8'))):
+            response, response_json = _model_request(
+                endpoint, { "model": model_name, "messages": [{"role": "user", "content": synthesis_prompt}],
+                            "max_tokens": 1500, "temperature": 0.5 },
+                timeout=300, call_type="synthesis" )
         if response.status_code != 200: print(f"Error Síntesis: Status={response.status_code}"); return f"[Error servidor LLM ({response.status_code}) Síntesis]"
-        response_json = response.json()
         try:
             summary_content = response_json.get("choices", [{}])[0].get("message", {}).get("content", "").strip()
             if not summary_content: raise ValueError("Contenido vacío")
@@ -415,22 +479,182 @@ def synthesize_driving_advice(
     except Exception as e: print(f"Error Síntesis inesperado: {e}"); traceback.print_exc(); return f"[Error inesperado Síntesis]"
 
 
+def _model_request(endpoint, payload, **kwargs):
+    """chat_completion que anota el modelo usado como residente (ver ModelRequestScheduler)."""
+    global _resident_model
+    response, response_json = chat_completion(endpoint, payload, **kwargs)
+    if response is not None and response.ok: _resident_model = payload.get("model")
+    return response, response_json
+
+def get_resident_model():
+    """Modelo que LM Studio tiene cargado según la última petición correcta (None si aún no se sabe)."""
+    return _resident_model
+
+
 # --- Función de Test de Conexión ---
-def test_connection( model_endpoint=None, model_name=DEFAULT_TEXT_MODEL ):
+def test_connection( model_endpoint=None, model_name=DEFAULT_TEXT_MODEL, verbose=True ):
     """Prueba la conexión básica con el servidor LLM."""
-    endpoint = model_endpoint or get_lm_studio_endpoint()
+    endpoint = model_endpoint or get_lm_studio_endpoint(verbose=verbose)
     if not endpoint: return "[Error: Endpoint no determinado test_connection]"
-    print(f"Intentando conectar a: {endpoint} con modelo: {model_name}")
+    if verbose: print(f"Intentando conectar a: {endpoint} con modelo: {model_name}")
     try:
-        response = requests.post(
-            f"{endpoint}/v1/chat/completions", headers={"Content-Type": "application/json"},
-            json={ "model": model_name, "messages": [{"role": "user", "content": "Responde solamente cuanto es 9+1, sin nigún detalle o texto extra"}],
-                   "temperature": 0.1, "max_tokens": 20, "stream": False },
-            timeout=60 ) # Timeout más Largo
+        with span("llm_test_connection", model=model_name):
+            response, response_json = _model_request(
+                endpoint, { "model": model_name, "messages": [{"role": "user", "content": "Responde solamente cuanto es 9+1, sin nigún detalle o texto extra"}],
+                            "temperature": 0.1, "max_tokens": 20 },
+                timeout=60, call_type="test_connection" ) # Timeout más Largo
         response.raise_for_status()
-        response_json = response.json()
         content = response_json.get("choices", [{}])[0].get("message", {}).get("content", "")
         return f"Conexión OK. Respuesta: {content[:60]}..."
     except requests.exceptions.Timeout: return f"Error Conexión: Timeout (60s)."
     except requests.exceptions.RequestException as e: status = e.response.status_code if hasattr(e, 'response') and e.response is not None else "N/A"; return f"Error Conexión/HTTP ({status}): {str(e)[:100]}..."
-    except Exception as e: print(f"Error test_connection: {e}"); return f"Error test_connection ({type(e).__name__})."
\ No newline at end of file
+    except Exception as e:
+        if verbose: print(f"Error test_connection: {e}")
+        return f"Error test_connection ({type(e).__name__})."
+
+
+# --- Comprobación de Salud de Modelos (con caché y en segundo plano) ---
+def get_cached_model_status(model_name):
+    """Devuelve el último estado correcto de `model_name` si la caché no ha expirado, o None (los errores no se reutilizan)."""
+    entry = _load_ai_status_cache().get("models", {}).get(model_name)
+    if not entry or time.time() - entry.get("timestamp", 0) > AI_STATUS_CACHE_TTL: return None
+    status = entry.get("status")
+    return None if not status or "Error" in status else status
+
+def _store_model_status(model_name, status):
+    """Guarda en caché solo un estado correcto; un error borra la entrada para volver a probar en la siguiente comprobación."""
+    if status and "Error" not in status:
+        _update_ai_status_cache(models={model_name: {"status": status, "timestamp": time.time()}}); return
+    with _status_lock:
+        cache = _load_ai_status_cache()
+        if cache.get("models", {}).pop(model_name, None) is not None: save_json_cache(AI_STATUS_CACHE_FILE, cache)
+
+def check_model_status(model_name, use_cache=True, verbose=True):
+    """
+    Devuelve el estado de conexión de un modelo. Si hay una comprobación en
+    segundo plano en curso la espera; si hay caché válida (solo estados correctos)
+    la reutiliza; si no, ejecuta test_connection y guarda el resultado si es correcto.
+    """
+    thread = _background_check_thread
+    if use_cache and thread is not None and thread.is_alive():
+        if verbose: print("Esperando comprobación IA en segundo plano...")
+        thread.join()
+    if use_cache:
+        cached = get_cached_model_status(model_name)
+        if cached is not None: return cached
+    status = test_connection(model_name=model_name, verbose=verbose)
+    _store_model_status(model_name, status)
+    return status
+
+def model_check_order(model_names):
+    """
+    Orden de comprobación de `model_names` (dados en orden de uso): se comprueban al revés
+    para que el primero que usará el flujo quede cargado al terminar las comprobaciones.
+    """
+    return list(model_names)[::-1]
+
+def check_models_status(model_names, use_cache=True, verbose=True):
+    """check_model_status de varios modelos en model_check_order; devuelve {modelo: estado}."""
+    return {name: check_model_status(name, use_cache=use_cache, verbose=verbose) for name in model_check_order(model_names)}
+
+def start_background_ai_check(model_names):
+    """
+    Lanza (una sola vez) un hilo daemon que detecta el endpoint y comprueba los
+    modelos indicados (en orden de uso) sin imprimir nada, dejando en caché los estados correctos.
+    """
+    global _background_check_thread
+    if _background_check_thread is not None and _background_check_thread.is_alive(): return _background_check_thread
+
+    def _worker():
+        try:
+            get_lm_studio_endpoint(verbose=False)
+            for model_name in model_check_order(model_names):
+                if get_cached_model_status(model_name) is None:
+                    _store_model_status(model_name, test_connection(model_name=model_name, verbose=False))
+        except Exception: pass # Nunca interrumpir al hilo principal
+
+    _background_check_thread = threading.Thread(target=_worker, name="ai-health-check", daemon=True)
+    _background_check_thread.start()
+    return _background_check_thread
+
+# --- Planificador de Peticiones por Modelo (evita cambios de modelo en LM Studio) ---
+def warm_model(model_name, model_endpoint=None, verbose=True):
+    """Petición mínima (1 token) para que LM Studio cargue `model_name` antes de un lote; True si respondió."""
+    endpoint = model_endpoint or get_lm_studio_endpoint(verbose=verbose)
+    if not endpoint: return False
+    if verbose: print(f"Precargando modelo {model_name}...")
+    try:
+        with span("llm_warm_up", model=model_name):
+            response, _ = _model_request(endpoint, { "model": model_name, "messages": [{"role": "user", "content": "ok"}], "max_tokens": 1 },
+                                         timeout=300, call_type="warm_up")
+        return response is not None and response.ok
+    except Exception as e:
+        if verbose: print(f"Adv: Precarga de {model_name} fallida ({type(e).__name__}).")
+        return False
+
+class ModelRequestScheduler:
+    """
+    Cola de peticiones agrupadas por modelo. run() atiende primero al modelo residente y
+    vacía su cola entera (incluidas las peticiones que se encolen mientras tanto) antes de
+    pasar al siguiente, así un lote paga como mucho una carga por modelo. Con warm_up=True
+    cada grupo empieza con warm_model para no cargar el tiempo de carga en la primera petición.
+
+    Uso:
+        scheduler = ModelRequestScheduler(warm_up=True)
+        futures = [scheduler.submit(DEFAULT_VLM_MODEL, analyze_telemetry_comparison_graph, img, tipo, ctx) for ...]
+        stats = scheduler.run() # {'requests', 'errors', 'loads', 'order'}
+        results = [f.result() for f in futures]
+    """
+
+    def __init__(self, model_endpoint=None, warm_up=False, concurrency=1, verbose=True):
+        self.model_endpoint = model_endpoint; self.warm_up = warm_up; self.concurrency = max(1, int(concurrency)); self.verbose = verbose
+        self._queues = {} # modelo -> deque[(future, func, args, kwargs, queued_at)], en orden de primera petición
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'errors': 0, 'loads': 0, 'order': []}
+
+    def submit(self, model_name, func, *args, **kwargs):
+        """Encola func(*args, **kwargs) (una petición a `model_name`); devuelve un Future que se resuelve en run().
+        El instante del encolado llega a llm_metrics como queue_s de las llamadas que haga func."""
+        future = Future()
+        with self._lock: self._queues.setdefault(model_name, deque()).append((future, func, args, kwargs, time.perf_counter()))
+        return future
+
+    def pending(self):
+        with self._lock: return {model: len(queue) for model, queue in self._queues.items() if queue}
+
+    def _next_model(self):
+        with self._lock: ready = [model for model, queue in self._queues.items() if queue]
+        if not ready: return None
+        return _resident_model if _resident_model in ready else ready[0]
+
+    def _execute(self, item):
+        future, func, args, kwargs, queued_at = item
+        if not future.set_running_or_notify_cancel(): return
+        try:
+            with queued_request(queued_at): future.set_result(func(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+            with self._lock: self.stats['errors'] += 1
+        with self._lock: self.stats['requests'] += 1
+
+    def _drain(self, model_name):
+        while True:
+            with self._lock:
+                queue = self._queues.get(model_name)
+                batch = [queue.popleft() for _ in range(len(queue))] if queue else []
+            if not batch: return
+            if self.concurrency == 1:
+                for item in batch: self._execute(item)
+            else:
+                with ThreadPoolExecutor(max_workers=self.concurrency) as pool: list(pool.map(self._execute, batch))
+
+    def run(self):
+        """Ejecuta todas las peticiones encoladas, modelo a modelo; devuelve las estadísticas acumuladas."""
+        while (model_name := self._next_model()) is not None:
+            if model_name != _resident_model:
+                self.stats['loads'] += 1
+                if self.warm_up: warm_model(model_name, self.model_endpoint, verbose=self.verbose)
+            self.stats['order'].append(model_name)
+            if self.verbose: print(f"Planificador IA: {self.pending().get(model_name, 0)} petición(es) para {model_name}.")
+            self._drain(model_name)
+        return self.stats
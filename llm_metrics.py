@@ -0,0 +1,231 @@
+# llm_metrics.py (Métricas de latencia y rendimiento de cada llamada a modelos en LM Studio)
+#
+# Cada petición a /v1/chat/completions (VLM, síntesis, test de conexión) pasa por
+# chat_completion(), que mide tamaño de petición, bytes de imagen, tiempo en cola
+# (desde ModelRequestScheduler.submit), preparación de imagen/prompt, tiempo hasta
+# cabeceras (TTFB) y hasta el primer token (streaming SSE), latencia total y tokens
+# (campo `usage`), y añade un registro JSON por línea al log.
+#
+# Uso:
+#   python llm_metrics.py summary [--file llm_metrics.jsonl] [--since 2025-01-01] [--json]
+#   python llm_metrics.py tail -n 20
+
+import argparse
+import contextlib
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+
+from app_cache import CACHE_DIR
+from lazy_imports import lazy_import
+
+requests = lazy_import('requests')
+
+# Log de métricas (sobrescribible con RENNSPORT_LLM_METRICS; vacío u 'off' lo desactiva)
+METRICS_FILE = os.environ.get('RENNSPORT_LLM_METRICS', os.path.join(CACHE_DIR, 'llm_metrics.jsonl'))
+# Streaming SSE para medir el primer token (RENNSPORT_LLM_STREAM=0 usa respuestas completas)
+STREAM_RESPONSES = os.environ.get('RENNSPORT_LLM_STREAM', '1').lower() not in ('0', 'false', 'no')
+
+_write_lock = threading.Lock()
+_request_context = threading.local() # queued_at de la petición planificada que se ejecuta en este hilo
+
+
+def _metrics_enabled():
+    return bool(METRICS_FILE) and METRICS_FILE.lower() != 'off'
+
+
+def record_metrics(record):
+    """Añade un registro al log JSONL (seguro entre hilos; errores de escritura solo se avisan)."""
+    if not _metrics_enabled(): return
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(METRICS_FILE)), exist_ok=True)
+        line = json.dumps(record, ensure_ascii=False)
+        with _write_lock, open(METRICS_FILE, 'a', encoding='utf-8') as f: f.write(line + "\n")
+    except (OSError, TypeError, ValueError) as e: print(f"Adv: No se pudo escribir métricas LLM: {e}")
+
+
+def _read_stream(response, record, t_send):
+    """Consume una respuesta SSE y la convierte al formato de respuesta completa de la API."""
+    parts = []; usage = None; finish_reason = None; model = None; response_id = None; response_bytes = 0; chunks = 0
+    for line in response.iter_lines():
+        if not line: continue
+        response_bytes += len(line) + 1
+        if not line.startswith(b"data:"): continue
+        data = line[5:].strip()
+        if data == b"[DONE]": break
+        try: event = json.loads(data)
+        except ValueError: continue
+        model = event.get("model", model); response_id = event.get("id", response_id)
+        if event.get("usage"): usage = event["usage"]
+        for choice in event.get("choices") or []:
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                if record["ttft_s"] is None: record["ttft_s"] = time.perf_counter() - t_send
+                parts.append(content); chunks += 1
+            finish_reason = choice.get("finish_reason") or finish_reason
+    record["response_bytes"] = response_bytes; record["stream_chunks"] = chunks
+    return {"id": response_id, "model": model, "usage": usage,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)}, "finish_reason": finish_reason}]}
+
+
+@contextlib.contextmanager
+def queued_request(queued_at):
+    """Marca las llamadas de este hilo como encoladas en `queued_at` (time.perf_counter() del submit)."""
+    previous = getattr(_request_context, 'queued_at', None); _request_context.queued_at = queued_at
+    try: yield
+    finally: _request_context.queued_at = previous
+
+
+def chat_completion(endpoint, payload, timeout, call_type, label=None, image_bytes=0, queued_at=None, prep_s=None):
+    """
+    POST a {endpoint}/v1/chat/completions con registro de métricas.
+
+    Args:
+        endpoint (str): URL base de LM Studio.
+        payload (dict): Cuerpo de la petición (model, messages, ...). 'stream' se decide aquí.
+        timeout (float): Timeout de requests (s).
+        call_type (str): 'vlm', 'synthesis' o 'test_connection'.
+        label (str, opcional): Detalle (p. ej. tipo de gráfico).
+        image_bytes (int): Bytes de imagen (base64) incluidos en la petición.
+        queued_at (float, opcional): time.perf_counter() del encolado; por defecto el de queued_request() o sin cola.
+        prep_s (float, opcional): Segundos de preparación (codificar imagen, montar prompt) antes de esta llamada.
+
+    Returns:
+        tuple: (requests.Response, dict o None con el JSON en formato no-streaming). Las excepciones de red se propagan.
+    """
+    t_call = time.perf_counter()
+    stream = STREAM_RESPONSES
+    body = dict(payload, stream=stream)
+    if stream: body["stream_options"] = {"include_usage": True}
+    request_bytes = len(json.dumps(body).encode('utf-8'))
+    record = {"ts": datetime.datetime.now().isoformat(timespec='seconds'), "call_type": call_type, "label": label,
+              "model": payload.get("model"), "endpoint": endpoint, "stream": stream, "request_bytes": request_bytes,
+              "image_bytes": int(image_bytes), "queue_s": None, "prep_s": None, "ttfb_s": None, "ttft_s": None, "total_s": None,
+              "status": None, "ok": False, "error": None, "prompt_tokens": None, "completion_tokens": None,
+              "total_tokens": None, "usage_source": None, "tokens_per_s": None, "response_bytes": None}
+    t_send = time.perf_counter()
+    # Cola = del submit al inicio del trabajo (antes de la preparación); sin planificador no hay cola
+    if queued_at is None: queued_at = getattr(_request_context, 'queued_at', None)
+    t_start = t_call - (prep_s or 0.0)
+    record["queue_s"] = round(max(0.0, t_start - queued_at), 4) if queued_at is not None else 0.0
+    record["prep_s"] = round((prep_s or 0.0) + (t_send - t_call), 4)
+    response = None; response_json = None
+    try:
+        response = requests.post(f"{endpoint}/v1/chat/completions", headers={"Content-Type": "application/json"},
+                                 json=body, timeout=timeout, stream=stream)
+        record["ttfb_s"] = time.perf_counter() - t_send; record["status"] = response.status_code
+        if response.status_code == 200:
+            if stream and 'text/event-stream' in response.headers.get('Content-Type', ''):
+                response_json = _read_stream(response, record, t_send)
+            else:
+                response_json = response.json(); record["response_bytes"] = len(response.content)
+            record["ok"] = True
+        else:
+            record["error"] = f"HTTP {response.status_code}"
+        return response, response_json
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {str(e)[:200]}"
+        raise
+    finally:
+        record["total_s"] = time.perf_counter() - t_send
+        usage = (response_json or {}).get("usage") or {}
+        if usage:
+            record.update(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                          total_tokens=usage.get("total_tokens"), usage_source="server")
+        elif record.get("stream_chunks"):
+            record.update(completion_tokens=record["stream_chunks"], usage_source="estimated") # ~1 token por fragmento SSE
+        # Con streaming el primer token llega en ttft_s: el ritmo cuenta los n-1 siguientes; sin él, n tokens en toda la latencia
+        tokens = record["completion_tokens"] or 0
+        generated, generation_s = (tokens - 1, record["total_s"] - record["ttft_s"]) if record["ttft_s"] is not None else (tokens, record["total_s"])
+        if tokens >= 2 and generation_s > 0: record["tokens_per_s"] = round(generated / generation_s, 2)
+        for key in ("ttfb_s", "ttft_s", "total_s"):
+            if record[key] is not None: record[key] = round(record[key], 4)
+        record_metrics(record)
+
+
+# --- Lectura y Resumen ---
+def load_metrics(path=None, since=None):
+    """Lee los registros del log (opcionalmente desde una fecha ISO 'YYYY-MM-DD')."""
+    path = path or METRICS_FILE; records = []
+    if not os.path.exists(path): return records
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try: record = json.loads(line)
+            except ValueError: continue
+            if since and record.get("ts", "") < since: continue
+            records.append(record)
+    return records
+
+
+def _percentile(values, pct):
+    values = sorted(v for v in values if v is not None)
+    if not values: return None
+    k = (len(values) - 1) * pct / 100.0; lo = int(k); hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return sum(values) / len(values) if values else None
+
+
+def summarize_metrics(records):
+    """Agrupa por (modelo, tipo de llamada): nº, errores, latencias p50/p95, TTFT, tokens y tok/s."""
+    groups = {}
+    for record in records: groups.setdefault((record.get("model") or "?", record.get("call_type") or "?"), []).append(record)
+    rows = []
+    for (model, call_type), items in sorted(groups.items()):
+        ok = [r for r in items if r.get("ok")]
+        rows.append({
+            "model": model, "call_type": call_type, "calls": len(items), "errors": len(items) - len(ok),
+            "total_p50_s": _percentile([r.get("total_s") for r in ok], 50), "total_p95_s": _percentile([r.get("total_s") for r in ok], 95),
+            "ttfb_p50_s": _percentile([r.get("ttfb_s") for r in ok], 50), "ttft_p50_s": _percentile([r.get("ttft_s") for r in ok], 50),
+            "queue_mean_s": _mean([r.get("queue_s") for r in items]), "prep_mean_s": _mean([r.get("prep_s") for r in items]),
+            "prompt_tokens_mean": _mean([r.get("prompt_tokens") for r in ok]),
+            "completion_tokens_mean": _mean([r.get("completion_tokens") for r in ok]),
+            "tokens_per_s_mean": _mean([r.get("tokens_per_s") for r in ok]),
+            "request_kb_mean": (_mean([r.get("request_bytes") for r in items]) or 0) / 1024,
+            "image_kb_mean": (_mean([r.get("image_bytes") for r in items]) or 0) / 1024,
+        })
+    return rows
+
+
+def format_summary(rows):
+    """Tabla de texto del resumen."""
+    if not rows: return "Sin métricas registradas."
+    def fmt(value, spec): return format(value, spec) if value is not None else "-"
+    header = f"{'Modelo':<30} {'Tipo':<16} {'N':>4} {'Err':>4} {'p50 s':>7} {'p95 s':>7} {'TTFB':>6} {'TTFT':>6} {'Cola':>6} {'Prep':>6} {'Tok in':>7} {'Tok out':>7} {'tok/s':>6} {'Req KB':>7} {'Img KB':>7}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(f"{r['model'][:30]:<30} {r['call_type'][:16]:<16} {r['calls']:>4} {r['errors']:>4} {fmt(r['total_p50_s'], '7.2f')} "
+                     f"{fmt(r['total_p95_s'], '7.2f')} {fmt(r['ttfb_p50_s'], '6.2f')} {fmt(r['ttft_p50_s'], '6.2f')} {fmt(r['queue_mean_s'], '6.2f')} {fmt(r.get('prep_mean_s'), '6.2f')} "
+                     f"{fmt(r['prompt_tokens_mean'], '7.0f')} {fmt(r['completion_tokens_mean'], '7.0f')} {fmt(r['tokens_per_s_mean'], '6.1f')} "
+                     f"{r['request_kb_mean']:7.1f} {r['image_kb_mean']:7.1f}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Métricas de llamadas a modelos LM Studio.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_sum = sub.add_parser("summary", help="Resumen por modelo y tipo de llamada")
+    p_sum.add_argument("--file", default=None, help=f"Log JSONL (por defecto {METRICS_FILE})")
+    p_sum.add_argument("--since", default=None, help="Solo registros desde esta fecha (YYYY-MM-DD)")
+    p_sum.add_argument("--json", action="store_true", help="Salida JSON")
+    p_tail = sub.add_parser("tail", help="Últimos registros")
+    p_tail.add_argument("--file", default=None); p_tail.add_argument("-n", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    records = load_metrics(args.file, getattr(args, "since", None))
+    if args.command == "summary":
+        rows = summarize_metrics(records)
+        print(json.dumps(rows, indent=2, ensure_ascii=False) if args.json else format_summary(rows))
+    else:
+        for record in records[-args.n:]: print(json.dumps(record, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
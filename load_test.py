@@ -0,0 +1,206 @@
+# load_test.py (Pruebas de carga del pipeline IA contra mock_lm_studio.py o un LM Studio real)
+#
+# Uso:
+#   python load_test.py                                        # Mock local, todos los escenarios
+#   python load_test.py --scenario vlm --requests 40 --concurrency 4 --token-rate 30
+#   python load_test.py --scenario pipeline --fail-rate 0.2    # Reanudación de trabajos IA con fallos
+#   python load_test.py --scenario scheduled --swap-latency 2  # Lote agrupado por modelo (cambios de modelo)
+#   python load_test.py --endpoint http://192.168.1.10:1234 --scenario connection
+#   python load_test.py --output load_v1.json
+#
+# Los escenarios llaman a las funciones reales de llm_integration/main (no a requests
+# directamente), así que miden también codificación de imagen, métricas y trabajos IA.
+# El escenario 'pipeline' ejecuta run_ai_analysis dos veces con el mismo trabajo: la
+# segunda pasada solo debe repetir los pasos fallidos (0 peticiones si todo fue bien).
+# El escenario 'scheduled' procesa los mismos trabajos como un lote con
+# run_ai_analyses_scheduled (VLM de todos y luego síntesis): como mucho una carga por modelo.
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+from mock_lm_studio import DEFAULT_MOCK_CONFIG, start_mock_server
+
+SCENARIOS = ("connection", "vlm", "synthesis", "pipeline", "scheduled")
+LOAD_TEST_GRAPHS = ("Brake", "Throttle", "Speed")
+
+
+def _is_error(result):
+    return not result or (isinstance(result, str) and (result.startswith('[Error') or result.startswith('Error')))
+
+
+def _percentile(values, pct):
+    values = sorted(values)
+    if not values: return None
+    return values[min(len(values) - 1, int(round((len(values) - 1) * pct / 100.0)))]
+
+
+def make_test_images(folder, graph_types=LOAD_TEST_GRAPHS):
+    """Gráficos comparativos sintéticos (PNG, ~1500x600 como los del dashboard) para las peticiones VLM."""
+    import matplotlib.pyplot as plt
+    import numpy as np
+    paths = {}
+    x = np.linspace(0, 5000, 2000)
+    for i, graph_type in enumerate(graph_types):
+        fig, ax = plt.subplots(figsize=(15, 6), dpi=100)
+        ax.plot(x, 150 + 60 * np.sin(x / (300 + 40 * i)), color='blue'); ax.plot(x, 155 + 58 * np.sin(x / (305 + 40 * i)), color='orange')
+        ax.set_title(f"{graph_type} (load test)"); ax.set_xlabel("Distancia (m)")
+        paths[graph_type] = os.path.join(folder, f"{graph_type}.png"); fig.savefig(paths[graph_type]); plt.close(fig)
+    return paths
+
+
+def _context():
+    from main import build_session_context
+    return build_session_context("Load Test Ring", "Destino", "1:41.250", "Referencia", "1:40.100")
+
+
+def _server_stats(endpoint):
+    import requests
+    try: return requests.get(f"{endpoint}/stats", timeout=5).json()
+    except Exception: return None # LM Studio real no tiene /stats
+
+
+def run_requests(func, n_requests, concurrency):
+    """Ejecuta `func(i)` n veces con `concurrency` hilos; devuelve latencias (s), nº de errores y tiempo total."""
+    def timed(i):
+        t0 = time.perf_counter()
+        try: result = func(i)
+        except Exception as e: result = f"[Error: {type(e).__name__}]"
+        return time.perf_counter() - t0, _is_error(result)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool: outcomes = list(pool.map(timed, range(n_requests)))
+    wall = time.perf_counter() - t0
+    latencies = [lat for lat, err in outcomes if not err]
+    return {"requests": n_requests, "concurrency": concurrency, "ok": len(latencies), "errors": sum(err for _, err in outcomes),
+            "wall_s": wall, "throughput_rps": n_requests / wall if wall > 0 else None,
+            "latency_p50_s": _percentile(latencies, 50), "latency_p95_s": _percentile(latencies, 95),
+            "latency_max_s": max(latencies) if latencies else None,
+            "latency_mean_s": statistics.mean(latencies) if latencies else None}
+
+
+def run_scenario(name, endpoint, n_requests, concurrency, images):
+    """Ejecuta un escenario y devuelve su informe (incluye el delta de /stats del mock si existe)."""
+    import llm_integration as llm
+    import main as app
+    stats_before = _server_stats(endpoint)
+    context = _context()
+    if name == "connection":
+        report = run_requests(lambda i: llm.test_connection(endpoint, model_name=llm.DEFAULT_TEXT_MODEL, verbose=False), n_requests, concurrency)
+    elif name == "vlm":
+        graph_types = list(images)
+        report = run_requests(lambda i: llm.analyze_telemetry_comparison_graph(
+            images[graph_types[i % len(graph_types)]], graph_types[i % len(graph_types)], context, model_endpoint=endpoint), n_requests, concurrency)
+    elif name == "synthesis":
+        analyses = {g: f"Análisis simulado de {g}: el destino frena antes y acelera más tarde en la curva {k + 1}." for k, g in enumerate(app.AI_GRAPH_TYPES)}
+        report = run_requests(lambda i: llm.synthesize_driving_advice(
+            context, analyses["Brake"], analyses["Throttle"], analyses["Gear"], analyses["Speed"], analyses["TrackMap"],
+            model_endpoint=endpoint), n_requests, concurrency)
+    elif name == "scheduled":
+        from ai_jobs import open_job
+        llm._cached_endpoint = endpoint
+        graph_paths = dict(images)
+        items = [(ctx, graph_paths, open_job(ctx, graph_paths, resume=False))
+                 for ctx in (dict(context, target_driver=f"Lote {i}") for i in range(n_requests))]
+        t0 = time.perf_counter()
+        outputs, stats = app.run_ai_analyses_scheduled(items, True, concurrency=concurrency)
+        wall = time.perf_counter() - t0
+        errors = sum(1 for _, summary in outputs if _is_error(summary) or summary.startswith('[Síntesis'))
+        report = {"requests": n_requests, "concurrency": concurrency, "ok": n_requests - errors, "errors": errors, "wall_s": wall,
+                  "throughput_rps": n_requests / wall if wall > 0 else None, "latency_p50_s": None, "latency_p95_s": None,
+                  "latency_max_s": None, "latency_mean_s": None, "model_loads": stats["loads"], "model_order": stats["order"]}
+    else: # pipeline: trabajos IA con checkpoint, dos pasadas
+        from ai_jobs import open_job
+        llm._cached_endpoint = endpoint # run_ai_analysis usa el endpoint detectado
+        graph_paths = dict(images)
+        def one_job(i):
+            ctx = dict(context, target_driver=f"Destino {i}")
+            return open_job(ctx, graph_paths, resume=False), ctx
+        jobs = [one_job(i) for i in range(n_requests)]
+        passes = []
+        for attempt in (1, 2):
+            before = _server_stats(endpoint)
+            result = run_requests(lambda i: app.run_ai_analysis(jobs[i][1], graph_paths, True, job=jobs[i][0])[1], n_requests, concurrency)
+            after = _server_stats(endpoint)
+            result["model_requests"] = after["requests"] - before["requests"] if before and after else None
+            result["jobs_done"] = sum(1 for job, _ in jobs if job.status == "done")
+            passes.append(result)
+        report = {"passes": passes, "requests": n_requests, "concurrency": concurrency}
+    stats_after = _server_stats(endpoint)
+    if stats_before and stats_after:
+        report["server"] = {"requests": stats_after["requests"] - stats_before["requests"], "swaps": stats_after["swaps"] - stats_before["swaps"],
+                            "errors": {k: stats_after["errors"][k] - stats_before["errors"].get(k, 0) for k in stats_after["errors"]}}
+    return report
+
+
+def print_report(name, report):
+    def fmt(value, spec=".2f"): return format(value, spec) if value is not None else "-"
+    rows = report["passes"] if "passes" in report else [report]
+    for k, row in enumerate(rows):
+        label = f"{name} (pasada {k + 1})" if "passes" in report else name
+        extra = f"  peticiones modelo={row['model_requests']}  trabajos OK={row['jobs_done']}" if "model_requests" in row else ""
+        if "model_loads" in row: extra = f"  cargas de modelo={row['model_loads']}  t={row['wall_s']:.2f}s"
+        print(f"{label:<22} n={row['requests']:<4} c={row['concurrency']:<3} ok={row['ok']:<4} err={row['errors']:<4} "
+              f"p50={fmt(row['latency_p50_s'])}s p95={fmt(row['latency_p95_s'])}s max={fmt(row['latency_max_s'])}s "
+              f"rps={fmt(row['throughput_rps'])}{extra}")
+    if report.get("server"):
+        server = report["server"]; errors = {k: v for k, v in server["errors"].items() if v}
+        print(f"{'':<22} servidor: {server['requests']} peticiones, {server['swaps']} cambios de modelo, errores {errors or 0}")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Pruebas de carga del pipeline IA.")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--requests", type=int, default=12, help="Peticiones por escenario (trabajos en 'pipeline')")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--endpoint", default=None, help="LM Studio real (si no, se arranca mock_lm_studio)")
+    parser.add_argument("--output", default=None, help="Guarda el informe JSON")
+    parser.add_argument("--verbose", action="store_true", help="No silenciar la salida de los módulos")
+    mock = parser.add_argument_group("mock")
+    for key in ("latency", "prefill_rate", "token_rate", "completion_tokens", "swap_latency", "fail_rate", "busy_rate", "drop_rate"):
+        mock.add_argument(f"--{key.replace('_', '-')}", type=type(DEFAULT_MOCK_CONFIG[key]), default=None)
+    mock.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    mock_options = {k: v for k, v in vars(args).items() if k in DEFAULT_MOCK_CONFIG and v is not None}
+    server = None
+    if args.endpoint: endpoint = args.endpoint.rstrip('/')
+    else:
+        mock_options.setdefault("token_rate", 200.0); mock_options.setdefault("completion_tokens", 60)
+        server = start_mock_server(**mock_options); endpoint = server.url
+        print(f"Mock LM Studio en {endpoint} ({', '.join(f'{k}={v}' for k, v in sorted(mock_options.items()))})")
+
+    report = {"endpoint": endpoint, "mock": mock_options if server else None, "scenarios": {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault("RENNSPORT_CACHE_DIR", os.path.join(tmp, "cache")) # Trabajos IA y métricas aislados
+        images = make_test_images(tmp)
+        for name in scenarios:
+            with contextlib.ExitStack() as quiet, warnings.catch_warnings():
+                if not args.verbose: # Los módulos imprimen cada petición (y trazas de los fallos inyectados)
+                    quiet.enter_context(contextlib.redirect_stdout(io.StringIO())); quiet.enter_context(contextlib.redirect_stderr(io.StringIO()))
+                warnings.simplefilter("ignore")
+                result = run_scenario(name, endpoint, args.requests, args.concurrency, images)
+            report["scenarios"][name] = result
+            print_report(name, result)
+    if server is not None: server.shutdown(); server.server_close()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f: json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Informe: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
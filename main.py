@@ -1,21 +1,35 @@
 # main.py (vFinal Definitiva - OCR Tiempos + Input Ref + 5 Gráficos + Func. Original + Corrección Dashboard Call)
 
-import pandas as pd
-import numpy as np
 import os
 import sys
+import threading
 import traceback
 import json # Para imprimir contexto
 import re  # Para validar formato tiempo
 
+from lazy_imports import lazy_import
+from profiling import profiled, enable_profiling
+
+# Import diferido de pandas/numpy: el prompt inicial aparece sin esperar a cargarlos
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
 # --- Importar funciones de plotting y carga ---
 try:
     # Asegúrate que estos archivos .py estén en el mismo directorio o PYTHONPATH
-    from data_loader import load_telemetry_csv
-    from plotter import plot_lap_speed_profile, plot_lap_inputs, plot_lap_engine, plot_comparison_dashboard
+    from data_loader import load_telemetry_csv, is_telemetry_file
+    from lap_stats import compute_lap_stats, format_lap_stats_table
+    from tyre_analysis import analyze_tyres
+    from grip_analysis import compute_grip_histograms
+    from motec_export import export_motec
+    from reference_envelope import compute_reference_envelope, format_envelope_outliers
+    from resampling import analyze_sampling, format_sampling_report, resample_uniform, resample_setting
+    from ai_jobs import open_job, list_jobs, describe_job, SYNTHESIS_STEP
+    from cross_session import FrameLapSource, compare_session_laps, parse_lap_spec
+    from plotter import plot_lap_speed_profile, plot_lap_inputs, plot_lap_engine, plot_comparison_dashboard, plot_multi_lap_overlay, plot_tyre_report, plot_track_map, plot_grip_report
 except ImportError as e:
     print(f"Error FATAL importando data_loader/plotter: {e}")
-    print("Asegúrate que data_loader.py y plotter.py estén en el directorio correcto.")
+    print("Asegúrate que data_loader.py, lap_stats.py y plotter.py estén en el directorio correcto.")
     sys.exit(1)
 
 # --- Importar funciones de IA (Usando nombres finales de llm_integration.py vFinal Definitiva) ---
@@ -25,11 +39,17 @@ try:
         extract_context_from_laptime_image, # Nombre función OCR actualizada
         analyze_telemetry_comparison_graph,
         synthesize_driving_advice,
-        test_connection,
+        check_models_status,
+        start_background_ai_check,
+        ModelRequestScheduler,
+        missing_ai_dependencies,
         DEFAULT_VLM_MODEL,
         DEFAULT_TEXT_MODEL,
         time_str_to_seconds # Helper para tiempos importado
     )
+    # Con imports diferidos hay que comprobar explícitamente que las dependencias existen
+    _missing_ai_deps = missing_ai_dependencies()
+    if _missing_ai_deps: raise ImportError(f"Faltan módulos: {', '.join(_missing_ai_deps)}")
     AI_ENABLED = True
 except ImportError as e:
     print(f"\nADVERTENCIA: Importación IA falló: {e}. Funcionalidad IA deshabilitada.")
@@ -51,7 +71,22 @@ def format_time(seconds):
     return f"{minutes:02d}:{secs:02d}.{millis:03d}"
 
 
+def estimate_min_lap_time(metadata, verbose=True):
+    """Umbral mínimo de tiempo de vuelta válido: longitud de pista / 40 m/s (mín. 30 s) o 60 s fijo."""
+    track_length_m = None; track_meta_key = 'Track Length M'
+    if metadata and track_meta_key in metadata:
+         try: track_length_m = float(str(metadata[track_meta_key]).split(' ')[0])
+         except: print(f"Adv: No se pudo extraer longitud de pista de '{metadata[track_meta_key]}'")
+    min_lap_time = 60
+    if track_length_m and track_length_m > 500:
+        min_lap_time = max(30, track_length_m / 40.0)
+        if verbose: print(f"Umbral T Válido: > {min_lap_time:.1f} s (Est.)")
+    elif verbose: print(f"Umbral T Válido: > {min_lap_time} s (Fijo)")
+    return min_lap_time
+
+
 # --- Lógica de Cálculo de Vueltas (Copiada de tu versión v11, con validación robusta) ---
+@profiled("calculate_laps")
 def calculate_laps_improved(df, min_lap_time_threshold=60):
     """Calcula tiempos de vuelta basado en fin vuelta anterior."""
     required_cols = ['Time', 'Lap', 'IsLapValid']
@@ -110,6 +145,26 @@ def calculate_laps_improved(df, min_lap_time_threshold=60):
     return laps_df
 
 
+# --- Helpers IA (compartidos por el flujo interactivo y el modo batch) ---
+AI_GRAPH_TYPES = ["Brake", "Throttle", "Gear", "Speed", "TrackMap", "Steering"]
+
+
+def build_session_context(track_name, target_driver_name, target_best_lap_str, reference_driver_name, reference_best_lap_str):
+    """Construye el contexto de comparación (pilotos, tiempos, colores, delta, más rápido/lento)."""
+    session_context = {
+        "track_name": track_name, "target_driver": target_driver_name, "target_lap_time": target_best_lap_str,
+        "reference_driver": reference_driver_name, "reference_lap_time": reference_best_lap_str,
+        "target_color": "Blue", "reference_color": "Other/Non-Blue" }
+    time_target_sec = time_str_to_seconds(target_best_lap_str); time_ref_sec = time_str_to_seconds(reference_best_lap_str); delta_str="N/A"; faster="N/A"; slower="N/A"
+    if time_target_sec != float('inf') and time_ref_sec != float('inf'):
+        delta_sec = time_target_sec - time_ref_sec; delta_str = f"{delta_sec:+.3f}"
+        if delta_sec <= 0: faster = target_driver_name; slower = reference_driver_name
+        else: faster = reference_driver_name; slower = target_driver_name
+    else: print("Adv: No se pudo calcular Delta."); faster = reference_driver_name; slower = target_driver_name
+    session_context["faster_driver"] = faster; session_context["slower_driver"] = slower; session_context["delta_time"] = delta_str
+    return session_context
+
+
 # --- Función Workflow IA (Versión Final - OCR Tiempos + Input Ref + 5 Gráficos) ---
 def run_ai_analysis_workflow():
     """Orquesta: OCR Tiempos -> Input Manual Ref (+Confirmación OCR) -> VLM (5 Gráficos) -> Síntesis."""
@@ -119,6 +174,9 @@ def run_ai_analysis_workflow():
     print("\nINFO: En los análisis, tu vuelta (piloto destino) se asume que es la línea AZUL.")
     print("      La otra línea de color corresponde al piloto/vuelta de referencia.")
 
+    job = resume_ai_job_prompt()
+    if job is not None: resume_ai_job(job); return
+
     # --- PASO 1: Obtener Contexto Inicial ---
     print("\nPASO 1: Contexto Inicial")
     while True:
@@ -183,41 +241,99 @@ def run_ai_analysis_workflow():
     track_name = input(prompt_track).strip() or track_name_ocr or "N/A"
 
     # Construir Contexto Completo
-    session_context = {
-        "track_name": track_name, "target_driver": target_driver_name, "target_lap_time": target_best_lap_str,
-        "reference_driver": reference_driver_name, "reference_lap_time": reference_best_lap_str,
-        "target_color": "Blue", "reference_color": "Other/Non-Blue" }
-    time_target_sec = time_str_to_seconds(target_best_lap_str); time_ref_sec = time_str_to_seconds(reference_best_lap_str); delta_str="N/A"; faster="N/A"; slower="N/A"
-    if time_target_sec != float('inf') and time_ref_sec != float('inf'):
-        delta_sec = time_target_sec - time_ref_sec; delta_str = f"{delta_sec:+.3f}"
-        if delta_sec <= 0: faster = target_driver_name; slower = reference_driver_name
-        else: faster = reference_driver_name; slower = target_driver_name
-    else: print("Adv: No se pudo calcular Delta."); faster = reference_driver_name; slower = target_driver_name
-    session_context["faster_driver"] = faster; session_context["slower_driver"] = slower; session_context["delta_time"] = delta_str
+    session_context = build_session_context(track_name, target_driver_name, target_best_lap_str, reference_driver_name, reference_best_lap_str)
     print("\nContexto Final Construido:"); print(json.dumps(session_context, indent=2)); print("-" * 30)
 
     # --- Verificar Conexiones ---
-    print("Verificando conexiones VLM/LLM..."); vlm_ok = "Error" not in test_connection(model_name=DEFAULT_VLM_MODEL); print(f"VLM: {'OK' if vlm_ok else 'ERROR'}")
-    text_llm_ok = "Error" not in test_connection(model_name=DEFAULT_TEXT_MODEL); print(f"LLM Texto: {'OK' if text_llm_ok else 'ERROR'}")
+    print("Verificando conexiones VLM/LLM..."); statuses = check_models_status([DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL]) # El VLM queda cargado
+    vlm_ok = "Error" not in statuses[DEFAULT_VLM_MODEL]; print(f"VLM: {'OK' if vlm_ok else 'ERROR'}")
+    text_llm_ok = "Error" not in statuses[DEFAULT_TEXT_MODEL]; print(f"LLM Texto: {'OK' if text_llm_ok else 'ERROR'}")
     if not vlm_ok: print("ERROR CRÍTICO: VLM no disponible."); return
 
-    # --- PASO 2: Analizar Gráficos Individuales ---
-    graph_types_to_analyze = ["Brake", "Throttle", "Gear", "Speed", "TrackMap", "Steering"]
-    analyses = {gt: None for gt in graph_types_to_analyze}; graph_paths = {}
-    for graph_type in graph_types_to_analyze:
-        print(f"\nPASO 2: Análisis del Gráfico de {graph_type}")
+    # --- PASO 2: Rutas de los Gráficos Individuales ---
+    graph_paths = {}
+    for graph_type in AI_GRAPH_TYPES:
+        print(f"\nPASO 2: Gráfico de {graph_type}")
         while True:
             graph_image_path = input(f"Ruta a imagen de {graph_type} (o 'saltar'): ").strip()
-            if graph_image_path.lower() == 'saltar': print(f"Saltando {graph_type}."); analyses[graph_type]="[Skipped]"; graph_paths[graph_type]=None; break
+            if graph_image_path.lower() == 'saltar': print(f"Saltando {graph_type}."); graph_paths[graph_type]=None; break
             elif os.path.exists(graph_image_path): graph_paths[graph_type]=graph_image_path; break
             else: print(f"Error: '{graph_image_path}' no encontrado.")
-        if graph_paths[graph_type] is None: continue
 
-        print(f"Enviando gráfico {graph_type} al VLM ({DEFAULT_VLM_MODEL})...");
-        analysis_result = analyze_telemetry_comparison_graph(
-            image_path=graph_paths[graph_type], graph_type=graph_type, context=session_context, model_name=DEFAULT_VLM_MODEL )
-        print(f"\n--- Resultado VLM {graph_type} ---"); print(analysis_result if analysis_result else "[N/A]"); print("-" * 30)
-        analyses[graph_type] = analysis_result
+    # Trabajo con checkpoint: si estas mismas entradas ya se analizaron (total o parcialmente) se reutilizan
+    job = open_job(session_context, graph_paths, models={"vlm": DEFAULT_VLM_MODEL, "text": DEFAULT_TEXT_MODEL})
+    run_ai_analysis(session_context, graph_paths, text_llm_ok, job=job)
+
+
+def resume_ai_job_prompt():
+    """Ofrece reanudar un trabajo IA sin terminar; devuelve el AIJob elegido o None."""
+    pending = [j for j in list_jobs() if j.status != "done" and any(j.graph_paths.values())]
+    if not pending: return None
+    print("\nTrabajos IA sin terminar:")
+    for i, job in enumerate(pending[:9], 1): print(f"  {i}. {describe_job(job)}")
+    choice = input("Reanudar cuál? (número, vacío = nuevo análisis): ").strip()
+    if not choice.isdigit() or not 1 <= int(choice) <= min(len(pending), 9): return None
+    return pending[int(choice) - 1]
+
+
+def resume_ai_job(job):
+    """Reanuda un trabajo IA guardado: repite solo los pasos pendientes o fallidos."""
+    missing = [g for g, p in job.graph_paths.items() if p and not os.path.exists(p)]
+    if missing: print(f"Error: Imágenes del trabajo no encontradas ({', '.join(missing)})."); return
+    print(f"Reanudando {job.job_id}: pendientes {job.pending_steps() or 'ninguno (solo síntesis)'}")
+    statuses = check_models_status([DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL])
+    vlm_ok = "Error" not in statuses[DEFAULT_VLM_MODEL]; text_llm_ok = "Error" not in statuses[DEFAULT_TEXT_MODEL]
+    if job.pending_steps() and not vlm_ok: print("ERROR CRÍTICO: VLM no disponible."); return
+    run_ai_analysis(job.context, job.graph_paths, text_llm_ok, job=job)
+
+
+def analyze_graph_with_vlm(image_path, graph_type, session_context):
+    """Envía un gráfico al VLM e imprime el resultado."""
+    print(f"Enviando gráfico {graph_type} al VLM ({DEFAULT_VLM_MODEL})...");
+    analysis_result = analyze_telemetry_comparison_graph(
+        image_path=image_path, graph_type=graph_type, context=session_context, model_name=DEFAULT_VLM_MODEL )
+    print(f"\n--- Resultado VLM {graph_type} ---"); print(analysis_result if analysis_result else "[N/A]"); print("-" * 30)
+    return analysis_result
+
+
+def run_vlm_steps(session_context, graph_paths, analyses=None, job=None, scheduler=None):
+    """
+    Análisis VLM de cada gráfico aún no analizado (PASO 2 de run_ai_analysis).
+
+    Con `scheduler` (llm_integration.ModelRequestScheduler) los análisis pendientes solo se
+    encolan para DEFAULT_VLM_MODEL y el dict devuelto se completa (con checkpoint) al ejecutar
+    scheduler.run().
+
+    Returns:
+        tuple: (dict análisis por tipo, bool si hay análisis nuevos)
+    """
+    analyses = dict(analyses or {})
+    if job is not None: analyses.update(job.completed_analyses())
+    new_results = False; lock = threading.Lock() # Con scheduler concurrente, un checkpoint a la vez por trabajo
+    def store(graph_type, result):
+        with lock:
+            analyses[graph_type] = result
+            if job is not None: job.checkpoint(graph_type, result)
+    for graph_type in AI_GRAPH_TYPES:
+        image_path = graph_paths.get(graph_type)
+        if not image_path: analyses[graph_type] = "[Skipped]"; continue
+        if analyses.get(graph_type) is None:
+            new_results = True
+            if scheduler is None: store(graph_type, analyze_graph_with_vlm(image_path, graph_type, session_context)); continue
+            future = scheduler.submit(DEFAULT_VLM_MODEL, analyze_graph_with_vlm, image_path, graph_type, session_context)
+            future.add_done_callback(lambda f, g=graph_type: store(g, f.result() if f.exception() is None else f"[Error: {type(f.exception()).__name__}]"))
+        elif job is not None: print(f"{graph_type}: análisis reutilizado del trabajo {job.job_id}.")
+    return analyses, new_results
+
+
+def run_synthesis_step(session_context, analyses, text_llm_ok=True, new_results=True, job=None):
+    """Síntesis final con el LLM de texto (PASO 3), reutilizando la del trabajo si los análisis no cambiaron."""
+    # Síntesis ya hecha con estos mismos análisis: se reutiliza
+    if job is not None and not new_results and job.result(SYNTHESIS_STEP) is not None:
+        final_summary = job.result(SYNTHESIS_STEP); job.finish(final_summary)
+        print("\n" + "="*40); print("--- RESUMEN FINAL DE CONSEJOS (GENERADO POR IA, reutilizado) ---"); print("="*40)
+        print(final_summary); print("="*40)
+        return final_summary
 
     # --- PASO 3: Síntesis Final ---
     final_summary = "[Síntesis no realizada]"
@@ -238,6 +354,49 @@ def run_ai_analysis_workflow():
 
     print("\n" + "="*40); print("--- RESUMEN FINAL DE CONSEJOS (GENERADO POR IA) ---"); print("="*40)
     print(final_summary); print("="*40)
+    if job is not None: job.finish(final_summary)
+    return final_summary
+
+
+def run_ai_analysis(session_context, graph_paths, text_llm_ok=True, analyses=None, job=None):
+    """
+    Núcleo no interactivo del análisis IA: análisis VLM de cada gráfico aún no
+    analizado + síntesis final con el LLM de texto.
+
+    Args:
+        session_context (dict): Contexto de build_session_context().
+        graph_paths (dict): {tipo_gráfico: ruta_imagen o None para saltar}.
+        text_llm_ok (bool): Si el LLM de texto está disponible para la síntesis.
+        analyses (dict, opcional): Análisis VLM ya obtenidos {tipo: texto}; no se repiten.
+        job (ai_jobs.AIJob, opcional): Trabajo con checkpoint; se reutilizan sus pasos completados
+            y cada resultado nuevo se guarda en cuanto termina.
+
+    Returns:
+        tuple: (dict análisis por tipo, str resumen final)
+    """
+    analyses, new_results = run_vlm_steps(session_context, graph_paths, analyses, job)
+    return analyses, run_synthesis_step(session_context, analyses, text_llm_ok, new_results, job)
+
+
+def run_ai_analyses_scheduled(items, text_llm_ok=True, warm_up=True, concurrency=1):
+    """
+    run_ai_analysis de varias comparativas agrupando las peticiones por modelo: primero todos los
+    análisis VLM de todas y después todas las síntesis, así LM Studio carga cada modelo una sola vez.
+
+    Args:
+        items (list): [(session_context, graph_paths, job o None), ...].
+        concurrency (int): Peticiones simultáneas al mismo modelo (LM Studio con varios slots).
+
+    Returns:
+        tuple: (lista de (análisis, resumen) en el orden de `items`, dict stats del planificador)
+    """
+    scheduler = ModelRequestScheduler(warm_up=warm_up, concurrency=concurrency)
+    pending = [(context, job, *run_vlm_steps(context, graph_paths, job=job, scheduler=scheduler)) for context, graph_paths, job in items]
+    scheduler.run()
+    summaries = [scheduler.submit(DEFAULT_TEXT_MODEL, run_synthesis_step, context, analyses, text_llm_ok, new_results, job)
+                 for context, job, analyses, new_results in pending]
+    stats = scheduler.run()
+    return [(analyses, summary.result()) for (_, _, analyses, _), summary in zip(pending, summaries)], stats
 
 
 # --- Función Principal (main - Llama a workflow actualizado) ---
@@ -247,7 +406,7 @@ def main():
         file_path = input("\nIntroduce la ruta al archivo CSV de telemetría (o deja vacío para salir): ").strip()
         if not file_path: print("Saliendo..."); break
         if not os.path.exists(file_path): print(f"Error: '{file_path}' no existe."); continue
-        if not file_path.lower().endswith('.csv'): print(f"Error: '{os.path.basename(file_path)}' no parece ser CSV."); continue
+        if not is_telemetry_file(file_path): print(f"Error: '{os.path.basename(file_path)}' no parece ser CSV (.csv, .csv.gz, .csv.zst, .csv.bz2, .csv.xz)."); continue
 
         print(f"\nProcesando archivo: {file_path}")
         # --- Carga y Cálculo Vueltas ---
@@ -257,19 +416,18 @@ def main():
             print(f"Cargando datos..."); df_cleaned, metadata = load_telemetry_csv(file_path)
             if df_cleaned is None or df_cleaned.empty: print("Error carga."); continue
             print(f"Carga OK. {df_cleaned.shape[0]}x{df_cleaned.shape[1]}."); print("Metadatos:", metadata)
+            sampling = analyze_sampling(df_cleaned); print(format_sampling_report(sampling))
+            resample_rate = resample_setting(sys.argv[1:]) # '--resample[=HZ]' o RENNSPORT_RESAMPLE
+            if resample_rate:
+                df_cleaned, sampling = resample_uniform(df_cleaned, None if resample_rate == 'auto' else resample_rate, report=sampling)
+                print(f"Remuestreado a {sampling['resampled_rate_hz']:g} Hz: {len(df_cleaned)} filas.")
 
             print("\nCalculando Tiempos...");
-            track_length_m = None; track_meta_key = 'Track Length M'
-            if metadata and track_meta_key in metadata:
-                 try: track_length_m = float(str(metadata[track_meta_key]).split(' ')[0])
-                 except: print(f"Adv: No se pudo extraer longitud de pista de '{metadata[track_meta_key]}'")
-            min_lap_time = 60
-            if track_length_m and track_length_m > 500: min_lap_time = max(30, track_length_m / 40.0); print(f"Umbral T Válido: > {min_lap_time:.1f} s (Est.)")
-            else: print(f"Umbral T Válido: > {min_lap_time} s (Fijo)")
+            min_lap_time = estimate_min_lap_time(metadata)
 
             laps_info_df = calculate_laps_improved(df_cleaned, min_lap_time)
             if not laps_info_df.empty:
-                print("Tiempos calculados:"); laps_display = laps_info_df[['Lap','LapType','FormattedTime','IsTimeValid']].rename(columns={'FormattedTime':'T Fmt','IsTimeValid':'Valida'}); print(laps_display.to_string(index=False))
+                print("Tiempos calculados:"); print(format_lap_stats_table(laps_info_df, compute_lap_stats(df_cleaned, laps_info_df)))
                 valid_timed = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType']=='Timed Lap')]
                 if not valid_timed.empty:
                     best_lap_row = valid_timed.loc[valid_timed['LapTime'].idxmin()]
@@ -286,6 +444,12 @@ def main():
             print("\n--- Opciones para Archivo Cargado ---")
             print("1: Generar Gráficos Individuales/Comparativos (Original)")
             print("2: Realizar Análisis Comparativo con IA (Nuevo)")
+            print("3: Superposición de N Vueltas (consistencia)")
+            print("4: Informe de Neumáticos")
+            print("5: Mapa de Pista (GPS)")
+            print("6: Comparar con Vuelta de Otro Archivo (otro piloto)")
+            print("7: Diagrama G-G e Histogramas de Entradas")
+            print("8: Exportar a MoTeC i2 (.ld/.ldx)")
             print("V: Volver a selección archivo CSV")
             print("Q: Salir del programa")
             main_choice = input("Elige una opción: ").strip().upper()
@@ -335,7 +499,13 @@ def main():
                                      if ref_lap_num not in avail_ref_laps: print("Ref inválida."); continue
                                      print(f"Generando Dashboard V{selected_lap_num} vs V{ref_lap_num}...")
                                      # --- LLAMADA CORREGIDA (4 ARGS) ---
-                                     plot_comparison_dashboard(df_cleaned, metadata, selected_lap_num, ref_lap_num)
+                                     align_choice = input("Alineación? (D: LapDist [defecto], P: posición GPS): ").strip().upper()
+                                     alignment = 'position' if align_choice == 'P' else 'distance'
+                                     envelope = None
+                                     if input("Banda de referencia de todas las vueltas válidas (p10-p90)? (s/N): ").strip().upper() == 'S':
+                                         envelope = compute_reference_envelope(df_cleaned, laps_info_df, alignment=alignment, reference_lap=ref_lap_num)
+                                         print(format_envelope_outliers(envelope) if envelope else "Adv: Se necesitan al menos 3 vueltas válidas para la banda.")
+                                     plot_comparison_dashboard(df_cleaned, metadata, selected_lap_num, ref_lap_num, alignment=alignment, envelope=envelope)
                                      print("OK.")
                                  elif report_choice == '5': # Todos
                                      print(f"Generando TODOS para V{selected_lap_num}..."); err_p=False
@@ -357,6 +527,59 @@ def main():
                  # --- Opción 2: Flujo IA ---
                 if AI_ENABLED: run_ai_analysis_workflow() # Llama a la versión final de workflow
                 else: print("Funcionalidad IA deshabilitada.")
+            elif main_choice == '3':
+                if not available_laps_for_analysis: print("\nNo hay vueltas disponibles."); continue
+                overlay_input = input(f"Vueltas a superponer (ej. 3,5,8; vacío = todas las válidas; Disp: {available_laps_for_analysis}): ").strip()
+                try: overlay_laps = [int(x) for x in overlay_input.split(',') if x.strip()] or None
+                except ValueError: print("Lista de vueltas inválida."); continue
+                align_choice = input("Alineación? (D: LapDist [defecto], P: posición GPS): ").strip().upper()
+                try: plot_multi_lap_overlay(df_cleaned, metadata, laps_info_df, overlay_laps, alignment='position' if align_choice == 'P' else 'distance'); print("OK.")
+                except Exception as e_o: print(f"Error gráfico: {e_o}")
+            elif main_choice == '4':
+                try:
+                    tyre_report = analyze_tyres(df_cleaned, laps_info_df)
+                    if tyre_report['laps'].empty: print("Sin datos de neumáticos."); continue
+                    print("\nResumen por stint y rueda:"); print(tyre_report['stint_summary'].round(3).to_string(index=False))
+                    plot_tyre_report(tyre_report['laps'], tyre_report['balance'], metadata); print("OK.")
+                except Exception as e_t: print(f"Error informe neumáticos: {e_t}")
+            elif main_choice == '5':
+                if not available_laps_for_analysis: print("\nNo hay vueltas disponibles."); continue
+                map_input = input(f"Vuelta[:Ref] para el mapa (ej. 5 o 5:3; Disp: {available_laps_for_analysis}): ").strip()
+                channel_input = input("Canal de color (Speed, Brake, Throttle, Gear, Delta; vacío = Speed; 'trazadas' = solo líneas): ").strip()
+                try:
+                    parts = [int(x) for x in map_input.split(':')]
+                    map_lap, map_ref = parts[0], (parts[1] if len(parts) > 1 else None)
+                except (ValueError, IndexError): print("Vuelta inválida."); continue
+                if map_lap not in available_laps_for_analysis or (map_ref is not None and map_ref not in available_laps_for_analysis): print("Vuelta inválida."); continue
+                map_channel = None if channel_input.lower() == 'trazadas' else (channel_input or 'Speed')
+                try: plot_track_map(df_cleaned, metadata, map_lap, map_channel, map_ref, laps_info_df); print("OK.")
+                except Exception as e_m: print(f"Error mapa de pista: {e_m}")
+            elif main_choice == '6':
+                if not available_laps_for_analysis: print("\nNo hay vueltas disponibles."); continue
+                lap_input = input(f"Tu vuelta (número o 'best'; Disp: {available_laps_for_analysis}): ").strip() or 'best'
+                other_input = input("Referencia: ruta CSV o almacén por canal[:best|worst|N] (ej. otro/Telemetry.csv:best): ").strip()
+                if not other_input: print("Entrada vacía."); continue
+                align_choice = input("Alineación? (D: LapDist [defecto], P: posición GPS): ").strip().upper()
+                try:
+                    current = FrameLapSource(df_cleaned, metadata, laps_info_df, file_path)
+                    compare_session_laps((current, lap_input), parse_lap_spec(other_input), alignment='position' if align_choice == 'P' else 'distance'); print("OK.")
+                except (OSError, KeyError, ValueError) as e_x: print(f"Error comparativa entre archivos: {e_x}")
+            elif main_choice == '7':
+                grip_input = input(f"Vueltas a incluir (ej. 3,5,8; vacío = todas las válidas; Disp: {available_laps_for_analysis}): ").strip()
+                try: grip_laps = [int(x) for x in grip_input.split(',') if x.strip()] or None
+                except ValueError: print("Lista de vueltas inválida."); continue
+                try:
+                    grip = compute_grip_histograms(df_cleaned, laps_info_df, grip_laps)
+                    if grip['grip_envelope_g'] is not None: print(f"Adherencia p{grip['grip_envelope_pct']:g}: {grip['grip_envelope_g']:.2f} g")
+                    plot_grip_report(grip, metadata); print("OK.")
+                except Exception as e_g: print(f"Error informe de adherencia: {e_g}")
+            elif main_choice == '8':
+                default_ld = re.sub(r'\.csv(\.\w+)?$', '', file_path, flags=re.IGNORECASE) + '.ld'
+                ld_path = input(f"Archivo .ld de destino [{default_ld}]: ").strip() or default_ld
+                try:
+                    summary = export_motec(df_cleaned, metadata, ld_path, laps_info_df)
+                    print(f"MoTeC: {summary['ld_path']} ({summary['bytes'] / 1e6:.1f} MB, {summary['channels']} canales a {summary['rate_hz']} Hz) + {summary['ldx_path']}")
+                except (OSError, ValueError) as e_m: print(f"Error exportación MoTeC: {e_m}")
             elif main_choice == 'V': print("Volviendo a selección archivo..."); break
             elif main_choice == 'Q': print("Saliendo..."); sys.exit()
             else: print("Opción no válida.")
@@ -364,12 +587,23 @@ def main():
     # Fin bucle principal
 
 if __name__ == "__main__":
+    # Perfilado por etapas: '--profile' o RENNSPORT_PROFILE=1 (resumen + trace al salir); '--profile-memory' añade memoria pico
+    if '--profile-memory' in sys.argv[1:]: enable_profiling(trace_memory=True)
+    elif '--profile' in sys.argv[1:]: enable_profiling()
+    # Remuestreo a frecuencia fija tras la carga: '--resample[=HZ]' o RENNSPORT_RESAMPLE=auto|HZ (ver resampling.py)
+    # Modo arranque rápido: '--fast-start' o RENNSPORT_FAST_START=1
+    fast_start = '--fast-start' in sys.argv[1:] or os.environ.get('RENNSPORT_FAST_START', '').lower() in ('1', 'true', 'yes')
     # --- Comprobación Conexión Inicial ---
-    if AI_ENABLED:
+    if AI_ENABLED and fast_start:
+        # Endpoint + salud de modelos en segundo plano (resultados en caché con TTL)
+        start_background_ai_check([DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL])
+        print("Arranque rápido: comprobación de modelos IA en segundo plano.")
+    elif AI_ENABLED:
         print("Comprobando conexión inicial con modelos IA (puede tardar)...")
         try:
-             vlm_status = test_connection(model_name=DEFAULT_VLM_MODEL); print(f"- VLM ({DEFAULT_VLM_MODEL}): {vlm_status}")
-             text_status = test_connection(model_name=DEFAULT_TEXT_MODEL); print(f"- LLM Texto ({DEFAULT_TEXT_MODEL}): {text_status}")
+             statuses = check_models_status([DEFAULT_VLM_MODEL, DEFAULT_TEXT_MODEL], use_cache=False) # Texto primero: el VLM queda cargado
+             vlm_status = statuses[DEFAULT_VLM_MODEL]; print(f"- VLM ({DEFAULT_VLM_MODEL}): {vlm_status}")
+             text_status = statuses[DEFAULT_TEXT_MODEL]; print(f"- LLM Texto ({DEFAULT_TEXT_MODEL}): {text_status}")
              print("-" * 20)
              if "Error" in vlm_status or "Error" in text_status: print("ADVERTENCIA: Uno o ambos modelos IA no responden.")
         except NameError: print("Error: Constantes IA no definidas.")
@@ -0,0 +1,237 @@
+# mock_lm_studio.py (Servidor local que imita la API de LM Studio para pruebas sin modelos)
+#
+# Implementa /v1/chat/completions (texto y partes image_url en base64, respuesta
+# completa o streaming SSE con `usage`), /v1/models y /stats. La latencia se simula
+# con un retardo base + tiempo de prefill por token de entrada + generación a
+# `token_rate` tokens/s; cambiar de modelo cuesta `swap_latency` s (como la recarga
+# de LM Studio). Fallos inyectables: HTTP 500, 429, timeouts (respuesta que no llega)
+# y cortes del stream.
+#
+# Uso:
+#   python mock_lm_studio.py --port 1234 --token-rate 40 --latency 0.2 --fail-rate 0.05
+#   RENNSPORT_LM_STUDIO_URL=http://127.0.0.1:1234 python main.py
+
+import argparse
+import base64
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_MOCK_PORT = 1234
+DEFAULT_MODELS = ("llava-v1.6-mistral-7b", "meta-llama-3-8b-instruct")
+IMAGE_PROMPT_TOKENS = 576 # Tokens equivalentes de una imagen en llava (parches 24x24)
+
+DEFAULT_MOCK_CONFIG = {
+    "latency": 0.05,          # Retardo fijo antes de la primera respuesta (s)
+    "prefill_rate": 2000.0,   # Tokens de entrada procesados por segundo
+    "token_rate": 50.0,       # Tokens generados por segundo
+    "completion_tokens": 120, # Tokens por respuesta (limitado por max_tokens)
+    "swap_latency": 0.0,      # Coste de cargar otro modelo (s)
+    "fail_rate": 0.0,         # Probabilidad de HTTP 500
+    "busy_rate": 0.0,         # Probabilidad de HTTP 429
+    "timeout_rate": 0.0,      # Probabilidad de no responder en `hang_seconds`
+    "hang_seconds": 600.0,
+    "drop_rate": 0.0,         # Probabilidad de cortar el stream a mitad
+    "seed": None,
+}
+
+# Frases de relleno para las respuestas simuladas (según el canal detectado en el prompt)
+_CANNED = {
+    "Brake": "El piloto destino frena antes y con menos presión pico en la curva 1; la referencia suelta el freno de forma progresiva hasta el vértice.",
+    "Throttle": "La referencia aplica el acelerador antes a la salida de la chicane; el destino tarda en llegar a fondo y corrige a mitad de curva.",
+    "Gear": "El destino reduce una marcha de más en la horquilla y cambia más tarde hacia arriba en la recta principal.",
+    "Speed": "La velocidad mínima del destino en el vértice es 6 km/h menor; la diferencia se arrastra por toda la recta siguiente.",
+    "TrackMap": "La trazada del destino entra cerrada en la curva 3 y pierde el punto de cuerda; la referencia usa todo el ancho a la salida.",
+    "Steering": "El destino aplica más ángulo de volante y hace correcciones en la entrada; la referencia gira una sola vez y suelta antes.",
+}
+_SYNTHESIS = ("1. Frenada más progresiva: suelta el freno gradualmente hasta el vértice. "
+              "2. Acelerador antes: busca llegar a fondo a la salida sin correcciones. "
+              "3. Marchas: evita reducir de más en la horquilla. "
+              "4. Trazada: aprovecha todo el ancho a la salida de la curva 3.")
+
+
+class MockLMStudioServer(ThreadingHTTPServer):
+    """ThreadingHTTPServer con configuración y contadores compartidos entre peticiones."""
+    daemon_threads = True
+
+    def __init__(self, address, config=None):
+        super().__init__(address, _MockHandler)
+        self.config = dict(DEFAULT_MOCK_CONFIG, **(config or {}))
+        self.random = random.Random(self.config["seed"])
+        self.lock = threading.Lock() # Serializa la "GPU": una generación a la vez, como LM Studio
+        self.stats_lock = threading.Lock()
+        self.loaded_model = None
+        self.stats = {"requests": 0, "by_model": {}, "swaps": 0, "images": 0, "image_bytes": 0,
+                      "errors": {"500": 0, "429": 0, "timeout": 0, "drop": 0, "400": 0}, "stream": 0}
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)): return # Cliente que cortó (timeout)
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key, model=None, amount=1):
+        with self.stats_lock:
+            if key in self.stats["errors"]: self.stats["errors"][key] += amount
+            else: self.stats[key] += amount
+            if model is not None: self.stats["by_model"][model] = self.stats["by_model"].get(model, 0) + 1
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def _inspect_messages(messages):
+    """Texto total, nº de imágenes y bytes de imagen (decodificados) de los mensajes."""
+    texts = []; images = 0; image_bytes = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str): texts.append(content); continue
+        for part in content or []:
+            if part.get("type") == "text": texts.append(part.get("text", ""))
+            elif part.get("type") == "image_url":
+                url = (part.get("image_url") or {}).get("url", "")
+                if not url.startswith("data:image/") or ";base64," not in url: raise ValueError("image_url debe ser data:image/...;base64")
+                image_bytes += len(base64.b64decode(url.split(",", 1)[1], validate=True)); images += 1
+    return "\n".join(texts), images, image_bytes
+
+
+def _canned_reply(text, images):
+    """Respuesta simulada: análisis del canal citado en el prompt, síntesis o test de conexión."""
+    if "9+1" in text: return "10"
+    if images:
+        match = re.search(r"gráfico de (\w+)|\b(Brake|Throttle|Gear|Speed|TrackMap|Steering)\b", text)
+        channel = next((g for g in (match.groups() if match else ()) if g in _CANNED), None) or "Speed"
+        return _CANNED[channel]
+    return _SYNTHESIS
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args): pass # Sin log por petición
+
+    def _send_json(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json"); self.send_header("Content-Length", str(len(body)))
+        self.end_headers(); self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in DEFAULT_MODELS]})
+        elif self.path.rstrip('/') == "/stats":
+            with self.server.stats_lock: self._send_json(200, dict(self.server.stats, loaded_model=self.server.loaded_model))
+        else: self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        server = self.server; cfg = server.config
+        if self.path.rstrip('/') != "/v1/chat/completions": self._send_json(404, {"error": "not found"}); return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            model = payload["model"]; messages = payload["messages"]
+            text, images, image_bytes = _inspect_messages(messages)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            server.count("400"); self._send_json(400, {"error": f"Petición inválida: {e}"}); return
+        server.count("requests", model); server.count("images", amount=images); server.count("image_bytes", amount=image_bytes)
+
+        roll = server.random.random()
+        if roll < cfg["fail_rate"]: server.count("500"); self._send_json(500, {"error": "Error simulado del servidor"}); return
+        roll -= cfg["fail_rate"]
+        if roll < cfg["busy_rate"]: server.count("429"); self._send_json(429, {"error": "Servidor ocupado (simulado)"}); return
+        roll -= cfg["busy_rate"]
+        if roll < cfg["timeout_rate"]: server.count("timeout"); time.sleep(cfg["hang_seconds"]); return
+        roll -= cfg["timeout_rate"]
+        drop = roll < cfg["drop_rate"]
+
+        prompt_tokens = _estimate_tokens(text) + images * IMAGE_PROMPT_TOKENS
+        reply_words = _canned_reply(text, images).split(" ")
+        n_tokens = len(reply_words) if len(reply_words) < 5 else max(cfg["completion_tokens"], len(reply_words)) # Respuestas cortas sin relleno
+        n_tokens = min(int(payload.get("max_tokens") or n_tokens), n_tokens)
+        tokens = [(" " if i else "") + reply_words[i % len(reply_words)] for i in range(n_tokens)] # ~1 token por palabra
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        stream = bool(payload.get("stream"))
+        response_id = f"chatcmpl-mock-{server.random.getrandbits(32):08x}"
+
+        with server.lock: # Una generación a la vez
+            if server.loaded_model != model:
+                if server.loaded_model is not None:
+                    server.count("swaps"); time.sleep(cfg["swap_latency"])
+                server.loaded_model = model
+            time.sleep(cfg["latency"] + prompt_tokens / cfg["prefill_rate"])
+            token_delay = 1.0 / cfg["token_rate"] if cfg["token_rate"] > 0 else 0.0
+            if not stream:
+                time.sleep(token_delay * len(tokens))
+                self._send_json(200, {"id": response_id, "object": "chat.completion", "model": model, "usage": usage,
+                                      "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}]})
+                return
+            server.count("stream")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream"); self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close"); self.end_headers()
+            self.close_connection = True
+            try:
+                for i, token in enumerate(tokens):
+                    if drop and i == len(tokens) // 2: server.count("drop"); return # Corte a mitad del stream
+                    self._sse({"id": response_id, "object": "chat.completion.chunk", "model": model,
+                               "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+                    if token_delay: time.sleep(token_delay)
+                self._sse({"id": response_id, "object": "chat.completion.chunk", "model": model,
+                           "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+                if (payload.get("stream_options") or {}).get("include_usage"):
+                    self._sse({"id": response_id, "object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n"); self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError): pass # El cliente cerró (timeout del lado cliente)
+
+    def _sse(self, event):
+        self.wfile.write(b"data: " + json.dumps(event).encode('utf-8') + b"\n\n"); self.wfile.flush()
+
+
+def start_mock_server(host="127.0.0.1", port=0, **config):
+    """
+    Arranca el servidor simulado en un hilo daemon.
+
+    Args:
+        port (int): 0 = puerto libre aleatorio.
+        **config: Claves de DEFAULT_MOCK_CONFIG.
+
+    Returns:
+        MockLMStudioServer: Usa `.url` como endpoint y `.shutdown()` para pararlo.
+    """
+    unknown = set(config) - set(DEFAULT_MOCK_CONFIG)
+    if unknown: raise ValueError(f"Opciones de mock desconocidas: {', '.join(sorted(unknown))}")
+    server = MockLMStudioServer((host, port), config)
+    threading.Thread(target=server.serve_forever, name="mock-lm-studio", daemon=True).start()
+    return server
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="Servidor simulado de LM Studio (/v1/chat/completions).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_MOCK_PORT)
+    for key, default in DEFAULT_MOCK_CONFIG.items():
+        if key == "seed": parser.add_argument("--seed", type=int, default=None)
+        else: parser.add_argument(f"--{key.replace('_', '-')}", type=type(default), default=default)
+    return parser
+
+
+def main(argv=None):
+    args = vars(build_arg_parser().parse_args(argv))
+    host, port = args.pop("host"), args.pop("port")
+    server = MockLMStudioServer((host, port), args)
+    print(f"Mock LM Studio en {server.url} (modelos: {', '.join(DEFAULT_MODELS)}). Ctrl+C para salir.")
+    try: server.serve_forever()
+    except KeyboardInterrupt: print("\nDeteniendo mock...")
+    finally: server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,299 @@
+# motec_export.py (Exportación de una sesión al formato binario MoTeC i2: .ld + .ldx)
+#
+# Formato .ld (little-endian), el mismo que leen MoTeC i2 y ldparser:
+#   cabecera (1762 B) -> evento -> circuito -> vehículo -> metadatos de canal (lista
+#   enlazada, 124 B cada uno) -> datos: un bloque contiguo por canal a frecuencia fija
+# El .ldx (XML) lleva los marcadores de vuelta (balizas, en µs desde el inicio) y la
+# vuelta rápida. Los canales salen de RENAME_MAP con la unidad del nombre original; los
+# principales usan los nombres estándar de i2 (Ground Speed, Throttle Pos, G Force Lat...)
+# para que funcionen las matemáticas y plantillas habituales.
+#
+# Los datos se escriben por bloques vectorizados: todos los canales de un mismo tipo se
+# empaquetan en una matriz (muestras x canales) y su traspuesta contigua se escribe de
+# una vez, de modo que cada canal queda como un bloque y la sesión se convierte en segundos.
+# MoTeC exige frecuencia fija: si el muestreo tiene huecos, duplicados o jitter se
+# remuestrea antes con resampling.resample_uniform.
+#
+# Uso:
+#   python motec_export.py export Telemetry.csv sesion.ld [--rate 60]   # Escribe sesion.ld y sesion.ldx
+#   python motec_export.py info sesion.ld
+#   export_motec(df, metadata, "sesion.ld", laps_info_df)
+
+import argparse
+import datetime
+import os
+import re
+import struct
+import sys
+import xml.etree.ElementTree as ET
+
+from data_loader import RENAME_MAP
+from lazy_imports import lazy_import
+from plotter import GRAVITY
+from profiling import profiled
+from resampling import analyze_sampling, resample_uniform
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+MAX_JITTER_PCT = 1.0 # Por encima se remuestrea a frecuencia fija antes de exportar
+EXCLUDED_COLUMNS = ('Time',) # El tiempo es implícito (frecuencia del canal)
+
+# Estructuras .ld (ver ldparser); los campos '?x' son relleno de significado desconocido
+LD_HEAD_FMT = '<I4xII20xI24xHHHI8sHHI4x16s16x16s16x64s64s64x64s64x1024xI66x64s126x'
+LD_EVENT_FMT = '<64s64s1024sH'
+LD_VENUE_FMT = '<64s1034xH'
+LD_VEHICLE_FMT = '<64s128xI32s32s'
+LD_CHAN_FMT = '<IIIIHHHHhhhh32s8s12s40x'
+LD_MARKER = 0x40
+LD_DEVICE = (b'ADL', 420, 0xadb0, 0x1f44) # Tipo, versión, constante y nº de serie del registrador emulado
+LD_PRO_LOGGING = 0xc81a4
+LD_CHANNEL_ID = 0x2ee1 # Contador de canal (primer valor)
+# dtype numpy -> (tipo MoTeC, tamaño en bytes)
+LD_DTYPES = {'<f4': (0x07, 4), '<i2': (0x03, 2), '<i4': (0x05, 4)} # Por dtype.str: sin numpy al importar
+
+# Canal -> (nombre i2, nombre corto, unidad, factor, decimales); el resto usa el nombre del CSV sin unidad
+MOTEC_CHANNELS = {
+    'Lap': ('Lap Number', 'Lap', '', 1.0, 0),
+    'LapDist': ('Lap Distance', 'LapDist', 'm', 1.0, 0),
+    'Speed': ('Ground Speed', 'Speed', 'km/h', 1.0, 0),
+    'Throttle': ('Throttle Pos', 'Thr', '%', 100.0, 0),
+    'Brake': ('Brake Pos', 'Brk', '%', 100.0, 0),
+    'Clutch': ('Clutch Pos', 'Clutch', '%', 100.0, 0),
+    'Steer': ('Steered Angle', 'Steer', 'deg', 1.0, 0),
+    'Gear': ('Gear', 'Gear', '', 1.0, 0),
+    'RPM': ('Engine RPM', 'RPM', 'rpm', 1.0, 0),
+    'G_Lat': ('G Force Lat', 'GLat', 'G', 1.0 / GRAVITY, 0),
+    'G_Lon': ('G Force Long', 'GLong', 'G', 1.0 / GRAVITY, 0),
+    'G_Vert': ('G Force Vert', 'GVert', 'G', 1.0 / GRAVITY, 0),
+    'Fuel': ('Fuel Level', 'Fuel', 'l', 1.0, 0),
+    'Latitude': ('GPS Latitude', 'GPSLat', 'deg', 1.0, 7), # int32 con 7 decimales (float32 perdería ~0.5 m)
+    'Longitude': ('GPS Longitude', 'GPSLong', 'deg', 1.0, 7),
+    'Altitude': ('GPS Altitude', 'GPSAlt', 'm', 1.0, 0),
+}
+UNIT_ALIASES = {'Kmh': 'km/h', 'RPM': 'rpm', 'm/s^2': 'm/s/s'}
+
+
+def _csv_channel_info():
+    """{columna renombrada: (nombre original sin unidad, unidad)} a partir de RENAME_MAP."""
+    info = {}
+    for source, target in RENAME_MAP.items():
+        match = re.search(r'\s*\(([^()]*)\)\s*$', source)
+        unit = UNIT_ALIASES.get(match.group(1), match.group(1)) if match else ''
+        info.setdefault(target, (source[:match.start()] if match else source, unit))
+    return info
+
+
+def channel_spec(column):
+    """(nombre, nombre corto, unidad, factor, decimales) MoTeC de una columna."""
+    if column in MOTEC_CHANNELS: return MOTEC_CHANNELS[column]
+    name, unit = _csv_channel_info().get(column, (column, ''))
+    return name, column, unit, 1.0, 0
+
+
+def _ascii(text, size):
+    return str(text or '').encode('ascii', 'replace')[:size]
+
+
+def _session_datetime(metadata):
+    try: return datetime.datetime.fromisoformat(str(metadata.get('Date', '')).strip())
+    except ValueError: return datetime.datetime.now()
+
+
+def _ffill_columns(matrix):
+    """Rellena NaN con el último valor válido de cada columna (NaN iniciales -> 0), vectorizado."""
+    missing = np.isnan(matrix)
+    if not missing.any(): return matrix
+    idx = np.where(missing, 0, np.arange(len(matrix))[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    filled = matrix[idx, np.arange(matrix.shape[1])]
+    filled[np.isnan(filled)] = 0.0
+    return filled
+
+
+def _uniform_frame(df, rate_hz=None):
+    """(df a frecuencia fija ordenado por Time, frecuencia entera en Hz); remuestrea solo si hace falta."""
+    report = analyze_sampling(df)
+    if not report['rate_hz']: raise ValueError("No se puede detectar la frecuencia de muestreo (Time vacío o constante).")
+    target = int(round(rate_hz or report['rate_hz']))
+    irregular = report['duplicates'] or report['backwards'] or report['gaps'] or report['jitter_pct'] > MAX_JITTER_PCT
+    if irregular or abs(report['rate_hz'] - target) > 1e-3 * target:
+        print(f"Remuestreando a {target} Hz para MoTeC (muestreo original {report['rate_hz']:.2f} Hz, jitter {report['jitter_pct']:.1f}%)...")
+        df, _ = resample_uniform(df, target, report=report)
+        return df, target
+    return df.sort_values('Time', kind='stable').reset_index(drop=True), target
+
+
+def _channel_blocks(df):
+    """
+    Agrupa las columnas exportables por tipo de dato.
+
+    Returns:
+        list: [(np.dtype, [columnas], matriz muestras x canales en ese dtype)]
+    """
+    floats, ints, scaled = [], [], []
+    for col in df.columns:
+        if col in EXCLUDED_COLUMNS: continue
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series) or isinstance(series.dtype, pd.BooleanDtype) or pd.api.types.is_integer_dtype(series): ints.append(col)
+        elif pd.api.types.is_float_dtype(series): (scaled if channel_spec(col)[4] else floats).append(col)
+    blocks = []
+    if floats:
+        factors = np.array([channel_spec(c)[3] for c in floats])
+        matrix = _ffill_columns(df[floats].to_numpy(dtype=float, na_value=np.nan)) * factors
+        blocks.append((np.dtype('<f4'), floats, matrix.astype('<f4')))
+    if ints:
+        matrix = df[ints].astype('float64').to_numpy(dtype=float, na_value=np.nan)
+        matrix = _ffill_columns(matrix)
+        dtype = np.dtype('<i2') if np.abs(matrix).max(initial=0) < 2 ** 15 else np.dtype('<i4')
+        blocks.append((dtype, ints, matrix.astype(dtype)))
+    if scaled: # Decimales fijos en int32 (GPS)
+        decimals = np.array([channel_spec(c)[4] for c in scaled])
+        matrix = _ffill_columns(df[scaled].to_numpy(dtype=float, na_value=np.nan))
+        blocks.append((np.dtype('<i4'), scaled, np.rint(matrix * 10.0 ** decimals).astype('<i4')))
+    return blocks
+
+
+def _lap_marker_times(df, laps_info_df=None):
+    """Inicio de cada vuelta (s desde el inicio del registro), sin la primera."""
+    t0 = float(df['Time'].iloc[0])
+    if laps_info_df is not None and not laps_info_df.empty:
+        starts = laps_info_df['StartTime'].to_numpy(dtype=float) - t0
+    else:
+        laps = df['Lap'].to_numpy()
+        starts = df['Time'].to_numpy(dtype=float)[np.flatnonzero(laps[1:] != laps[:-1]) + 1] - t0
+    return sorted(float(s) for s in starts if s > 0)
+
+
+def _format_lap_time(seconds):
+    return f"{int(seconds // 60)}:{seconds % 60:06.3f}"
+
+
+def write_ldx(ldx_path, marker_times, laps_info_df=None):
+    """Escribe el .ldx con una baliza por cambio de vuelta y los detalles de vuelta rápida."""
+    root = ET.Element('LDXFile', Locale='English_United Kingdom.1252', DefaultLocale='C', Version='1.6')
+    layer = ET.SubElement(ET.SubElement(root, 'Layers'), 'Layer')
+    group = ET.SubElement(ET.SubElement(layer, 'MarkerBlock'), 'MarkerGroup', Name='Beacons', Index='3')
+    for k, t in enumerate(marker_times, 1):
+        ET.SubElement(group, 'Marker', Version='100', ClassName='BCN', Name=f'Manual.{k}', Flags='77', Time=f"{t * 1e6:.3f}")
+    ET.SubElement(layer, 'RangeBlock')
+    details = ET.SubElement(root.find('Layers'), 'Details')
+    ET.SubElement(details, 'String', Id='Total Laps', Value=str(len(marker_times) + 1))
+    if laps_info_df is not None and not laps_info_df.empty:
+        valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+        if not valid.empty:
+            best = valid.loc[valid['LapTime'].idxmin()]
+            ET.SubElement(details, 'String', Id='Fastest Time', Value=_format_lap_time(float(best['LapTime'])))
+            ET.SubElement(details, 'String', Id='Fastest Lap', Value=str(int(best['Lap'])))
+    tree = ET.ElementTree(root); ET.indent(tree, space=' ')
+    tree.write(ldx_path, encoding='utf-8', xml_declaration=True)
+
+
+@profiled("export_motec")
+def export_motec(df, metadata, ld_path, laps_info_df=None, rate_hz=None):
+    """
+    Escribe df (salida de load_telemetry_csv) como `ld_path` (.ld) y su .ldx de marcadores.
+
+    Args:
+        metadata (dict): Metadatos del encabezado CSV (Driver, Vehicle, Track, Date, Session).
+        laps_info_df (pandas.DataFrame, opcional): Tabla de calculate_laps_improved (marcadores y vuelta rápida).
+        rate_hz (float, opcional): Frecuencia de exportación; None = detectada (entera).
+
+    Returns:
+        dict: ld_path, ldx_path, channels, samples, rate_hz, laps, bytes.
+    """
+    df, rate = _uniform_frame(df, rate_hz)
+    n = len(df); blocks = _channel_blocks(df)
+    columns = [col for _, cols, _ in blocks for col in cols]
+    head_size, event_size = struct.calcsize(LD_HEAD_FMT), struct.calcsize(LD_EVENT_FMT)
+    venue_size, vehicle_size, chan_size = struct.calcsize(LD_VENUE_FMT), struct.calcsize(LD_VEHICLE_FMT), struct.calcsize(LD_CHAN_FMT)
+    event_ptr = head_size; venue_ptr = event_ptr + event_size; vehicle_ptr = venue_ptr + venue_size
+    meta_ptr = vehicle_ptr + vehicle_size; data_ptr = meta_ptr + chan_size * len(columns)
+
+    metas, offset = [], data_ptr
+    for dtype, cols, _ in blocks:
+        type_a, size = LD_DTYPES[np.dtype(dtype).str]
+        for col in cols:
+            name, short, unit, _, decimals = channel_spec(col)
+            metas.append((offset, type_a, size, name, short, unit, decimals)); offset += n * size
+    when = _session_datetime(metadata)
+    with open(ld_path, 'wb') as f:
+        f.write(struct.pack(LD_HEAD_FMT, LD_MARKER, meta_ptr if columns else 0, data_ptr if columns else 0, event_ptr, 1, 0x4240, 0xf,
+                            LD_DEVICE[3], LD_DEVICE[0], LD_DEVICE[1], LD_DEVICE[2], len(columns),
+                            _ascii(when.strftime('%d/%m/%Y'), 16), _ascii(when.strftime('%H:%M:%S'), 16),
+                            _ascii(metadata.get('Driver'), 64), _ascii(metadata.get('Vehicle'), 64), _ascii(metadata.get('Track'), 64),
+                            LD_PRO_LOGGING, _ascii(f"Rennsport {os.path.basename(ld_path)}", 64)))
+        f.write(struct.pack(LD_EVENT_FMT, _ascii('Rennsport', 64), _ascii(metadata.get('Session'), 64),
+                            _ascii(f"Exportado por RennsportTelemetryTool ({n} muestras a {rate} Hz)", 1024), venue_ptr))
+        f.write(struct.pack(LD_VENUE_FMT, _ascii(metadata.get('Track'), 64), vehicle_ptr))
+        f.write(struct.pack(LD_VEHICLE_FMT, _ascii(metadata.get('Vehicle'), 64), 0, _ascii('Car', 32), b''))
+        for k, (ptr, type_a, size, name, short, unit, decimals) in enumerate(metas):
+            prev_ptr = meta_ptr + (k - 1) * chan_size if k else 0
+            next_ptr = meta_ptr + (k + 1) * chan_size if k + 1 < len(metas) else 0
+            f.write(struct.pack(LD_CHAN_FMT, prev_ptr, next_ptr, ptr, n, LD_CHANNEL_ID + k, type_a, size, rate,
+                                0, 1, 1, decimals, _ascii(name, 32), _ascii(short, 8), _ascii(unit, 12)))
+        for _, _, matrix in blocks: f.write(np.ascontiguousarray(matrix.T).tobytes()) # Canal tras canal, un bloque por tipo
+
+    markers = _lap_marker_times(df, laps_info_df)
+    ldx_path = os.path.splitext(ld_path)[0] + '.ldx'
+    write_ldx(ldx_path, markers, laps_info_df)
+    return {'ld_path': ld_path, 'ldx_path': ldx_path, 'channels': len(columns), 'samples': n, 'rate_hz': rate,
+            'laps': len(markers) + 1, 'bytes': os.path.getsize(ld_path)}
+
+
+def read_ld(ld_path, with_data=True):
+    """
+    Lee un .ld (para comprobar exportaciones).
+
+    Returns:
+        tuple: (dict cabecera: driver, vehicle, venue, date, time, session; dict {nombre: {'unit', 'rate_hz', 'samples', 'data'}})
+    """
+    def text(raw): return raw.split(b'\x00', 1)[0].decode('ascii', 'replace').strip()
+    with open(ld_path, 'rb') as f: raw = f.read()
+    head = struct.unpack_from(LD_HEAD_FMT, raw, 0)
+    if head[0] != LD_MARKER: raise ValueError(f"'{ld_path}' no es un archivo .ld válido.")
+    meta_ptr, event_ptr = head[1], head[3]
+    header = {'date': text(head[12]), 'time': text(head[13]), 'driver': text(head[14]), 'vehicle': text(head[15]), 'venue': text(head[16])}
+    if event_ptr: header['session'] = text(struct.unpack_from(LD_EVENT_FMT, raw, event_ptr)[1])
+    types = {(type_a, size): dtype for dtype, (type_a, size) in LD_DTYPES.items()}
+    channels, ptr = {}, meta_ptr
+    while ptr:
+        (_, next_ptr, data_ptr, n, _, type_a, size, rate, shift, mul, scale, decimals,
+         name, _, unit) = struct.unpack_from(LD_CHAN_FMT, raw, ptr)
+        entry = {'unit': text(unit), 'rate_hz': rate, 'samples': n}
+        if with_data:
+            values = np.frombuffer(raw, dtype=types[(type_a, size)], count=n, offset=data_ptr)
+            entry['data'] = (values / scale * 10.0 ** -decimals + shift) * mul
+        channels[text(name)] = entry; ptr = next_ptr
+    return header, channels
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exportación a MoTeC i2 (.ld/.ldx).")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_exp = sub.add_parser("export", help="Convierte un Telemetry.csv en .ld + .ldx")
+    p_exp.add_argument("csv"); p_exp.add_argument("ld_path", nargs="?", default=None, help="Destino (defecto: junto al CSV)")
+    p_exp.add_argument("--rate", type=float, default=None, help="Frecuencia de exportación en Hz (defecto: detectada)")
+    p_info = sub.add_parser("info", help="Muestra cabecera y canales de un .ld")
+    p_info.add_argument("ld_path")
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        from data_loader import load_telemetry_csv
+        from main import calculate_laps_improved, estimate_min_lap_time
+        df, metadata = load_telemetry_csv(args.csv)
+        if df is None: return 1
+        laps_info_df = calculate_laps_improved(df, estimate_min_lap_time(metadata))
+        ld_path = args.ld_path or re.sub(r'\.csv(\.\w+)?$', '', args.csv, flags=re.IGNORECASE) + '.ld'
+        summary = export_motec(df, metadata, ld_path, laps_info_df, rate_hz=args.rate)
+        print(f"MoTeC: {summary['ld_path']} ({summary['bytes'] / 1e6:.1f} MB, {summary['channels']} canales, "
+              f"{summary['samples']} muestras a {summary['rate_hz']} Hz) + {summary['ldx_path']} ({summary['laps']} vueltas)")
+    else:
+        header, channels = read_ld(args.ld_path, with_data=False)
+        print(f"{args.ld_path}: {header['driver']} | {header['vehicle']} @ {header['venue']} | {header['date']} {header['time']}")
+        for name, info in channels.items(): print(f"  {name:<32} {info['unit']:<8} {info['rate_hz']:>4} Hz  {info['samples']} muestras")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
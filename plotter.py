@@ -1,17 +1,61 @@
 # plotter.py (vFinal Definitiva - Corrección Indentación + Ticks Marcha)
 
-import matplotlib.pyplot as plt
-import matplotlib.ticker as mticker # Para formatear ejes Y
-import pandas as pd
-import numpy as np
+import functools
 import re
+import threading
 import traceback # Para mejor detalle en errores de plot
 
+from lazy_imports import lazy_import
+from profiling import profiled
+
+# Import diferido: matplotlib/pandas/numpy solo se cargan al generar el primer gráfico
+plt = lazy_import('matplotlib.pyplot')
+mticker = lazy_import('matplotlib.ticker') # Para formatear ejes Y
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
 GRAVITY = 9.80665 # Aceleración estándar de la gravedad en m/s^2
+SAVE_DPI = 110 # Resolución al guardar gráficos en archivo (modo batch)
+
+
+_pending_show = threading.local() # plt.show() aplazado hasta cerrar el span del gráfico
+
+
+def _show(closed_msg="Cerrado."):
+    """plt.show(); dentro de un gráfico perfilado se aplaza hasta que su span termina (la ventana abierta no cuenta)."""
+    if getattr(_pending_show, 'depth', 0): _pending_show.message = closed_msg; return
+    try: plt.show()
+    except Exception as e_show: print(f"Error mostrando gráfico: {e_show}")
+    print(closed_msg)
+
+
+def profiled_plot(name):
+    """profiled(name) para funciones de gráfico: el plt.show() bloqueante se ejecuta fuera del span."""
+    def decorator(func):
+        timed = profiled(name)(func)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _pending_show.depth = getattr(_pending_show, 'depth', 0) + 1
+            try: return timed(*args, **kwargs)
+            finally:
+                _pending_show.depth -= 1
+                message = getattr(_pending_show, 'message', None)
+                if _pending_show.depth == 0 and message is not None: _pending_show.message = None; _show(message)
+        return wrapper
+    return decorator
+
+
+def _show_or_save(fig, save_path=None):
+    """Muestra la figura (modo interactivo) o la guarda en `save_path` y la cierra (modo batch)."""
+    if save_path:
+        fig.savefig(save_path, dpi=SAVE_DPI); plt.close(fig); print(f"Guardado: {save_path}")
+    else:
+        print("Mostrando..."); _show()
 
 # --- Funciones de Ploteo Individuales (Con corrección de indentación y mejoras menores) ---
 
-def plot_lap_speed_profile(df_lap, metadata, lap_number):
+@profiled_plot("plot_lap_speed_profile")
+def plot_lap_speed_profile(df_lap, metadata, lap_number, save_path=None):
     """Genera un gráfico de Velocidad vs Distancia para una vuelta específica."""
     dist_col, speed_col, time_col = 'LapDist', 'Speed', 'Time'
     required_cols = [time_col, speed_col, dist_col]
@@ -54,13 +98,14 @@ def plot_lap_speed_profile(df_lap, metadata, lap_number):
         plt.title(title, fontsize=14); plt.xlabel('Distancia (m)'); plt.ylabel('Velocidad (Kmh)')
         if track_length_m and track_length_m > 0: plt.xlim(0, track_length_m)
         elif not plot_data.empty: plt.xlim(plot_data[dist_col].min(), plot_data[dist_col].max()) # Usar min/max de datos si no hay longitud
-        plt.legend(); plt.grid(True, linestyle=':', alpha=0.7); print("Mostrando..."); plt.show(); print("Cerrado.")
+        plt.legend(); plt.grid(True, linestyle=':', alpha=0.7); _show_or_save(plt.gcf(), save_path)
     except Exception as e:
         print(f"Error FATAL al generar plot_lap_speed_profile V{lap_number}: {e}")
         traceback.print_exc()
 
 
-def plot_lap_inputs(df_lap, metadata, lap_number):
+@profiled_plot("plot_lap_inputs")
+def plot_lap_inputs(df_lap, metadata, lap_number, save_path=None):
     """Genera gráficos de Entradas vs Distancia para una vuelta específica."""
     dist_col, throttle_col, brake_col, steer_col, time_col = 'LapDist', 'Throttle', 'Brake', 'Steer', 'Time'
     required_cols = [time_col, dist_col, throttle_col, brake_col, steer_col]
@@ -108,13 +153,14 @@ def plot_lap_inputs(df_lap, metadata, lap_number):
         if track_length_m and track_length_m > 0: axs[1].set_xlim(0, track_length_m)
         elif not df_lap[dist_col].dropna().empty: axs[1].set_xlim(df_lap[dist_col].min(), df_lap[dist_col].max())
 
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95]); print("Mostrando..."); plt.show(); print("Cerrado.")
+        plt.tight_layout(rect=[0, 0.03, 1, 0.95]); _show_or_save(fig, save_path)
     except Exception as e:
         print(f"Error FATAL al generar plot_lap_inputs V{lap_number}: {e}")
         traceback.print_exc()
 
 
-def plot_lap_engine(df_lap, metadata, lap_number):
+@profiled_plot("plot_lap_engine")
+def plot_lap_engine(df_lap, metadata, lap_number, save_path=None):
     """Genera gráficos de RPM y Marcha vs Distancia para una vuelta específica."""
     dist_col, rpm_col, gear_col, time_col = 'LapDist', 'RPM', 'Gear', 'Time'
     required_cols = [time_col, dist_col, rpm_col, gear_col]
@@ -175,15 +221,20 @@ def plot_lap_engine(df_lap, metadata, lap_number):
         if track_length_m and track_length_m > 0: ax1.set_xlim(0, track_length_m)
         elif not df_lap[dist_col].dropna().empty: ax1.set_xlim(df_lap[dist_col].min(), df_lap[dist_col].max())
 
-        fig.tight_layout(); print("Mostrando..."); plt.show(); print("Cerrado.")
+        fig.tight_layout(); _show_or_save(fig, save_path)
     except Exception as e:
         print(f"Error FATAL al generar plot_lap_engine V{lap_number}: {e}")
         traceback.print_exc()
 
 
 # --- DASHBOARD COMPARATIVO (CON CORRECCIÓN TICKS MARCHA Y MEJORAS) ---
-def plot_comparison_dashboard(df_telemetry, metadata, lap_number, reference_lap_number, laps_info_df=None): # Aceptar laps_info_df opcional pero NO USARLO INTERNAMENTE
-    """Genera dashboard comparativo con 5 subplots: Vel, Thr, Brk, RPM, Gear."""
+@profiled_plot("plot_comparison_dashboard")
+def plot_comparison_dashboard(df_telemetry, metadata, lap_number, reference_lap_number, laps_info_df=None, save_path=None, alignment='distance', envelope=None): # Aceptar laps_info_df opcional pero NO USARLO INTERNAMENTE
+    """
+    Genera dashboard comparativo con 5 subplots: Vel, Thr, Brk, RPM, Gear.
+    alignment='position': la distancia de la vuelta se re-calcula por posición GPS sobre la trazada de referencia.
+    envelope: resultado de reference_envelope.compute_reference_envelope (banda de todas las vueltas válidas), opcional.
+    """
     # --- Definición Columnas ---
     dist_col, time_col, lap_col = 'LapDist', 'Time', 'Lap'
     speed_col, throttle_col, brake_col = 'Speed', 'Throttle', 'Brake'
@@ -199,22 +250,148 @@ def plot_comparison_dashboard(df_telemetry, metadata, lap_number, reference_lap_
     lap_data_full = df_telemetry[df_telemetry[lap_col] == lap_number].copy()
     ref_lap_data_full = df_telemetry[df_telemetry[lap_col] == reference_lap_number].copy()
     if lap_data_full.empty or ref_lap_data_full.empty: print(f"Error: Datos insuficientes V{lap_number} o VRef{reference_lap_number}."); return
-
+    if alignment == 'position':
+        from spatial_index import position_aligned_distance
+        try:
+            lap_data_full[dist_col] = position_aligned_distance(ref_lap_data_full, lap_data_full, lap_col=lap_col, dist_col=dist_col)
+            lap_data_full = lap_data_full.sort_values(dist_col, kind='stable'); print("Alineación por posición GPS aplicada.")
+        except (KeyError, ValueError) as e_align: print(f"Adv: Alineación por posición no disponible ({e_align}); se usa LapDist.")
+
+    plot_dashboard_frames(lap_data_full, ref_lap_data_full, metadata, f'V{lap_number}', f'V{reference_lap_number}', save_path=save_path, envelope=envelope)
+
+
+# --- Cursor Sincronizado del Dashboard (blitting + búsqueda binaria) ---
+class DashboardCrosshair:
+    """
+    Línea vertical común a todos los subplots del dashboard con los valores de ambas vueltas y el
+    delta en la distancia del ratón. Cada vuelta se ordena una vez por distancia y sus canales se
+    guardan en una matriz (muestras x canales): cada movimiento es un np.searchsorted por vuelta
+    y un gather de una fila (interpolada; escalonados con el último valor). El redibujado usa
+    blitting: solo se repintan las líneas y textos animados sobre el fondo guardado.
+    """
+
+    def __init__(self, fig, panels, lap_data, ref_data, lap_label, ref_label, dist_col='LapDist', envelope=None):
+        """
+        Args:
+            panels (list): [(ax, columna, unidad, escalonado)] en el orden de los subplots.
+            envelope (dict, opcional): reference_envelope; añade la banda extrema de cada canal a la lectura.
+        """
+        self.fig = fig; self.canvas = fig.canvas; self.panels = panels
+        self.labels = (lap_label, f'Ref {ref_label}')
+        self.indexes = [self._build_index(data, dist_col) for data in (lap_data, ref_data)]
+        self.envelope = envelope
+        self.step_mask = np.array([use_step for _, _, _, use_step in panels], dtype=bool)
+        self.axes = [ax for ax, _, _, _ in panels]
+        self.lines = [ax.axvline(np.nan, color='black', linewidth=0.8, alpha=0.7, animated=True) for ax in self.axes]
+        self.texts = [ax.text(0.005, 0.97, '', transform=ax.transAxes, ha='left', va='top', fontsize=9, family='monospace', animated=True,
+                              bbox={'boxstyle': 'round', 'facecolor': 'white', 'alpha': 0.85, 'edgecolor': '0.7'}) for ax in self.axes]
+        for artist in self.lines + self.texts: artist.set_visible(False)
+        self.background = None
+        self._cids = [self.canvas.mpl_connect('draw_event', self._on_draw), self.canvas.mpl_connect('motion_notify_event', self._on_move),
+                      self.canvas.mpl_connect('axes_leave_event', self._on_leave)]
+
+    def _build_index(self, data, dist_col):
+        """(distancias ordenadas, matriz de canales en ese orden) de una vuelta."""
+        columns = [col for _, col, _, _ in self.panels]
+        frame = data.loc[data[dist_col].notna(), [dist_col] + [c for c in columns if c in data.columns]]
+        order = np.argsort(frame[dist_col].to_numpy(dtype=float), kind='stable')
+        dist = frame[dist_col].to_numpy(dtype=float)[order]
+        values = np.full((len(dist), len(columns)), np.nan)
+        for k, col in enumerate(columns):
+            if col in frame.columns: values[:, k] = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=float)[order]
+        return dist, values
+
+    def values_at(self, distance):
+        """Valores de cada canal en `distance` para (vuelta, referencia): dos arrays (n_paneles,), NaN fuera de la vuelta."""
+        out = []
+        for dist, values in self.indexes:
+            if len(dist) < 2 or not dist[0] <= distance <= dist[-1]: out.append(np.full(len(self.panels), np.nan)); continue
+            right = min(max(int(np.searchsorted(dist, distance, side='right')), 1), len(dist) - 1); left = right - 1
+            span = dist[right] - dist[left]
+            weight = (distance - dist[left]) / span if span > 0 else 0.0
+            row = values[left] * (1.0 - weight) + values[right] * weight
+            out.append(np.where(self.step_mask, values[left] if weight < 1.0 else values[right], row))
+        return out[0], out[1]
+
+    def readout(self, distance):
+        """Texto por panel: 'V5: 212.3  Ref V3: 215.0  Δ -2.7 Kmh'."""
+        lap_values, ref_values = self.values_at(distance)
+        def fmt(v, unit): return '-' if not np.isfinite(v) else (f"{v:,.0f}" if unit == 'RPM' else f"{v:.0f}" if unit == 'Marcha' else f"{v:.2f}" if unit == '0-1' else f"{v:.1f}")
+        lines = []
+        for k, (_, _, unit, _) in enumerate(self.panels):
+            delta = lap_values[k] - ref_values[k]
+            delta_txt = f"{'+' if delta >= 0 else ''}{fmt(delta, unit)}" if np.isfinite(delta) else '-'
+            lines.append(f"{self.labels[0]}: {fmt(lap_values[k], unit)}  {self.labels[1]}: {fmt(ref_values[k], unit)}  Δ {delta_txt} {unit}")
+        if self.envelope: # Banda de todas las vueltas válidas en el punto de rejilla más cercano
+            grid, pcts = self.envelope['grid'], self.envelope['percentiles']
+            g = min(max(int(np.searchsorted(grid, distance)), 0), len(grid) - 1)
+            for k, (_, col, unit, _) in enumerate(self.panels):
+                if col not in self.envelope['channels']: continue
+                band = self.envelope['bands'][col]
+                lines[k] += f"  [p{pcts[0]}-p{pcts[-1]} {fmt(band[pcts[0]][g], unit)}-{fmt(band[pcts[-1]][g], unit)}]"
+        lines[0] = f"{distance:.0f} m | " + lines[0]
+        return lines
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in (a for a in self.lines + self.texts if a.get_visible()): self.fig.draw_artist(artist)
+
+    def _blit(self):
+        if self.background is None: return
+        self.canvas.restore_region(self.background)
+        for artist in self.lines + self.texts: self.fig.draw_artist(artist)
+        self.canvas.blit(self.fig.bbox)
+
+    def _on_move(self, event):
+        if event.inaxes not in self.axes or event.xdata is None: return
+        for line, text, label in zip(self.lines, self.texts, self.readout(event.xdata)):
+            line.set_xdata([event.xdata, event.xdata]); line.set_visible(True); text.set_text(label); text.set_visible(True)
+        self._blit()
+
+    def _on_leave(self, event):
+        for artist in self.lines + self.texts: artist.set_visible(False)
+        self._blit()
+
+    def disconnect(self):
+        for cid in self._cids: self.canvas.mpl_disconnect(cid)
+
+
+@profiled_plot("plot_dashboard_frames")
+def plot_dashboard_frames(lap_data_full, ref_lap_data_full, metadata, lap_label, ref_label, title=None, save_path=None, envelope=None):
+    """
+    Dibuja el dashboard comparativo (Vel, Thr, Brk, RPM, Gear vs LapDist) a partir de dos DataFrames de una vuelta.
+    Las vueltas pueden venir de la misma sesión o de archivos distintos (ver cross_session).
+    Con `envelope` (reference_envelope) los canales con banda muestran p10-p90 y la mediana de todas las
+    vueltas válidas, y Velocidad además la vuelta "mejor de todas".
+    """
+    dist_col = 'LapDist'
+    speed_col, throttle_col, brake_col = 'Speed', 'Throttle', 'Brake'
+    rpm_col, gear_col = 'RPM', 'Gear'
     # --- Creación Figura y Ejes ---
     fig, axs = plt.subplots(5, 1, figsize=(16, 15), sharex=True, gridspec_kw={'hspace': 0.1})
     vehicle_info = metadata.get("Vehicle","Vehículo"); track_info = metadata.get("Track","Pista")
-    fig.suptitle(f'Comparativa: V{lap_number} vs Ref V{reference_lap_number}\n{vehicle_info} @ {track_info}', fontsize=16)
+    fig.suptitle(title or f'Comparativa: {lap_label} vs Ref {ref_label}\n{vehicle_info} @ {track_info}', fontsize=16)
     lap_color = 'blue'; ref_color = 'orange'; lap_style = '-'; ref_style = '--'; lap_lw = 1.5; ref_lw = 1.2
 
+    # --- Banda de Referencia (envolvente de todas las vueltas válidas) ---
+    def plot_envelope(ax, col):
+        if not envelope or col not in envelope['channels']: return
+        grid, bands, pcts = envelope['grid'], envelope['bands'][col], envelope['percentiles']
+        ax.fill_between(grid, bands[pcts[0]], bands[pcts[-1]], color='0.55', alpha=0.25, linewidth=0,
+                        label=f"p{pcts[0]}-p{pcts[-1]} ({len(envelope['laps'])} vueltas)")
+        if len(pcts) > 2: ax.plot(grid, bands[pcts[len(pcts) // 2]], color='0.45', linestyle=':', linewidth=0.9, label=f"p{pcts[len(pcts) // 2]}")
+        if col == 'Speed': ax.plot(grid, envelope['best_of'][col], color='green', linewidth=0.9, alpha=0.8, label='Mejor de todas')
+
     # --- Función Auxiliar Plot ---
     def plot_subplot(ax, data_lap, data_ref, col, title, ylabel, ylim=None, use_step=False, format_y_thousands=False):
         ax.set_title(title, loc='left', fontsize=10)
+        plot_envelope(ax, col)
         plot_data_lap = data_lap.dropna(subset=[dist_col, col])
         plot_data_ref = data_ref.dropna(subset=[dist_col, col])
 
         if not plot_data_lap.empty and not plot_data_ref.empty:
-            plot_args_lap = {'label': f'V{lap_number}', 'color': lap_color, 'linestyle': lap_style, 'linewidth': lap_lw}
-            plot_args_ref = {'label': f'Ref V{reference_lap_number}', 'color': ref_color, 'linestyle': ref_style, 'linewidth': ref_lw}
+            plot_args_lap = {'label': lap_label, 'color': lap_color, 'linestyle': lap_style, 'linewidth': lap_lw}
+            plot_args_ref = {'label': f'Ref {ref_label}', 'color': ref_color, 'linestyle': ref_style, 'linewidth': ref_lw}
             plot_func = ax.step if use_step else ax.plot
             if use_step: plot_args_lap['where'] = 'post'; plot_args_ref['where'] = 'post'
 
@@ -284,10 +461,319 @@ def plot_comparison_dashboard(df_telemetry, metadata, lap_number, reference_lap_
 
     # --- Mostrar Figura ---
     plt.tight_layout(rect=[0, 0.03, 1, 0.96])
-    print("Mostrando dashboard comparativo...")
-    try: plt.show()
-    except Exception as e_show: print(f"Error mostrando gráfico: {e_show}")
-    print("Dashboard cerrado.")
+    if save_path:
+        _show_or_save(fig, save_path); return
+    panels = [(axs[0], speed_col, 'Kmh', False), (axs[1], throttle_col, '0-1', False), (axs[2], brake_col, '0-1', False),
+              (axs[3], rpm_col, 'RPM', False), (axs[4], gear_col, 'Marcha', True)]
+    fig._crosshair = DashboardCrosshair(fig, panels, lap_data_full, ref_lap_data_full, lap_label, ref_label, dist_col=dist_col, envelope=envelope) # mpl_connect guarda referencias débiles
+    print("Mostrando dashboard comparativo (mueve el ratón para ver valores y delta)...")
+    _show("Dashboard cerrado.")
+
+
+# --- Comparativa de un Solo Canal (imágenes para el análisis VLM en modo batch) ---
+# Tipo de gráfico IA -> (columna, título, unidad, ylim, escalonado)
+CHANNEL_COMPARISON_SPECS = {
+    "Speed": ('Speed', 'Velocidad', 'Kmh', None, False),
+    "Throttle": ('Throttle', 'Acelerador', '0-1', (-0.05, 1.05), False),
+    "Brake": ('Brake', 'Freno', '0-1', (-0.05, 1.05), False),
+    "Gear": ('Gear', 'Marcha', 'Marcha', None, True),
+    "Steering": ('Steer', 'Volante', 'deg', None, False),
+    "RPM": ('RPM', 'RPM', 'RPM', None, False),
+}
+
+
+def get_track_length_m(metadata):
+    """Longitud de pista (m) desde 'Track' ('... (4574 m)') o 'Track Length M'; None si no hay."""
+    try:
+        match = re.search(r'\(([\d.]+)\s*m\)', str(metadata.get('Track', '')))
+        if match: return float(match.group(1))
+        if metadata.get('Track Length M') is not None: return float(str(metadata['Track Length M']).split(' ')[0])
+    except (ValueError, TypeError): pass
+    return None
+
+
+@profiled_plot("plot_channel_comparison")
+def plot_channel_comparison(df_telemetry, metadata, lap_number, reference_lap_number, graph_type, save_path=None):
+    """Genera un gráfico de un canal (Speed, Throttle, Brake, Gear, Steering, RPM): vuelta en AZUL vs referencia."""
+    if graph_type not in CHANNEL_COMPARISON_SPECS: print(f"Error: Tipo de gráfico no soportado: {graph_type}"); return
+    col, title, unit, ylim, use_step = CHANNEL_COMPARISON_SPECS[graph_type]
+    dist_col, lap_col = 'LapDist', 'Lap'
+    missing = [c for c in [lap_col, dist_col, col] if c not in df_telemetry.columns]
+    if missing: print(f"Error plot_channel_comparison {graph_type}: Faltan columnas: {missing}"); return
+
+    lap_data = df_telemetry.loc[df_telemetry[lap_col] == lap_number, [dist_col, col]].dropna()
+    ref_data = df_telemetry.loc[df_telemetry[lap_col] == reference_lap_number, [dist_col, col]].dropna()
+    if lap_data.empty or ref_data.empty: print(f"Error: Datos insuficientes {graph_type} V{lap_number}/V{reference_lap_number}."); return
+
+    print(f"\n--- Generando gráfico {graph_type.upper()} V{lap_number} vs Ref V{reference_lap_number} ---")
+    try:
+        fig, ax = plt.subplots(figsize=(16, 6))
+        plot_func = ax.step if use_step else ax.plot
+        extra = {'where': 'post'} if use_step else {}
+        plot_func(lap_data[dist_col], lap_data[col], label=f'V{lap_number}', color='blue', linewidth=1.5, **extra)
+        plot_func(ref_data[dist_col], ref_data[col], label=f'Ref V{reference_lap_number}', color='orange', linestyle='--', linewidth=1.2, **extra)
+        ax.set_title(f'{title}: V{lap_number} (azul) vs Ref V{reference_lap_number}\n{metadata.get("Vehicle", "Vehículo")} @ {metadata.get("Track", "Pista")}', fontsize=13)
+        ax.set_xlabel('Distancia en Vuelta (m)'); ax.set_ylabel(unit)
+        if ylim: ax.set_ylim(ylim)
+        track_length_m = get_track_length_m(metadata)
+        if track_length_m and track_length_m > 0: ax.set_xlim(0, track_length_m)
+        ax.legend(loc='upper right'); ax.grid(True, linestyle=':', alpha=0.7)
+        fig.tight_layout(); _show_or_save(fig, save_path)
+    except Exception as e:
+        print(f"Error FATAL al generar plot_channel_comparison {graph_type}: {e}")
+        traceback.print_exc()
+
+
+# --- Superposición de N Vueltas (consistencia de un stint) ---
+OVERLAY_PANELS = {
+    "Speed": ('Velocidad', 'Kmh', None),
+    "Throttle": ('Acelerador', '0-1', (-0.05, 1.05)),
+    "Brake": ('Freno', '0-1', (-0.05, 1.05)),
+    "Gear": ('Marcha', 'Marcha', None),
+    "Steer": ('Volante', 'deg', None),
+    "RPM": ('RPM', 'RPM', None),
+}
+
+
+@profiled_plot("plot_lap_overlay")
+def plot_lap_overlay(grid, aligned, labels, lap_times, metadata, title=None, save_path=None):
+    """
+    Dibuja N vueltas ya alineadas (lap_alignment) coloreadas por tiempo de vuelta; la más rápida en negro grueso.
+
+    Args:
+        grid (np.ndarray): Rejilla de distancia.
+        aligned (dict): {canal: np.ndarray (n_laps, n_grid)}.
+        labels (list): Etiqueta de cada vuelta (fila).
+        lap_times (list): Tiempo (s) de cada vuelta, para la escala de color.
+    """
+    from matplotlib.collections import LineCollection
+    channels = [c for c in OVERLAY_PANELS if c in aligned]
+    lap_times = np.asarray(lap_times, dtype=float)
+    if not channels or len(labels) < 2: print("Error: Se necesitan al menos 2 vueltas y un canal para la superposición."); return
+    fastest = int(np.nanargmin(lap_times)) if np.isfinite(lap_times).any() else 0
+    print(f"\n--- Generando SUPERPOSICIÓN de {len(labels)} vueltas (más rápida: {labels[fastest]}) ---")
+    try:
+        fig, axs = plt.subplots(len(channels), 1, figsize=(16, 3 * len(channels) + 1), sharex=True, squeeze=False)
+        axs = axs[:, 0]
+        norm = plt.Normalize(np.nanmin(lap_times), max(np.nanmax(lap_times), np.nanmin(lap_times) + 1e-3))
+        others = np.arange(len(labels)) != fastest
+        for ax, channel in zip(axs, channels):
+            panel_title, unit, ylim = OVERLAY_PANELS[channel]
+            values = aligned[channel]
+            # Una sola LineCollection por panel: (n_laps, n_grid, 2)
+            segments = np.stack([np.broadcast_to(grid, values.shape), values], axis=-1)[others]
+            lines = LineCollection(segments, cmap='viridis', norm=norm, linewidths=0.8, alpha=0.75)
+            lines.set_array(lap_times[others]); ax.add_collection(lines)
+            ax.plot(grid, values[fastest], color='black', linewidth=2.0, label=f'{labels[fastest]} (más rápida)')
+            ax.set_title(panel_title, loc='left', fontsize=10); ax.set_ylabel(unit, fontsize=9)
+            if ylim: ax.set_ylim(ylim)
+            else: ax.autoscale_view()
+            ax.grid(True, linestyle=':', alpha=0.7); ax.legend(loc='upper right', fontsize=9)
+        track_length_m = get_track_length_m(metadata)
+        axs[-1].set_xlim(0, track_length_m if track_length_m and track_length_m > 0 else float(grid[-1]))
+        axs[-1].set_xlabel('Distancia en Vuelta (m)', fontsize=10)
+        sm = plt.cm.ScalarMappable(cmap='viridis', norm=norm); sm.set_array([])
+        fig.colorbar(sm, ax=list(axs), pad=0.01, fraction=0.02).set_label('Tiempo de vuelta (s)')
+        fig.suptitle(title or f'Superposición de {len(labels)} vueltas\n{metadata.get("Vehicle", "Vehículo")} @ {metadata.get("Track", "Pista")}', fontsize=14)
+        _show_or_save(fig, save_path)
+    except Exception as e:
+        print(f"Error FATAL al generar plot_lap_overlay: {e}")
+        traceback.print_exc()
+
+
+def plot_multi_lap_overlay(df_telemetry, metadata, laps_info_df, lap_numbers=None, channels=None, grid_step=5.0, save_path=None, alignment='distance'):
+    """
+    Superposición de N vueltas de una sesión (por defecto, todas las cronometradas válidas).
+    alignment='position': todas se alinean por posición GPS sobre la trazada de la vuelta más rápida.
+    """
+    from lap_alignment import align_session_laps, DEFAULT_OVERLAY_CHANNELS
+    if laps_info_df is None or laps_info_df.empty: print("Error: Sin información de vueltas."); return
+    if lap_numbers is None:
+        valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+        lap_numbers = valid['Lap'].astype(int).tolist()
+    times_by_lap = dict(zip(laps_info_df['Lap'].astype(int), laps_info_df['LapTime']))
+    lap_numbers = [int(l) for l in lap_numbers if int(l) in times_by_lap]
+    if len(lap_numbers) < 2: print("Error: Se necesitan al menos 2 vueltas para la superposición."); return
+    track_length_m = get_track_length_m(metadata)
+    grid = np.arange(0.0, track_length_m + grid_step * 0.5, grid_step) if track_length_m else None
+    fastest_lap = min(lap_numbers, key=lambda l: times_by_lap[l])
+    try: grid, aligned, lap_numbers = align_session_laps(df_telemetry, lap_numbers, channels or DEFAULT_OVERLAY_CHANNELS, grid=grid, grid_step=grid_step,
+                                                         alignment=alignment, reference_lap=fastest_lap)
+    except (KeyError, ValueError) as e_align:
+        print(f"Adv: Alineación por posición no disponible ({e_align}); se usa LapDist.")
+        grid, aligned, lap_numbers = align_session_laps(df_telemetry, lap_numbers, channels or DEFAULT_OVERLAY_CHANNELS, grid=grid, grid_step=grid_step)
+    lap_times = [times_by_lap[l] for l in lap_numbers]
+    plot_lap_overlay(grid, aligned, [f'V{l}' for l in lap_numbers], lap_times, metadata, save_path=save_path)
+
+
+# --- Informe de Neumáticos (tyre_analysis) ---
+TYRE_CORNER_COLORS = {'LF': 'tab:blue', 'RF': 'tab:red', 'LR': 'tab:green', 'RR': 'tab:orange'}
+
+
+@profiled_plot("plot_tyre_report")
+def plot_tyre_report(tyre_laps_df, balance_df, metadata, save_path=None):
+    """
+    Informe compacto de neumáticos (2x2): temperatura superficial y presión por vuelta (media + rango),
+    desgaste acumulado por rueda y balance de deriva delantero/trasero con eventos de patinaje/bloqueo.
+
+    Args:
+        tyre_laps_df (pandas.DataFrame): Salida de tyre_analysis.compute_tyre_lap_stats.
+        balance_df (pandas.DataFrame): Salida de tyre_analysis.compute_slip_balance.
+    """
+    if tyre_laps_df is None or tyre_laps_df.empty: print("Error: Sin datos de neumáticos."); return
+    print("\n--- Generando INFORME DE NEUMÁTICOS ---")
+    try:
+        fig, axs = plt.subplots(2, 2, figsize=(16, 10), sharex=True)
+        (ax_temp, ax_press), (ax_wear, ax_bal) = axs
+        for corner, color in TYRE_CORNER_COLORS.items():
+            data = tyre_laps_df[tyre_laps_df['Corner'] == corner]
+            if data.empty: continue
+            laps = data['Lap'].to_numpy()
+            ax_temp.plot(laps, data['TempSurfMean'], color=color, marker='o', markersize=3, label=corner)
+            ax_temp.fill_between(laps, data['TempSurfMin'], data['TempSurfMax'], color=color, alpha=0.08)
+            ax_press.plot(laps, data['PressureMean'], color=color, marker='o', markersize=3, label=corner)
+            ax_press.fill_between(laps, data['PressureMin'], data['PressureMax'], color=color, alpha=0.08)
+            ax_wear.plot(laps, data['WearEnd'], color=color, marker='o', markersize=3, label=corner)
+        ax_temp.set_title('Temperatura superficial (media y rango por vuelta)', loc='left', fontsize=10); ax_temp.set_ylabel('°C')
+        ax_press.set_title('Presión (media y rango por vuelta)', loc='left', fontsize=10); ax_press.set_ylabel('kPa')
+        ax_wear.set_title('Desgaste acumulado (fin de vuelta)', loc='left', fontsize=10); ax_wear.set_ylabel('Desgaste')
+
+        if balance_df is not None and not balance_df.empty:
+            colors = np.where(balance_df['SlipBalanceDeg'] >= 0, 'tab:blue', 'tab:red')
+            ax_bal.bar(balance_df['Lap'], balance_df['SlipBalanceDeg'], color=colors, alpha=0.7, label='Deriva del. - tras. (°)')
+            ax_bal.axhline(0, color='black', linewidth=0.8)
+        events = tyre_laps_df.groupby('Lap', observed=True)[['WheelspinEvents', 'LockupEvents']].sum()
+        ax_events = ax_bal.twinx()
+        ax_events.plot(events.index, events['WheelspinEvents'], 'g^', label='Patinaje')
+        ax_events.plot(events.index, events['LockupEvents'], 'kv', label='Bloqueo')
+        ax_events.set_ylabel('Eventos'); ax_events.set_ylim(bottom=0)
+        ax_bal.set_title('Balance de deriva (>0 subviraje) y eventos de patinaje/bloqueo', loc='left', fontsize=10)
+        ax_bal.set_ylabel('°')
+        handles, labels = ax_bal.get_legend_handles_labels(); handles2, labels2 = ax_events.get_legend_handles_labels()
+        ax_bal.legend(handles + handles2, labels + labels2, fontsize=8, loc='lower right')
+
+        for ax in (ax_temp, ax_press, ax_wear): ax.legend(fontsize=8, ncol=4, loc='upper left')
+        for ax in axs.ravel(): ax.grid(True, linestyle=':', alpha=0.7)
+        for ax in axs[1]: ax.set_xlabel('Vuelta')
+        fig.suptitle(f'Informe de Neumáticos\n{metadata.get("Vehicle", "Vehículo")} @ {metadata.get("Track", "Pista")}', fontsize=14)
+        fig.tight_layout(rect=[0, 0, 1, 0.95]); _show_or_save(fig, save_path)
+    except Exception as e:
+        print(f"Error FATAL al generar plot_tyre_report: {e}")
+        traceback.print_exc()
+
+
+# --- Mapa de Pista GPS (track_map) ---
+TRACK_MAP_CMAPS = {'Speed': 'plasma', 'Brake': 'Reds', 'Throttle': 'Greens', 'Gear': 'viridis', 'Delta': 'RdYlGn_r'}
+TRACK_MAP_LABELS = {'Speed': 'Velocidad (Kmh)', 'Brake': 'Freno (0-1)', 'Throttle': 'Acelerador (0-1)', 'Gear': 'Marcha', 'Delta': 'Delta vs Ref (s)'}
+
+
+@profiled_plot("plot_track_map")
+def plot_track_map(df_telemetry, metadata, lap_number, channel='Speed', reference_lap_number=None, laps_info_df=None, save_path=None):
+    """
+    Mapa de pista desde GPS de una vuelta coloreada por un canal ('Speed', 'Brake', 'Delta'...).
+    Con channel=None y una referencia dibuja ambas trazadas: vuelta en AZUL vs referencia en NARANJA (imagen TrackMap para el VLM).
+    'Delta' requiere `reference_lap_number`.
+    """
+    from matplotlib.collections import LineCollection
+    from matplotlib.colors import TwoSlopeNorm
+    from track_map import get_track_centerline, lap_map_paths, lap_time_delta
+    if channel == 'Delta' and reference_lap_number is None: print("Error: El mapa de delta requiere una vuelta de referencia."); return
+    if channel not in (None, 'Delta') and channel not in df_telemetry.columns: print(f"Error: Canal no encontrado para el mapa: {channel}"); return
+    centerline = get_track_centerline(df_telemetry, metadata, laps_info_df)
+    if centerline is None: return
+    laps = [lap_number] + ([reference_lap_number] if reference_lap_number is not None else [])
+    value_channels = [channel] if channel not in (None, 'Delta') else []
+    grid, x, y, values = lap_map_paths(df_telemetry, laps, value_channels, centerline)
+    ref_text = f" vs Ref V{reference_lap_number}" if reference_lap_number is not None else ""
+    print(f"\n--- Generando MAPA DE PISTA V{lap_number}{ref_text} ({channel or 'trazadas'}) ---")
+    try:
+        fig, ax = plt.subplots(figsize=(12, 10))
+        ax.plot(centerline['x'], centerline['y'], color='lightgray', linewidth=9, solid_capstyle='round', zorder=0)
+        if channel is None:
+            ax.plot(x[0], y[0], color='blue', linewidth=1.5, label=f'V{lap_number}')
+            if reference_lap_number is not None: ax.plot(x[1], y[1], color='orange', linestyle='--', linewidth=1.2, label=f'Ref V{reference_lap_number}')
+            ax.legend(loc='upper right')
+        else:
+            color_values = lap_time_delta(df_telemetry, lap_number, reference_lap_number, grid) if channel == 'Delta' else values[channel][0]
+            points = np.stack([x[0], y[0]], axis=-1)
+            segments = np.stack([points[:-1], points[1:]], axis=1)
+            seg_values = color_values[:-1]
+            ok = np.isfinite(segments).all(axis=(1, 2)) & np.isfinite(seg_values)
+            if channel == 'Delta':
+                limit = max(float(np.nanmax(np.abs(seg_values[ok]))) if ok.any() else 0.0, 0.05)
+                norm = TwoSlopeNorm(vcenter=0.0, vmin=-limit, vmax=limit)
+            else:
+                norm = plt.Normalize(np.nanmin(seg_values[ok]), np.nanmax(seg_values[ok])) if ok.any() else None
+            lines = LineCollection(segments[ok], cmap=TRACK_MAP_CMAPS.get(channel, 'viridis'), norm=norm, linewidths=3)
+            lines.set_array(seg_values[ok]); ax.add_collection(lines)
+            fig.colorbar(lines, ax=ax, fraction=0.035, pad=0.02).set_label(TRACK_MAP_LABELS.get(channel, channel))
+            if reference_lap_number is not None and channel != 'Delta':
+                ax.plot(x[1], y[1], color='black', linestyle=':', linewidth=0.8, label=f'Ref V{reference_lap_number}'); ax.legend(loc='upper right')
+        start = np.flatnonzero(np.isfinite(x[0]) & np.isfinite(y[0]))
+        if start.size: ax.plot(x[0][start[0]], y[0][start[0]], marker='s', color='black', markersize=8, zorder=5)
+        ax.set_aspect('equal'); ax.autoscale_view(); ax.axis('off')
+        title_channel = TRACK_MAP_LABELS.get(channel, channel) if channel else 'Trazadas'
+        ax.set_title(f'Mapa de pista V{lap_number}{ref_text}: {title_channel}\n{metadata.get("Vehicle", "Vehículo")} @ {metadata.get("Track", "Pista")}', fontsize=13)
+        fig.tight_layout(); _show_or_save(fig, save_path)
+    except Exception as e:
+        print(f"Error FATAL al generar plot_track_map: {e}")
+        traceback.print_exc()
+
+
+# --- Uso de Adherencia (grip_analysis) ---
+@profiled_plot("plot_grip_report")
+def plot_grip_report(grip, metadata, save_path=None):
+    """
+    Informe de adherencia (2x2) como imágenes de densidad: diagrama G-G con círculo de adherencia,
+    velocidad vs volante e histogramas de acelerador y freno (% del tiempo).
+
+    Args:
+        grip (dict): Salida de grip_analysis.compute_grip_histograms.
+    """
+    from matplotlib.colors import LogNorm
+    from matplotlib.patches import Circle
+    if not grip or not grip.get('samples'): print("Error: Sin muestras para el informe de adherencia."); return
+    print(f"\n--- Generando INFORME DE ADHERENCIA ({len(grip['laps'])} vueltas, {grip['samples']} muestras) ---")
+    try:
+        fig, axs = plt.subplots(2, 2, figsize=(15, 12))
+        (ax_gg, ax_ss), (ax_thr, ax_brk) = axs
+
+        def density(ax, hist, xlabel, ylabel, title):
+            if hist is None: ax.text(0.5, 0.5, 'Sin datos', ha='center', va='center', transform=ax.transAxes); ax.set_title(title, loc='left', fontsize=10); return
+            counts = hist['counts'].T.astype(float); counts[counts == 0] = np.nan # Celdas vacías transparentes
+            extent = [hist['x_edges'][0], hist['x_edges'][-1], hist['y_edges'][0], hist['y_edges'][-1]]
+            image = ax.imshow(counts, origin='lower', extent=extent, aspect='auto', cmap='inferno',
+                              norm=LogNorm(vmin=1, vmax=max(np.nanmax(counts), 1)) if np.isfinite(counts).any() else None, interpolation='nearest')
+            fig.colorbar(image, ax=ax, fraction=0.04, pad=0.02).set_label('Muestras')
+            ax.set_xlabel(xlabel); ax.set_ylabel(ylabel); ax.set_title(title, loc='left', fontsize=10)
+
+        density(ax_gg, grip['gg'], 'G lateral (g)', 'G longitudinal (g)', 'Diagrama G-G')
+        if grip['gg'] is not None:
+            ax_gg.set_aspect('equal'); ax_gg.axhline(0, color='gray', linewidth=0.5); ax_gg.axvline(0, color='gray', linewidth=0.5)
+            if grip.get('grip_envelope_g'):
+                radius = grip['grip_envelope_g']
+                ax_gg.add_patch(Circle((0, 0), radius, fill=False, color='cyan', linestyle='--', linewidth=1.2,
+                                       label=f"Adherencia p{grip['grip_envelope_pct']:g}: {radius:.2f} g"))
+                ax_gg.legend(loc='upper right', fontsize=8)
+        density(ax_ss, grip['speed_steer'], 'Velocidad (Kmh)', 'Volante (°)', 'Velocidad vs volante')
+
+        for ax, key, color, label, pct_key, pct_label in ((ax_thr, 'throttle', 'green', 'Acelerador', 'full_throttle_pct', 'a fondo'),
+                                                          (ax_brk, 'brake', 'red', 'Freno', 'braking_pct', 'frenando')):
+            hist = grip[key]
+            if hist is None: ax.text(0.5, 0.5, 'Sin datos', ha='center', va='center', transform=ax.transAxes)
+            else:
+                pct = 100.0 * hist['counts'] / max(hist['counts'].sum(), 1)
+                ax.bar(hist['edges'][:-1], pct, width=np.diff(hist['edges']), align='edge', color=color, alpha=0.7)
+                ax.set_yscale('log'); ax.set_xlim(0, 1)
+                if grip.get(pct_key) is not None: ax.text(0.98, 0.95, f"{grip[pct_key]:.1f}% del tiempo {pct_label}", ha='right', va='top', transform=ax.transAxes, fontsize=9)
+            ax.set_xlabel(f'{label} (0-1)'); ax.set_ylabel('% del tiempo'); ax.set_title(f'Histograma de {label.lower()}', loc='left', fontsize=10)
+        for ax in axs.ravel(): ax.grid(True, linestyle=':', alpha=0.5)
+        laps_text = ', '.join(f'V{l}' for l in grip['laps'][:12]) + ('...' if len(grip['laps']) > 12 else '')
+        fig.suptitle(f'Uso de adherencia ({laps_text})\n{metadata.get("Vehicle", "Vehículo")} @ {metadata.get("Track", "Pista")}', fontsize=14)
+        fig.tight_layout(rect=[0, 0, 1, 0.95]); _show_or_save(fig, save_path)
+    except Exception as e:
+        print(f"Error FATAL al generar plot_grip_report: {e}")
+        traceback.print_exc()
 
 
 # --- Función plot_delta_analysis_dashboard (OBSOLETA - Mantenida comentada) ---
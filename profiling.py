@@ -0,0 +1,188 @@
+# profiling.py (Instrumentación ligera por etapas: tiempo de pared, CPU, memoria pico, bytes leídos)
+#
+# Se activa con `python main.py --profile` o con RENNSPORT_PROFILE=1. Desactivado,
+# `span()` devuelve un objeto vacío reutilizable y el coste es prácticamente nulo.
+# La memoria pico (tracemalloc) es opcional porque ralentiza todas las asignaciones:
+# `--profile-memory` o RENNSPORT_PROFILE_MEMORY=1. Como el pico de tracemalloc es
+# global del proceso, solo los spans del hilo principal lo miden (los demás: 0).
+# Al terminar el proceso imprime una tabla resumen y escribe un trace JSON
+# (formato Chrome Trace Event, abrible en chrome://tracing o ui.perfetto.dev).
+
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+PROFILE_ENV_VAR = "RENNSPORT_PROFILE"
+TRACE_ENV_VAR = "RENNSPORT_PROFILE_TRACE"
+MEMORY_ENV_VAR = "RENNSPORT_PROFILE_MEMORY"
+DEFAULT_TRACE_PATH = "profile_trace.json"
+
+_enabled = False
+_trace_memory = False # tracemalloc iniciado por enable_profiling (se detiene en finish_profiling)
+_trace_path = None
+_events = []
+_events_lock = threading.Lock()
+_local = threading.local()
+_t_origin = time.perf_counter()
+
+
+class _NullSpan:
+    """Span vacío usado cuando el perfilado está desactivado."""
+    __slots__ = ()
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def add(self, **attrs): pass
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """Span activo: mide pared/CPU y, con memoria activada en el hilo principal, memoria pico (tracemalloc) del bloque."""
+    __slots__ = ('name', 'attrs', 't0', 'cpu0', 'child_peak', 'thread_cpu', 'memory')
+
+    def __init__(self, name, attrs):
+        self.name = name; self.attrs = attrs; self.child_peak = 0
+
+    def add(self, **attrs):
+        """Añade atributos al span (ej. bytes_read, rows)."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        stack = _stack()
+        self.memory = _trace_memory and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+        if self.memory:
+            if stack: # Guardar el pico acumulado del padre antes de reiniciarlo
+                stack[-1].child_peak = max(stack[-1].child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak() # Global del proceso: solo desde el hilo principal
+        stack.append(self)
+        self.thread_cpu = time.thread_time()
+        self.cpu0 = time.process_time(); self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.cpu0
+        peak = max(tracemalloc.get_traced_memory()[1], self.child_peak) if self.memory and tracemalloc.is_tracing() else 0
+        stack = _stack(); stack.pop()
+        if stack and peak: stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        event = {
+            "name": self.name, "start_s": self.t0 - _t_origin, "wall_s": wall, "cpu_s": cpu,
+            "thread_cpu_s": time.thread_time() - self.thread_cpu, "peak_mem_bytes": peak,
+            "depth": len(stack), "thread": threading.current_thread().name,
+            "error": exc_type.__name__ if exc_type else None,
+        }
+        event.update(self.attrs)
+        with _events_lock: _events.append(event)
+        return False
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None: stack = _local.stack = []
+    return stack
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable_profiling(trace_path=None, report_at_exit=True, trace_memory=None):
+    """
+    Activa el perfilado (idempotente). Registra el resumen + trace al salir.
+    trace_memory=True mide la memoria pico con tracemalloc (None = según RENNSPORT_PROFILE_MEMORY).
+    """
+    global _enabled, _trace_path, _trace_memory
+    if _enabled: return
+    _enabled = True
+    _trace_path = trace_path or os.environ.get(TRACE_ENV_VAR) or DEFAULT_TRACE_PATH
+    if trace_memory is None: trace_memory = os.environ.get(MEMORY_ENV_VAR, "").lower() in ("1", "true", "yes")
+    if trace_memory and not tracemalloc.is_tracing(): tracemalloc.start(); _trace_memory = True
+    if report_at_exit: atexit.register(finish_profiling)
+
+
+def span(name, **attrs):
+    """
+    Context manager que mide un bloque: `with span("read_csv", bytes_read=n): ...`.
+    Devuelve un span sin coste si el perfilado no está activo.
+    """
+    if not _enabled: return _NULL_SPAN
+    return _Span(name, attrs)
+
+
+def profiled(name=None):
+    """Decorador equivalente a envolver la función completa en `span(name)`."""
+    def decorator(func):
+        span_name = name or func.__name__
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled: return func(*args, **kwargs)
+            with _Span(span_name, {}): return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_events():
+    with _events_lock: return list(_events)
+
+
+def summarize(events=None):
+    """Agrega eventos por nombre: llamadas, pared/CPU total y máx., memoria pico, bytes."""
+    summary = {}
+    for ev in (events if events is not None else get_events()):
+        s = summary.setdefault(ev["name"], {"calls": 0, "wall_s": 0.0, "max_wall_s": 0.0, "cpu_s": 0.0,
+                                            "peak_mem_bytes": 0, "bytes_read": 0, "first_start_s": ev["start_s"]})
+        s["calls"] += 1; s["wall_s"] += ev["wall_s"]; s["cpu_s"] += ev["cpu_s"]
+        s["max_wall_s"] = max(s["max_wall_s"], ev["wall_s"])
+        s["peak_mem_bytes"] = max(s["peak_mem_bytes"], ev["peak_mem_bytes"] or 0)
+        s["bytes_read"] += int(ev.get("bytes_read") or 0)
+        s["first_start_s"] = min(s["first_start_s"], ev["start_s"])
+    return summary
+
+
+def format_summary_table(summary=None):
+    """Tabla de texto ordenada por orden de aparición."""
+    summary = summary if summary is not None else summarize()
+    lines = [f"{'Etapa':<34} {'N':>5} {'Pared (s)':>10} {'Máx (s)':>9} {'CPU (s)':>9} {'Pico MB':>9} {'MB leídos':>10}"]
+    lines.append("-" * len(lines[0]))
+    for name, s in sorted(summary.items(), key=lambda kv: kv[1]["first_start_s"]):
+        read_mb = f"{s['bytes_read'] / 1e6:.1f}" if s["bytes_read"] else "-"
+        peak_mb = f"{s['peak_mem_bytes'] / 1e6:.1f}" if s["peak_mem_bytes"] else "-"
+        lines.append(f"{name[:34]:<34} {s['calls']:>5} {s['wall_s']:>10.3f} {s['max_wall_s']:>9.3f} "
+                     f"{s['cpu_s']:>9.3f} {peak_mb:>9} {read_mb:>10}")
+    return "\n".join(lines)
+
+
+def write_trace(path=None, events=None):
+    """Escribe los eventos en formato Chrome Trace Event (JSON) + resumen agregado."""
+    events = events if events is not None else get_events()
+    path = path or _trace_path or DEFAULT_TRACE_PATH
+    thread_ids = {}
+    trace_events = []
+    for ev in events:
+        tid = thread_ids.setdefault(ev["thread"], len(thread_ids) + 1)
+        args = {k: v for k, v in ev.items() if k not in ("name", "start_s", "wall_s", "thread")}
+        trace_events.append({"name": ev["name"], "ph": "X", "pid": os.getpid(), "tid": tid,
+                             "ts": ev["start_s"] * 1e6, "dur": ev["wall_s"] * 1e6, "args": args})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms", "summary": summarize(events)}, f, indent=1, default=str)
+    return path
+
+
+def finish_profiling():
+    """Imprime el resumen por etapas, escribe el trace (llamado al salir) y detiene tracemalloc si lo inició el perfilado."""
+    global _trace_memory
+    if _trace_memory: tracemalloc.stop(); _trace_memory = False
+    events = get_events()
+    if not events: return
+    print("\n=== Perfil de Ejecución (por etapa) ===")
+    print(format_summary_table(summarize(events)))
+    try: print(f"Trace guardado en: {write_trace(events=events)}")
+    except OSError as e: print(f"Adv: No se pudo escribir trace de perfil: {e}")
+
+
+# Activación por variable de entorno
+if os.environ.get(PROFILE_ENV_VAR, "").lower() in ("1", "true", "yes"): enable_profiling()
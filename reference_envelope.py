@@ -0,0 +1,114 @@
+# reference_envelope.py (Envolvente estadística de referencia sobre todas las vueltas válidas)
+#
+# En lugar de comparar contra una sola vuelta, todas las vueltas cronometradas válidas se
+# alinean sobre una rejilla común de distancia (lap_alignment, una interpolación por canal
+# para todas las vueltas) y se apilan en un array (canales x vueltas x rejilla). Sobre él,
+# un solo sort a lo largo del eje de vueltas da las bandas p10/p50/p90 de todos los canales, y la
+# vuelta "mejor de todas" se compone tomando en cada punto la vuelta más rápida localmente
+# (máxima velocidad) con todos sus canales, así sus entradas son coherentes entre sí.
+# Para cada vuelta se mide además el % de la rejilla fuera de la banda: las vueltas atípicas
+# destacan sin comparativas por parejas. Los canales son los paneles del dashboard con
+# banda (velocidad, acelerador y freno); con alineación por posición la base de distancia
+# es la vuelta de referencia del dashboard, la misma sobre la que se dibuja la comparada.
+#
+# Uso:
+#   env = compute_reference_envelope(df, laps_info_df)
+#   env['bands']['Speed'][10], env['bands']['Speed'][90], env['best_of']['Speed']
+#   env = compute_reference_envelope(df, laps_info_df, alignment='position', reference_lap=3)
+#   plot_comparison_dashboard(df, metadata, 7, 3, alignment='position', envelope=env)   # Banda en el dashboard
+
+from lap_alignment import DEFAULT_GRID_STEP_M, align_session_laps
+from lazy_imports import lazy_import
+from profiling import profiled
+
+np = lazy_import('numpy')
+
+ENVELOPE_CHANNELS = ('Speed', 'Throttle', 'Brake') # Paneles del dashboard con banda
+ENVELOPE_PERCENTILES = (10, 50, 90) # (banda inferior, mediana, banda superior)
+BEST_OF_CHANNEL = 'Speed' # Canal que decide la vuelta más rápida en cada punto de la rejilla
+MIN_ENVELOPE_LAPS = 3 # Con menos vueltas los percentiles no aportan nada
+
+
+def valid_timed_laps(laps_info_df):
+    """Vueltas cronometradas válidas de laps_info_df (lista de int)."""
+    if laps_info_df is None or laps_info_df.empty: return []
+    valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+    return valid['Lap'].astype(int).tolist()
+
+
+def nan_percentiles(stack, percentiles, axis=1):
+    """
+    Percentiles (interpolación lineal, como np.nanpercentile) ignorando NaN, con un único sort a lo largo de
+    `axis`: los NaN quedan al final y el rango de cada columna sale de su nº de valores válidos.
+    np.nanpercentile recorre las columnas una a una y es decenas de veces más lento aquí.
+
+    Returns:
+        np.ndarray: (len(percentiles),) + forma de `stack` sin `axis`; NaN donde no hay ningún valor.
+    """
+    ordered = np.moveaxis(np.sort(stack, axis=axis), axis, 0) # (muestras, resto): NaN al final de cada columna
+    rest = ordered.shape[1:]; flat = ordered.reshape(ordered.shape[0], -1)
+    last = (~np.isnan(flat)).sum(axis=0) - 1 # Índice del último válido (-1 = columna vacía)
+    rank = np.asarray(percentiles, dtype=float)[:, None] / 100.0 * np.maximum(last, 0)[None, :]
+    lo = np.floor(rank).astype(np.int64); hi = np.minimum(lo + 1, np.maximum(last, 0)[None, :])
+    cols = np.arange(flat.shape[1])
+    result = flat[lo, cols] + (flat[hi, cols] - flat[lo, cols]) * (rank - lo)
+    result[:, last < 0] = np.nan
+    return result.reshape((len(percentiles),) + rest)
+
+
+@profiled("reference_envelope")
+def compute_reference_envelope(df, laps_info_df, lap_numbers=None, channels=ENVELOPE_CHANNELS, percentiles=ENVELOPE_PERCENTILES,
+                               grid=None, grid_step=DEFAULT_GRID_STEP_M, alignment='distance', reference_lap=None):
+    """
+    Bandas por percentil y vuelta "mejor de todas" por distancia.
+
+    Args:
+        lap_numbers (list, opcional): Vueltas a incluir; None = todas las cronometradas válidas.
+        grid (np.ndarray, opcional): Rejilla de distancia (p. ej. 0..longitud de pista); None = hasta la distancia máxima.
+        alignment (str): 'distance' (LapDist) o 'position' (GPS sobre la trazada de `reference_lap`).
+        reference_lap (int, opcional): Vuelta de referencia del dashboard para alignment='position'; None = la más rápida.
+
+    Returns:
+        dict: 'grid', 'laps', 'channels', 'percentiles', 'bands' {canal: {p: array}}, 'best_of' {canal: array},
+        'best_of_lap' (vuelta elegida en cada punto, 0 = sin datos) y 'outside_pct' {vuelta: {canal: % de la
+        rejilla fuera de la banda extrema}}. None si hay menos de MIN_ENVELOPE_LAPS vueltas.
+    """
+    lap_numbers = valid_timed_laps(laps_info_df) if lap_numbers is None else [int(l) for l in lap_numbers]
+    channels = [c for c in channels if c in df.columns]
+    if len(lap_numbers) < MIN_ENVELOPE_LAPS or not channels: return None
+    times_by_lap = dict(zip(laps_info_df['Lap'].astype(int), laps_info_df['LapTime']))
+    reference_lap = min(lap_numbers, key=lambda l: times_by_lap.get(l, np.inf)) if reference_lap is None else int(reference_lap)
+    try: grid, aligned, lap_numbers = align_session_laps(df, lap_numbers, channels, grid=grid, grid_step=grid_step,
+                                                         alignment=alignment, reference_lap=reference_lap)
+    except (KeyError, ValueError) as e_align:
+        print(f"Adv: Alineación por posición no disponible ({e_align}); se usa LapDist.")
+        grid, aligned, lap_numbers = align_session_laps(df, lap_numbers, channels, grid=grid, grid_step=grid_step)
+    stack = np.stack([aligned[c] for c in channels]) # (canales, vueltas, rejilla)
+
+    bands = nan_percentiles(stack, percentiles, axis=1) # (percentiles, canales, rejilla); NaN donde no hay vueltas
+
+    decider = stack[channels.index(BEST_OF_CHANNEL)] if BEST_OF_CHANNEL in channels else stack[0]
+    covered = np.isfinite(decider).any(axis=0)
+    best_idx = np.argmax(np.where(np.isfinite(decider), decider, -np.inf), axis=0)
+    best_of = np.take_along_axis(stack, best_idx[None, None, :], axis=1)[:, 0, :]
+    best_of[:, ~covered] = np.nan
+
+    low, high = bands[0], bands[-1]
+    outside = (stack < low[:, None, :]) | (stack > high[:, None, :])
+    counted = np.isfinite(stack).sum(axis=2)
+    outside_pct = 100.0 * outside.sum(axis=2) / np.maximum(counted, 1) # (canales, vueltas)
+
+    return {'grid': grid, 'laps': lap_numbers, 'channels': channels, 'percentiles': tuple(percentiles),
+            'bands': {c: {p: bands[k, i] for k, p in enumerate(percentiles)} for i, c in enumerate(channels)},
+            'best_of': {c: best_of[i] for i, c in enumerate(channels)},
+            'best_of_lap': np.where(covered, np.asarray(lap_numbers)[best_idx], 0),
+            'outside_pct': {lap: {c: float(outside_pct[i, j]) for i, c in enumerate(channels)} for j, lap in enumerate(lap_numbers)}}
+
+
+def format_envelope_outliers(envelope, channel='Speed', top=5):
+    """Vueltas ordenadas por % de la rejilla fuera de la banda en `channel` (las más atípicas primero)."""
+    if not envelope or channel not in envelope['channels']: return "Envolvente: sin datos."
+    low, high = envelope['percentiles'][0], envelope['percentiles'][-1]
+    ranked = sorted(envelope['outside_pct'].items(), key=lambda item: -item[1][channel])[:top]
+    return (f"Envolvente ({len(envelope['laps'])} vueltas), % fuera de p{low}-p{high} en {channel}: "
+            + ", ".join(f"V{lap} {pcts[channel]:.0f}%" for lap, pcts in ranked))
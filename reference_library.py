@@ -0,0 +1,262 @@
+# reference_library.py (Biblioteca de vueltas de referencia comprimidas con índice por pista/coche/piloto)
+#
+# Cada vuelta se guarda como un .npz comprimido con un array por canal:
+#   - LapDist, Time, Latitude, Longitude: enteros con codificación delta (cm, ms, 1e-7 grados)
+#   - Throttle/Brake/Clutch: uint8 (0-255); Gear: int8; Speed, RPM, Steer, G: int16/uint16 escalados
+#   - Cualquier otro canal numérico: float32
+# Los NaN se guardan como máscara de bits aparte. index.json guarda pista, vehículo, piloto,
+# tiempo de vuelta y archivo de cada entrada, así una referencia se busca sin abrir los .npz.
+#
+# Uso:
+#   python reference_library.py add Telemetry.csv --laps best
+#   python reference_library.py list --track Hockenheim
+#   python reference_library.py remove <id>
+#   python cross_session.py Telemetry.csv:best ref:Hockenheim     # Comparar contra la referencia más rápida
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+from app_cache import CACHE_DIR
+
+LIBRARY_DIR = os.environ.get('RENNSPORT_REFERENCE_LIBRARY') or os.path.join(CACHE_DIR, 'reference_laps')
+INDEX_NAME = "index.json"
+LIBRARY_VERSION = 1
+REFERENCE_PREFIX = "ref:" # Prefijo de las especificaciones de vuelta que apuntan a la biblioteca
+
+# Canal -> (códec, tipo entero, escala): valor guardado = round(valor * escala)
+CHANNEL_CODECS = {
+    'LapDist': ('delta', np.int32, 100.0),       # cm
+    'Time': ('delta', np.int32, 1000.0),         # ms
+    'Latitude': ('delta', np.int32, 1e7),        # ~1 cm
+    'Longitude': ('delta', np.int32, 1e7),
+    'Throttle': ('quant', np.uint8, 255.0),
+    'Brake': ('quant', np.uint8, 255.0),
+    'Clutch': ('quant', np.uint8, 255.0),
+    'Gear': ('quant', np.int8, 1.0),
+    'Speed': ('quant', np.uint16, 100.0),        # 0.01 km/h
+    'RPM': ('quant', np.uint16, 1.0),
+    'Steer': ('quant', np.int16, 10.0),          # 0.1 grados
+    'G_Lat': ('quant', np.int16, 100.0),         # 0.01 m/s^2
+    'G_Lon': ('quant', np.int16, 100.0),
+    'Fuel': ('quant', np.uint16, 100.0),
+}
+DEFAULT_LIBRARY_CHANNELS = ('Time', 'LapDist', 'Speed', 'Throttle', 'Brake', 'Clutch', 'Steer', 'Gear', 'RPM',
+                            'G_Lat', 'G_Lon', 'Latitude', 'Longitude')
+
+
+# --- Codificación por Canal ---
+def encode_channel(name, values):
+    """Codifica un canal: dict de arrays para el .npz (prefijo = nombre del canal)."""
+    values = np.asarray(values, dtype=float)
+    nan = ~np.isfinite(values)
+    filled = np.where(nan, 0.0, values) if nan.any() else values
+    codec, dtype, scale = CHANNEL_CODECS.get(name, ('float', np.float32, 1.0))
+    arrays = {}
+    if codec == 'delta':
+        q = np.round(filled * scale).astype(np.int64)
+        arrays[f"{name}__first"] = q[:1]
+        arrays[f"{name}"] = np.diff(q).astype(dtype)
+    elif codec == 'quant':
+        info = np.iinfo(dtype)
+        arrays[name] = np.clip(np.round(filled * scale), info.min, info.max).astype(dtype)
+    else:
+        arrays[name] = filled.astype(np.float32)
+    if nan.any(): arrays[f"{name}__nan"] = np.packbits(nan)
+    return arrays
+
+
+def decode_channel(name, npz, n_samples):
+    """Inverso de encode_channel (float64, NaN restaurados)."""
+    codec, _, scale = CHANNEL_CODECS.get(name, ('float', np.float32, 1.0))
+    if codec == 'delta':
+        q = np.empty(n_samples, dtype=np.int64)
+        if n_samples:
+            q[0] = npz[f"{name}__first"][0]; np.cumsum(npz[name], dtype=np.int64, out=q[1:]); q[1:] += q[0]
+        values = q / scale
+    else:
+        values = npz[name].astype(float) / scale
+    if f"{name}__nan" in npz.files:
+        values[np.unpackbits(npz[f"{name}__nan"], count=n_samples).astype(bool)] = np.nan
+    return values
+
+
+# --- Biblioteca ---
+def _slug(text):
+    return re.sub(r'[^a-z0-9]+', '_', str(text or '').lower()).strip('_') or 'na'
+
+
+class ReferenceLibrary:
+    """Directorio con index.json y un .npz comprimido por vuelta."""
+
+    def __init__(self, root=None):
+        self.root = root or LIBRARY_DIR
+        self.index_path = os.path.join(self.root, INDEX_NAME)
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f: self.index = json.load(f)
+        except (OSError, ValueError): self.index = {"version": LIBRARY_VERSION, "laps": []}
+
+    def _save_index(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f: json.dump(self.index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    @property
+    def entries(self):
+        return list(self.index["laps"])
+
+    def add_lap(self, df_lap, metadata, lap_number, lap_time, channels=DEFAULT_LIBRARY_CHANNELS, source=None):
+        """
+        Añade una vuelta (DataFrame de una sola vuelta) a la biblioteca.
+
+        Returns:
+            dict: Entrada del índice (id, track, vehicle, driver, lap, lap_time, file, bytes...).
+        """
+        df_lap = df_lap.sort_values('Time', kind='stable')
+        channels = [c for c in channels if c in df_lap.columns]
+        if 'Time' not in channels or 'LapDist' not in channels: raise ValueError("La vuelta necesita 'Time' y 'LapDist'.")
+        metadata = metadata or {}
+        track, vehicle = metadata.get('Track', 'N/A'), metadata.get('Vehicle', 'N/A')
+        driver = metadata.get('Driver') or 'N/A'
+        key = f"{track}|{vehicle}|{driver}|{source}|{lap_number}|{lap_time:.3f}"
+        lap_id = hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]
+        arrays = {}
+        time_values = df_lap['Time'].to_numpy(dtype=float, na_value=np.nan)
+        for name in channels:
+            values = df_lap[name].to_numpy(dtype=float, na_value=np.nan)
+            if name == 'Time': values = values - time_values[0] # Tiempo relativo al inicio de la vuelta
+            arrays.update(encode_channel(name, values))
+        file_name = f"{_slug(track)}_{_slug(vehicle)}_{lap_id}.npz"
+        os.makedirs(self.root, exist_ok=True)
+        np.savez_compressed(os.path.join(self.root, file_name), **arrays)
+        entry = {"id": lap_id, "track": track, "vehicle": vehicle, "driver": driver, "lap": int(lap_number),
+                 "lap_time": float(lap_time), "formatted_time": _format_lap_time(lap_time), "date": metadata.get('Date'),
+                 "source": source, "file": file_name, "samples": int(len(df_lap)), "channels": channels,
+                 "bytes": os.path.getsize(os.path.join(self.root, file_name)),
+                 "added": datetime.datetime.now().isoformat(timespec='seconds'), "metadata": metadata}
+        self.index["laps"] = [e for e in self.index["laps"] if e["id"] != lap_id] + [entry]
+        self._save_index()
+        return entry
+
+    def find(self, track=None, vehicle=None, driver=None):
+        """Entradas que contienen los textos dados (sin distinguir mayúsculas), de la más rápida a la más lenta."""
+        def match(value, pattern): return pattern is None or pattern.lower() in str(value).lower()
+        found = [e for e in self.index["laps"] if match(e["track"], track) and match(e["vehicle"], vehicle) and match(e["driver"], driver)]
+        return sorted(found, key=lambda e: e["lap_time"])
+
+    def get(self, lap_id):
+        return next((e for e in self.index["laps"] if e["id"] == lap_id), None)
+
+    def resolve(self, query):
+        """Id exacto o texto de pista/vehículo/piloto -> entrada más rápida que coincide (o None)."""
+        entry = self.get(query)
+        if entry is not None: return entry
+        q = query.lower()
+        found = [e for e in self.index["laps"] if q in f"{e['track']} {e['vehicle']} {e['driver']}".lower()]
+        return min(found, key=lambda e: e["lap_time"]) if found else None
+
+    def load_lap(self, entry_or_id, channels=None):
+        """DataFrame decodificado de una vuelta (Time relativo al inicio de la vuelta)."""
+        entry = self.get(entry_or_id) if isinstance(entry_or_id, str) else entry_or_id
+        if entry is None: raise KeyError(f"Vuelta de referencia no encontrada: {entry_or_id}")
+        wanted = [c for c in (channels or entry["channels"]) if c in entry["channels"]]
+        with np.load(os.path.join(self.root, entry["file"])) as npz:
+            data = {name: decode_channel(name, npz, entry["samples"]) for name in wanted}
+        df = pd.DataFrame(data)
+        df['Lap'] = entry["lap"]
+        return df
+
+    def remove(self, lap_id):
+        entry = self.get(lap_id)
+        if entry is None: return False
+        try: os.remove(os.path.join(self.root, entry["file"]))
+        except OSError: pass
+        self.index["laps"] = [e for e in self.index["laps"] if e["id"] != lap_id]
+        self._save_index()
+        return True
+
+
+def _format_lap_time(seconds):
+    if seconds is None or not np.isfinite(seconds): return "N/A"
+    minutes, rest = divmod(float(seconds), 60)
+    return f"{int(minutes):02d}:{rest:06.3f}"
+
+
+class LibraryLapSource:
+    """Fuente de vueltas (interfaz de cross_session) sobre una entrada de la biblioteca."""
+
+    def __init__(self, entry, library=None):
+        self.library = library or ReferenceLibrary(); self.entry = entry
+        self.path = f"{REFERENCE_PREFIX}{entry['id']}"
+        self.metadata = dict(entry.get("metadata") or {}, Driver=entry["driver"], Track=entry["track"], Vehicle=entry["vehicle"])
+        self.laps_info_df = pd.DataFrame([{"Lap": entry["lap"], "LapType": "Timed Lap", "LapTime": entry["lap_time"],
+                                           "FormattedTime": entry["formatted_time"], "IsTimeValid": True}])
+
+    def lap_frame(self, lap_number, channels=DEFAULT_LIBRARY_CHANNELS):
+        return self.library.load_lap(self.entry, channels)
+
+
+def open_reference_source(query, library=None):
+    """'ref:<id o texto>' (o sin prefijo) -> LibraryLapSource de la vuelta más rápida que coincide."""
+    library = library or ReferenceLibrary()
+    query = query[len(REFERENCE_PREFIX):] if query.startswith(REFERENCE_PREFIX) else query
+    entry = library.resolve(query)
+    if entry is None: raise KeyError(f"Sin vueltas de referencia para '{query}' en {library.root}")
+    return LibraryLapSource(entry, library)
+
+
+def add_session_laps(library, csv_path, lap_selector="best"):
+    """Carga un CSV y añade las vueltas elegidas ('best', 'valid' o números separados por coma)."""
+    from data_loader import load_telemetry_csv
+    from main import calculate_laps_improved, estimate_min_lap_time
+    df, metadata = load_telemetry_csv(csv_path)
+    if df is None: raise ValueError(f"No se pudo cargar {csv_path}")
+    laps_info_df = calculate_laps_improved(df, estimate_min_lap_time(metadata))
+    valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+    if lap_selector == "best": selected = valid.nsmallest(1, 'LapTime')
+    elif lap_selector == "valid": selected = valid
+    else: selected = laps_info_df[laps_info_df['Lap'].isin([int(x) for x in lap_selector.split(',')])]
+    entries = []
+    for row in selected.itertuples(index=False):
+        df_lap = df[df['Lap'] == row.Lap]
+        entries.append(library.add_lap(df_lap, metadata, int(row.Lap), float(row.LapTime), source=os.path.abspath(csv_path)))
+    return entries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Biblioteca de vueltas de referencia comprimidas.")
+    parser.add_argument("--library", default=None, help=f"Directorio de la biblioteca (por defecto {LIBRARY_DIR})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_add = sub.add_parser("add", help="Añade vueltas de un Telemetry.csv")
+    p_add.add_argument("csv"); p_add.add_argument("--laps", default="best", help="best, valid o números (coma)")
+    p_list = sub.add_parser("list", help="Lista las referencias")
+    p_list.add_argument("--track"); p_list.add_argument("--vehicle"); p_list.add_argument("--driver")
+    p_rm = sub.add_parser("remove", help="Borra una referencia")
+    p_rm.add_argument("lap_id")
+    args = parser.parse_args(argv)
+
+    library = ReferenceLibrary(args.library)
+    if args.command == "add":
+        entries = add_session_laps(library, args.csv, args.laps)
+        for e in entries: print(f"Añadida {e['id']}: {e['driver']} V{e['lap']} {e['formatted_time']} ({e['samples']} muestras, {e['bytes'] / 1024:.0f} KB)")
+        if not entries: print("Ninguna vuelta añadida.")
+    elif args.command == "list":
+        entries = library.find(args.track, args.vehicle, args.driver)
+        if not entries: print("Biblioteca vacía (o sin coincidencias).")
+        for e in entries:
+            print(f"{e['id']}  {e['formatted_time']}  {e['track'][:35]:<35} {e['vehicle'][:25]:<25} {e['driver'][:20]:<20} V{e['lap']:<3} {e['bytes'] / 1024:6.0f} KB")
+    else:
+        print("Borrada." if library.remove(args.lap_id) else f"Error: '{args.lap_id}' no encontrada.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
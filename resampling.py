@@ -0,0 +1,185 @@
+# resampling.py (Base de tiempo uniforme: detección de frecuencia, huecos/duplicados y remuestreo)
+#
+# Etapa opcional tras load_telemetry_csv. analyze_sampling mide la frecuencia efectiva
+# (mediana de dt), el jitter y marca duplicados (dt == 0), saltos atrás y huecos
+# (dt > GAP_FACTOR * mediana). resample_uniform lleva la sesión a una rejilla fija
+# t0 + k/fs: se calculan una sola vez los índices y pesos de la rejilla y todas las
+# columnas continuas se interpolan con un único gather 2D; Gear, Lap, booleanos y
+# columnas de texto mantienen el último valor (hold-last). Sobre la rejilla uniforme,
+# UniformTimeBase da el índice de un instante en O(1) sin búsquedas; viaja con la sesión
+# en df_u.attrs['time_base'] y lap_stats.lap_segments lo usa para cortar las vueltas.
+#
+# Uso:
+#   report = analyze_sampling(df); print(format_sampling_report(report))
+#   df_u, report = resample_uniform(df)              # Frecuencia detectada
+#   df_u, report = resample_uniform(df, rate_hz=60)
+#   i = report['time_base'].index_of(812.5)          # Fila de df_u en t=812.5 s
+#   python main.py --resample[=60]                   # o RENNSPORT_RESAMPLE=auto|60 (también batch.py --resample)
+
+import os
+
+from lazy_imports import lazy_import
+from profiling import profiled
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+GAP_FACTOR = 3.0 # dt > GAP_FACTOR * dt_mediano -> hueco
+HOLD_COLUMNS = ('Gear', 'Lap', 'BestLapNum', 'ABSLevel', 'TCLevel') # Discretas: se mantiene el último valor
+RESAMPLE_ENV = "RENNSPORT_RESAMPLE" # 'auto' o frecuencia en Hz
+MAX_REPORTED_GAPS = 10
+
+
+class UniformTimeBase:
+    """Rejilla t0 + k*dt (k = 0..n-1): conversión tiempo <-> índice en O(1), escalar o vectorizada."""
+
+    def __init__(self, t0, rate_hz, n):
+        self.t0 = float(t0); self.rate_hz = float(rate_hz); self.dt = 1.0 / self.rate_hz; self.n = int(n)
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return f"<UniformTimeBase t0={self.t0:.3f}s {self.rate_hz:g} Hz n={self.n}>"
+
+    @property
+    def times(self):
+        return self.t0 + np.arange(self.n) * self.dt
+
+    def index_of(self, t):
+        """Índice de la muestra más cercana a `t` (recortado a la rejilla)."""
+        idx = np.clip(np.rint((np.asarray(t, dtype=float) - self.t0) * self.rate_hz), 0, self.n - 1).astype(np.int64)
+        return int(idx) if idx.ndim == 0 else idx
+
+    def time_of(self, index):
+        return self.t0 + np.asarray(index) * self.dt
+
+    def searchsorted(self, t, side='left'):
+        """Como np.searchsorted(times, t, side) sin búsqueda (tolerancia de 1e-6 muestras; NaN -> n)."""
+        k = (np.asarray(t, dtype=float) - self.t0) * self.rate_hz
+        idx = np.ceil(k - 1e-6) if side == 'left' else np.floor(k + 1e-6) + 1
+        return np.clip(np.where(np.isnan(k), self.n, idx), 0, self.n).astype(np.int64)
+
+    def slice(self, t_start, t_end):
+        """slice de filas para el intervalo [t_start, t_end]."""
+        return slice(self.index_of(t_start), self.index_of(t_end) + 1)
+
+
+def analyze_sampling(df, time_col='Time'):
+    """
+    Frecuencia efectiva y problemas de muestreo de `Time`.
+
+    Returns:
+        dict: rate_hz, dt_median_s, jitter_pct (desviación típica de dt / mediana), samples, duration_s,
+        duplicates, backwards, gaps, gap_time_s, largest_gaps [(t_inicio, duración)], y máscaras por fila
+        (orden original) 'duplicate_mask' y 'gap_before_mask'.
+    """
+    t = df[time_col].to_numpy(dtype=float, na_value=np.nan)
+    n = len(t)
+    report = {'samples': n, 'rate_hz': None, 'dt_median_s': None, 'jitter_pct': None, 'duration_s': 0.0,
+              'duplicates': 0, 'backwards': 0, 'gaps': 0, 'gap_time_s': 0.0, 'largest_gaps': [],
+              'duplicate_mask': np.zeros(n, dtype=bool), 'gap_before_mask': np.zeros(n, dtype=bool)}
+    if n < 2: return report
+    dt = np.diff(t)
+    positive = dt[dt > 0]
+    if positive.size == 0: return report
+    dt_median = float(np.median(positive))
+    duplicate = np.concatenate([[False], dt == 0]); gap = np.concatenate([[False], dt > GAP_FACTOR * dt_median])
+    gap_idx = np.flatnonzero(gap)
+    order = gap_idx[np.argsort(dt[gap_idx - 1])[::-1][:MAX_REPORTED_GAPS]]
+    report.update(rate_hz=1.0 / dt_median, dt_median_s=dt_median, jitter_pct=float(np.std(positive) / dt_median * 100.0),
+                  duration_s=float(np.nanmax(t) - np.nanmin(t)), duplicates=int(duplicate.sum()), backwards=int((dt < 0).sum()),
+                  gaps=int(gap_idx.size), gap_time_s=float(dt[gap_idx - 1].sum()),
+                  largest_gaps=[(float(t[i - 1]), float(dt[i - 1])) for i in order],
+                  duplicate_mask=duplicate, gap_before_mask=gap)
+    return report
+
+
+def format_sampling_report(report):
+    """Resumen de una línea (más los huecos principales) de analyze_sampling."""
+    if not report.get('rate_hz'): return "Muestreo: sin datos de tiempo suficientes."
+    text = (f"Muestreo: {report['rate_hz']:.1f} Hz (dt {report['dt_median_s'] * 1000:.2f} ms, jitter {report['jitter_pct']:.1f}%), "
+            f"{report['duplicates']} duplicados, {report['backwards']} saltos atrás, {report['gaps']} huecos ({report['gap_time_s']:.2f} s)")
+    if report['largest_gaps']:
+        text += "\n  Huecos mayores: " + ", ".join(f"t={t0:.1f}s ({d:.2f}s)" for t0, d in report['largest_gaps'][:5])
+    return text
+
+
+def _rounded_rate(rate_hz):
+    """Frecuencia detectada redondeada a un entero (o a 0.1 Hz por debajo de 10 Hz)."""
+    return float(round(rate_hz)) if rate_hz >= 10 else round(rate_hz, 1)
+
+
+@profiled("resample_uniform")
+def resample_uniform(df, rate_hz=None, time_col='Time', hold_columns=HOLD_COLUMNS, report=None):
+    """
+    Remuestrea la sesión a una rejilla de tiempo fija.
+
+    Los duplicados de `Time` se descartan (se conserva la última muestra) y las filas se ordenan.
+    Las columnas numéricas continuas se interpolan linealmente; `hold_columns`, booleanos y texto
+    mantienen el último valor. En el instante de cambio de vuelta no se interpola entre vueltas
+    (LapDist no pasa por valores intermedios). La columna 'ResampleGap' marca los puntos de la
+    rejilla dentro de un hueco detectado. La UniformTimeBase queda también en resampled.attrs['time_base'].
+
+    Args:
+        rate_hz (float, opcional): Frecuencia de la rejilla; None = frecuencia detectada (redondeada).
+
+    Returns:
+        tuple: (DataFrame remuestreado, report de analyze_sampling + 'time_base' y 'resampled_rate_hz')
+    """
+    report = report or analyze_sampling(df, time_col)
+    if not report['rate_hz']: raise ValueError("No se puede detectar la frecuencia de muestreo (Time vacío o constante).")
+    rate_hz = float(rate_hz) if rate_hz else _rounded_rate(report['rate_hz'])
+    src = df.dropna(subset=[time_col]).sort_values(time_col, kind='stable')
+    src = src[~src[time_col].duplicated(keep='last')]
+    t = src[time_col].to_numpy(dtype=float)
+    time_base = UniformTimeBase(t[0], rate_hz, int(np.floor((t[-1] - t[0]) * rate_hz + 1e-9)) + 1)
+    grid = time_base.times
+
+    # Índices y pesos de la rejilla (compartidos por todas las columnas)
+    right = np.clip(np.searchsorted(t, grid, side='right'), 1, len(t) - 1)
+    left = right - 1
+    span_s = t[right] - t[left]
+    weight = np.clip((grid - t[left]) / np.where(span_s > 0, span_s, 1.0), 0.0, 1.0)
+    if 'Lap' in src.columns: # No interpolar a través del cambio de vuelta
+        laps = src['Lap'].to_numpy()
+        weight[laps[left] != laps[right]] = 0.0
+    hold_idx = np.where(weight >= 1.0, right, left) # Último valor conocido en cada punto
+
+    out = {time_col: grid}
+    linear_cols, hold_cols = [], []
+    for col in src.columns:
+        if col == time_col: continue
+        series = src[col]
+        is_linear = (col not in hold_columns and pd.api.types.is_numeric_dtype(series)
+                     and not pd.api.types.is_bool_dtype(series) and not isinstance(series.dtype, pd.BooleanDtype))
+        (linear_cols if is_linear else hold_cols).append(col)
+    if linear_cols:
+        values = src[linear_cols].to_numpy(dtype=float, na_value=np.nan)
+        w = weight[:, None]
+        interpolated = values[left] * (1.0 - w) + values[right] * w
+        exact = weight == 0.0 # Evita NaN*0 de la muestra derecha cuando no se usa
+        interpolated[exact] = values[left[exact]]
+        for k, col in enumerate(linear_cols): out[col] = interpolated[:, k]
+    for col in hold_cols:
+        out[col] = src[col].iloc[hold_idx].to_numpy()
+    out['ResampleGap'] = span_s > GAP_FACTOR * report['dt_median_s']
+    resampled = pd.DataFrame(out, columns=[time_col] + [c for c in src.columns if c != time_col] + ['ResampleGap'])
+    for col in hold_cols: # Conservar tipos (Int, boolean nullable, texto)
+        resampled[col] = resampled[col].astype(src[col].dtype)
+    resampled.attrs['time_base'] = time_base
+    report = dict(report, time_base=time_base, resampled_rate_hz=rate_hz)
+    return resampled, report
+
+
+def resample_setting(argv=None):
+    """Frecuencia pedida: '--resample[=HZ]' en argv o RENNSPORT_RESAMPLE ('auto' -> 'auto', número -> float, sin valor -> None)."""
+    value = None
+    for arg in argv or ():
+        if arg == '--resample': value = 'auto'
+        elif arg.startswith('--resample='): value = arg.split('=', 1)[1]
+    value = value or os.environ.get(RESAMPLE_ENV, '').strip() or None
+    if value is None or value.lower() in ('0', 'off', 'no'): return None
+    if value.lower() == 'auto': return 'auto'
+    try: return float(value)
+    except ValueError: print(f"Adv: Frecuencia de remuestreo inválida '{value}'; se usa la detectada."); return 'auto'
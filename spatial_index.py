@@ -0,0 +1,156 @@
+# spatial_index.py (Índice espacial de rejilla para alinear vueltas por posición GPS)
+#
+# LapDist puede derivar, reiniciarse tarde o cambiar tras una salida de pista. La
+# alineación por posición asigna a cada muestra la distancia del punto más cercano de
+# la trazada de referencia. La búsqueda usa una rejilla uniforme (celdas de
+# DEFAULT_CELL_SIZE_M) consultada por lotes en el vecindario 3x3 de cada punto; los
+# puntos sin un candidato a menos de una celda (lejos de la trazada) pasan a rejillas
+# más gruesas y, en último término, a fuerza bruta.
+
+import numpy as np
+import pandas as pd
+
+from track_map import project_latlon
+
+DEFAULT_CELL_SIZE_M = 8.0 # Tamaño de celda de la rejilla (m)
+REFERENCE_SPACING_M = 1.0 # La trazada de referencia se diezma a ~1 punto por metro antes de indexarla
+QUERY_MAX_CANDIDATES = 4_000_000 # Candidatos máximos por lote de consultas (limita memoria)
+COARSE_LEVELS = 2 # Rejillas más gruesas antes de recurrir a fuerza bruta
+
+
+class GridSpatialIndex:
+    """
+    Índice de rejilla uniforme sobre puntos 2D (x, y) en metros, con consulta por lotes del vecino más cercano.
+
+    Los puntos se guardan ordenados por celda (inicio y número de puntos por celda ocupada). Una consulta
+    revisa las 9 celdas vecinas; el resultado es exacto si el candidato está a menos de una celda. Las
+    consultas no resueltas pasan a una rejilla 4 veces más gruesa y, en último término, a fuerza bruta.
+    """
+
+    def __init__(self, x, y, cell_size_m=DEFAULT_CELL_SIZE_M, _point_ids=None, _levels=COARSE_LEVELS):
+        x = np.asarray(x, dtype=float); y = np.asarray(y, dtype=float)
+        ok = np.isfinite(x) & np.isfinite(y)
+        self.point_ids = np.flatnonzero(ok) if _point_ids is None else _point_ids[ok] # Índices en los arrays originales
+        self.x, self.y = x[ok], y[ok]
+        if self.x.size == 0: raise ValueError("Índice espacial sin puntos válidos.")
+        self.cell = float(cell_size_m); self._levels = _levels; self._coarse = None
+        self.x0, self.y0 = self.x.min(), self.y.min()
+        cx, cy = self._cell_coords(self.x, self.y)
+        self.ny = int(cy.max()) + 3 # Margen para los vecinos del borde
+        keys = self._cell_key(cx, cy)
+        order = np.argsort(keys, kind='stable')
+        self.x, self.y, self.point_ids = self.x[order], self.y[order], self.point_ids[order]
+        self.cell_keys, self.cell_start, self.cell_count = np.unique(keys[order], return_index=True, return_counts=True)
+        self.max_per_cell = int(self.cell_count.max())
+
+    def _cell_coords(self, x, y):
+        return np.floor((x - self.x0) / self.cell).astype(np.int64) + 1, np.floor((y - self.y0) / self.cell).astype(np.int64) + 1
+
+    def _cell_key(self, cx, cy):
+        return cx * self.ny + cy
+
+    def _brute_force(self, qx, qy):
+        """Vecino más cercano por fuerza bruta (posición en los arrays internos)."""
+        idx = np.empty(len(qx), dtype=np.int64)
+        step = max(1, QUERY_MAX_CANDIDATES // self.x.size)
+        for s in range(0, len(qx), step):
+            d2 = (qx[s:s + step, None] - self.x[None, :]) ** 2 + (qy[s:s + step, None] - self.y[None, :]) ** 2
+            idx[s:s + step] = np.argmin(d2, axis=1)
+        return idx
+
+    def _query_internal(self, px, py):
+        """Vecino más cercano (posición interna) de cada consulta finita."""
+        nearest = np.full(len(px), -1, dtype=np.int64); best_d2 = np.full(len(px), np.inf)
+        offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+        chunk = max(256, QUERY_MAX_CANDIDATES // (9 * max(1, int(self.cell_count.mean() + 1))))
+        for s in range(0, len(px), chunk):
+            qx, qy = px[s:s + chunk], py[s:s + chunk]; m = len(qx)
+            cx, cy = self._cell_coords(qx, qy)
+            ncx, ncy = cx[:, None] + offsets[None, :, 0], cy[:, None] + offsets[None, :, 1]
+            keys = self._cell_key(ncx, ncy) # (m, 9)
+            pos = np.clip(np.searchsorted(self.cell_keys, keys), 0, len(self.cell_keys) - 1)
+            found = (self.cell_keys[pos] == keys) & (ncy >= 0) & (ncy < self.ny) # Evita alias de claves fuera de rango
+            counts = np.where(found, self.cell_count[pos], 0).ravel()
+            total = counts.sum()
+            if total == 0: continue
+            # Candidatos en formato plano (sin relleno): consulta de origen + índice de punto
+            offsets_flat = np.repeat(np.cumsum(counts) - counts, counts)
+            cand = np.repeat(self.cell_start[pos].ravel(), counts) + np.arange(total) - offsets_flat
+            qid = np.repeat(np.repeat(np.arange(m), 9), counts)
+            d2 = (self.x[cand] - qx[qid]) ** 2 + (self.y[cand] - qy[qid]) ** 2
+            per_query = np.bincount(qid, minlength=m)
+            has = per_query > 0
+            seg_starts = (np.cumsum(per_query) - per_query)[has]
+            min_d2 = np.full(m, np.inf); min_d2[has] = np.minimum.reduceat(d2, seg_starts)
+            hit = np.flatnonzero(d2 == min_d2[qid])
+            first_q, first_pos = np.unique(qid[hit], return_index=True)
+            nearest[s + first_q] = cand[hit[first_pos]]; best_d2[s:s + m] = min_d2
+        # Exacto solo si el candidato está a <= 1 celda (fuera del 3x3 todo está más lejos)
+        unresolved = np.flatnonzero(best_d2 > self.cell ** 2)
+        if unresolved.size:
+            if self._levels > 0:
+                if self._coarse is None:
+                    self._coarse = GridSpatialIndex(self.x, self.y, self.cell * 4, _point_ids=np.arange(self.x.size), _levels=self._levels - 1)
+                coarse_idx = self._coarse._query_internal(px[unresolved], py[unresolved])
+                nearest[unresolved] = self._coarse.point_ids[coarse_idx]
+            else:
+                nearest[unresolved] = self._brute_force(px[unresolved], py[unresolved])
+        return nearest
+
+    def query(self, qx, qy):
+        """
+        Vecino más cercano de cada consulta.
+
+        Returns:
+            tuple: (índices en los arrays originales pasados al constructor, distancia en m); -1/NaN si la consulta no es finita.
+        """
+        qx = np.asarray(qx, dtype=float); qy = np.asarray(qy, dtype=float)
+        result_idx = np.full(len(qx), -1, dtype=np.int64); result_dist = np.full(len(qx), np.nan)
+        valid = np.flatnonzero(np.isfinite(qx) & np.isfinite(qy))
+        if valid.size == 0: return result_idx, result_dist
+        nearest = self._query_internal(qx[valid], qy[valid])
+        result_idx[valid] = self.point_ids[nearest]
+        result_dist[valid] = np.hypot(self.x[nearest] - qx[valid], self.y[nearest] - qy[valid])
+        return result_idx, result_dist
+
+
+def gps_xy(df, origin):
+    """Coordenadas locales (m) de las muestras de df a partir de Latitude/Longitude."""
+    return project_latlon(df['Latitude'].to_numpy(dtype=float, na_value=np.nan),
+                          df['Longitude'].to_numpy(dtype=float, na_value=np.nan), origin)
+
+
+def position_aligned_distance(ref_lap_df, laps_df, lap_col='Lap', dist_col='LapDist', cell_size_m=DEFAULT_CELL_SIZE_M):
+    """
+    Distancia corregida por posición para cada fila de `laps_df`: LapDist del punto más cercano de la vuelta de referencia.
+
+    Las muestras que casan con el otro extremo de la referencia (cerca de la línea de meta) se desplazan
+    una longitud de vuelta para mantener la continuidad dentro de cada vuelta.
+
+    Returns:
+        np.ndarray: Distancia corregida (NaN donde no hay GPS).
+    """
+    ref = ref_lap_df[['Latitude', 'Longitude', dist_col]].dropna()
+    ref = ref[(ref['Latitude'] != 0) | (ref['Longitude'] != 0)]
+    if ref.empty: raise ValueError("La vuelta de referencia no tiene datos GPS.")
+    origin = (float(ref['Latitude'].iloc[0]), float(ref['Longitude'].iloc[0]))
+    ref_x, ref_y = gps_xy(ref, origin)
+    ref_dist = ref[dist_col].to_numpy(dtype=float)
+    _, keep = np.unique(np.floor(ref_dist / REFERENCE_SPACING_M), return_index=True) # Menos candidatos por celda
+    ref_x, ref_y, ref_dist = ref_x[keep], ref_y[keep], ref_dist[keep]
+    index = GridSpatialIndex(ref_x, ref_y, cell_size_m)
+
+    qx, qy = gps_xy(laps_df, origin)
+    idx, _ = index.query(qx, qy)
+    corrected = np.where(idx >= 0, ref_dist[np.maximum(idx, 0)], np.nan)
+
+    # Continuidad en la línea de meta: saltos de más de media vuelta entre muestras consecutivas
+    # de la misma vuelta se deshacen, y luego cada vuelta se desplaza para que su mediana caiga en [0, L)
+    lap_length = float(np.nanmax(ref_dist))
+    laps = laps_df[lap_col].to_numpy()
+    step = np.zeros(len(corrected)); step[1:] = np.diff(corrected)
+    jump = np.where(step < -lap_length / 2, lap_length, np.where(step > lap_length / 2, -lap_length, 0.0))
+    jump[0] = 0.0; jump[1:][laps[1:] != laps[:-1]] = 0.0
+    unwrapped = corrected + pd.Series(jump).groupby(laps).cumsum().to_numpy()
+    median = pd.Series(unwrapped).groupby(laps).transform('median').to_numpy()
+    return unwrapped - lap_length * np.floor(median / lap_length)
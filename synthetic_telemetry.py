@@ -0,0 +1,241 @@
+# synthetic_telemetry.py (Generador de Telemetry.csv sintéticos en formato Rennsport)
+#
+# Genera sesiones realistas (bloque de metadatos + columnas completas de RENAME_MAP)
+# para benchmarks y pruebas sin depender de exportaciones reales.
+#
+# Uso:
+#   python synthetic_telemetry.py salida.csv --laps 30 --rate 60
+#   python synthetic_telemetry.py grande.csv --target-size-mb 2048
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import RENAME_MAP
+
+DEFAULT_TRACK_NAME = "Hockenheimring (GP)"
+DEFAULT_TRACK_LENGTH_M = 4574.0
+DEFAULT_VEHICLE = "Porsche 911 GT3 R"
+DEFAULT_DRIVER = "Synthetic Driver"
+TRACK_ORIGIN_LATLON = (49.3278, 8.5656) # Hockenheim (aprox.)
+WHEEL_RADIUS_M = 0.34
+EARTH_RADIUS_M = 6371000.0
+
+# Curvas: (posición relativa en la vuelta, velocidad mínima Kmh, anchura relativa, signo giro)
+_CORNERS = [
+    (0.05, 80.0, 0.028, 1), (0.18, 130.0, 0.032, -1), (0.31, 60.0, 0.025, 1),
+    (0.47, 95.0, 0.030, -1), (0.58, 70.0, 0.026, 1), (0.70, 115.0, 0.032, 1),
+    (0.82, 65.0, 0.025, -1), (0.93, 100.0, 0.028, 1),
+]
+_GEAR_UPSHIFT_KMH = np.array([0.0, 80.0, 115.0, 150.0, 185.0, 220.0, 255.0]) # Marcha N a partir de este umbral
+_GEAR_RATIOS = np.array([3.3, 2.4, 1.9, 1.55, 1.3, 1.12, 1.0])
+_FINAL_DRIVE = 3.4
+
+# Columnas CSV de salida (nombres originales). Se omite el alias con typo de RPM.
+CSV_COLUMNS = [c for c in RENAME_MAP if c != 'Engine Revolituions Per Minute (RPM)']
+BOOL_CSV_COLUMNS = ['Is lap valid', 'ABS Active', 'ABS Enabled', 'Traction Control Active',
+                    'Traction Control Enabled', 'Speed Limiter On', 'Driver Marker']
+
+
+def _speed_profile_kmh(dist_pct, vmax_kmh, corner_scale):
+    """Velocidad objetivo (Kmh) en función de la fracción de vuelta."""
+    speed = np.full_like(dist_pct, vmax_kmh)
+    for pos, vmin, width, _ in _CORNERS:
+        d = np.abs(dist_pct - pos); d = np.minimum(d, 1.0 - d) # Distancia circular
+        speed -= (vmax_kmh - vmin * corner_scale) * np.exp(-(d / width) ** 2 * 0.5) * np.clip(1.2 - d / (4 * width), 0, 1)
+    return np.maximum(speed, 50.0)
+
+
+def _curvature(dist_pct, track_length_m):
+    """Curvatura con signo (1/m) a lo largo de la vuelta."""
+    curv = np.zeros_like(dist_pct)
+    for pos, vmin, width, sign in _CORNERS:
+        d = dist_pct - pos; d = (d + 0.5) % 1.0 - 0.5
+        radius = max(25.0, (vmin / 3.6) ** 2 / (2.2 * 9.81)) # Radio compatible con ~2.2 g laterales
+        curv += sign / radius * np.exp(-(d / (0.4 * width)) ** 2 * 0.5) # Más estrecha que la frenada
+    return curv
+
+
+def _track_xy(dist_pct, track_length_m):
+    """Trazado cerrado (x, y en metros) con longitud aproximada track_length_m."""
+    theta = 2 * np.pi * dist_pct
+    a = track_length_m / (2 * np.pi) * 1.25; b = a * 0.45
+    x = a * np.cos(theta) + 0.08 * a * np.sin(3 * theta)
+    y = b * np.sin(theta) + 0.12 * b * np.cos(5 * theta)
+    return x, y
+
+
+def generate_lap_frame(lap_number, lap_start_time, rate_hz, track_length_m, rng,
+                       start_pct=0.0, end_pct=1.0, pace=1.0, is_valid=True, fuel_start=60.0,
+                       wear_start=0.0, tyre_temp_offset=0.0):
+    """
+    Genera las muestras de una vuelta (o fracción [start_pct, end_pct)) como
+    DataFrame con los nombres de columna originales del CSV.
+
+    Returns:
+        tuple: (pandas.DataFrame, float) DataFrame y tiempo final de la vuelta.
+    """
+    # 1) Perfil en distancia fina -> tiempo acumulado
+    n_fine = max(200, int(track_length_m * (end_pct - start_pct) / 2.0))
+    pct_fine = np.linspace(start_pct, end_pct, n_fine, endpoint=False)
+    v_fine = _speed_profile_kmh(pct_fine, 240.0 * pace, pace) * (1 + rng.normal(0, 0.004, n_fine).cumsum() / np.sqrt(n_fine))
+    v_fine = np.maximum(v_fine, 40.0)
+    dd = track_length_m * (end_pct - start_pct) / n_fine
+    t_fine = np.concatenate([[0.0], np.cumsum(dd / (v_fine[:-1] / 3.6))])
+    duration = t_fine[-1] + dd / (v_fine[-1] / 3.6)
+
+    # 2) Muestreo uniforme en tiempo
+    n = max(2, int(duration * rate_hz))
+    t_rel = np.arange(n) / rate_hz
+    pct = np.interp(t_rel, t_fine, pct_fine)
+    speed_kmh = np.interp(t_rel, t_fine, v_fine)
+    speed_ms = speed_kmh / 3.6
+    lap_dist = pct * track_length_m
+
+    acc_lon = np.gradient(speed_ms, 1.0 / rate_hz)
+    curv = _curvature(pct, track_length_m)
+    acc_lat = speed_ms ** 2 * curv
+    throttle = np.clip(acc_lon / 6.0 + 0.35, 0, 1); throttle[acc_lon < -2.0] = 0.0
+    throttle = np.where(acc_lon > 0.5, np.maximum(throttle, 0.98), throttle)
+    brake = np.clip(-acc_lon / 15.0, 0, 1); brake[acc_lon > -2.0] = 0.0
+    gear = np.searchsorted(_GEAR_UPSHIFT_KMH, speed_kmh, side='right').astype(np.int64)
+    wheel_rpm = speed_ms / (2 * np.pi * WHEEL_RADIUS_M) * 60.0
+    rpm = np.clip(wheel_rpm * _GEAR_RATIOS[gear - 1] * _FINAL_DRIVE, 2500, 9200) + rng.normal(0, 15, n)
+    steer = np.degrees(np.arctan(2.7 * curv)) * 14.0 + rng.normal(0, 0.3, n)
+    x, y = _track_xy(pct, track_length_m)
+    lat0, lon0 = TRACK_ORIGIN_LATLON
+    lat = lat0 + np.degrees(y / EARTH_RADIUS_M)
+    lon = lon0 + np.degrees(x / (EARTH_RADIUS_M * np.cos(np.radians(lat0))))
+    yaw = np.unwrap(np.arctan2(np.gradient(y), np.gradient(x)))
+    time_abs = lap_start_time + t_rel
+    fuel = fuel_start - np.cumsum(throttle) / rate_hz * 0.032
+    abs_active = brake > 0.85
+    tc_active = (throttle > 0.9) & (acc_lon > 4.0) & (gear <= 3)
+
+    cols = {
+        'Time (s)': time_abs, 'Server Time (s)': time_abs + 1000.0, 'Lap Number': np.full(n, lap_number),
+        'Current Lap Distance (m)': lap_dist, 'Current Lap Distance Pct': pct,
+        'Best Lap Time (s)': np.full(n, np.nan), 'Best Lap Number': np.full(n, -1),
+        'Is lap valid': np.full(n, is_valid),
+        'Throttle Pedal Pos': throttle, 'Brake Pedal Pos': brake, 'Clutch Pedal Pos': np.zeros(n),
+        'Steering Wheel Angle (deg)': steer, 'Steering Shaft Torque (Nm)': steer * 0.08,
+        'Normalized Steering Shaft Torque': np.clip(steer / 120.0, -1, 1), 'Gear Index': gear,
+        'Speed (m/s)': speed_ms, 'Speed (Kmh)': speed_kmh,
+        'Lateral Acceleration (m/s^2)': acc_lat, 'Longitudinal Acceleration (m/s^2)': acc_lon,
+        'Vertical Acceleration (m/s^2)': rng.normal(0, 0.6, n),
+        'Rotation Pitch (rad)': -acc_lon * 0.0015, 'Rotation Pitch Rate (rad/s)': np.gradient(-acc_lon * 0.0015) * rate_hz,
+        'Rotation Roll (rad)': acc_lat * 0.002, 'Rotation Roll Rate (rad/s)': np.gradient(acc_lat * 0.002) * rate_hz,
+        'Rotation Yaw (rad)': yaw, 'Rotation Yaw Rate (rad/s)': np.gradient(yaw) * rate_hz,
+        'Engine Revolutions Per Minute (RPM)': rpm, 'Fuel Level (l)': fuel,
+        'Altitude (m)': 100.0 + 4.0 * np.sin(2 * np.pi * pct), 'Latitude (deg)': lat, 'Longitude (deg)': lon,
+        'ABS Active': abs_active, 'ABS Enabled': np.full(n, True), 'ABS Level': np.full(n, 4),
+        'Traction Control Active': tc_active, 'Traction Control Enabled': np.full(n, True), 'Traction Control Level': np.full(n, 3),
+        'Speed Limiter On': np.full(n, False), 'Brake Bias': np.full(n, 56.5), 'Driver Marker': np.full(n, False),
+    }
+    # Ruedas: temperatura sube con carga, presión con temperatura, desgaste acumulado
+    load = np.abs(acc_lat) / 20.0 + np.abs(acc_lon) / 25.0
+    for corner, side, axle in (('LF', 1, 1), ('RF', -1, 1), ('LR', 1, -1), ('RR', -1, -1)):
+        corner_load = load + 0.02 * side * np.sign(acc_lat) + 0.01 * axle * np.sign(-acc_lon)
+        temp_surface = 82.0 + tyre_temp_offset + 25.0 * corner_load + rng.normal(0, 0.5, n)
+        temp_inner = 85.0 + tyre_temp_offset + 0.6 * (temp_surface - 82.0)
+        slip = 1.0 + np.where(brake > 0.6, -0.06 * brake, 0.0) + np.where((axle < 0) & (throttle > 0.95), 0.02, 0.0)
+        cols[f'{corner} Ride Height (m)'] = 0.055 + 0.004 * axle * np.sign(acc_lon) * 0.5 + rng.normal(0, 0.0005, n)
+        cols[f'{corner} Pressure (kPa)'] = 165.0 + 0.45 * (temp_inner - 85.0)
+        cols[f'{corner} Inner Average Temperature (C)'] = temp_inner
+        cols[f'{corner} Surface Average Temperature (C)'] = temp_surface
+        cols[f'{corner} Wear'] = wear_start + np.cumsum(corner_load) / rate_hz * 1e-5
+        cols[f'{corner} Slip Angle (rad)'] = np.arctan(2.7 * curv) * (0.12 if axle > 0 else 0.10) + rng.normal(0, 0.002, n)
+        cols[f'{corner} Revolutions per minute (RPM)'] = wheel_rpm * slip
+
+    df = pd.DataFrame({c: cols[c] for c in CSV_COLUMNS})
+    return df, lap_start_time + duration
+
+
+def _format_header(metadata):
+    """Bloque de metadatos estilo Rennsport ('Clave:;Valor')."""
+    lines = ["Rennsport Telemetry Export;"]
+    lines += [f"{key}:;{value}" for key, value in metadata.items()]
+    lines.append("")
+    return "\n".join(lines) + "\n"
+
+
+def generate_session_csv(filepath, n_laps=10, rate_hz=60, track_length_m=DEFAULT_TRACK_LENGTH_M,
+                         target_size_mb=None, seed=42, invalid_lap_ratio=0.1,
+                         driver=DEFAULT_DRIVER, vehicle=DEFAULT_VEHICLE, track_name=DEFAULT_TRACK_NAME, verbose=True):
+    """
+    Escribe un Telemetry.csv sintético: out lap parcial, `n_laps` vueltas
+    cronometradas e in lap parcial. Si `target_size_mb` se indica, se generan
+    vueltas hasta alcanzar ese tamaño (ignora n_laps). Escribe vuelta a vuelta,
+    por lo que la memoria usada no depende del tamaño final.
+
+    Returns:
+        dict: Resumen {'path', 'rows', 'laps', 'bytes', 'seconds'}.
+    """
+    rng = np.random.default_rng(seed)
+    metadata = {
+        "Driver": driver, "Vehicle": vehicle, "Track": f"{track_name} ({track_length_m:.0f} m)",
+        "Track Length M": f"{track_length_m:.0f}", "Date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "Session": "Practice", "Sample Rate Hz": str(rate_hz),
+    }
+    target_bytes = target_size_mb * 1024 * 1024 if target_size_mb else None
+    t0 = time.perf_counter(); rows = 0; lap_number = 1; t_now = 0.0
+    fuel = 80.0; wear = 0.0; temp_offset = -10.0
+
+    with open(filepath, 'w', encoding='utf-8', newline='') as f:
+        f.write(_format_header(metadata))
+        f.write(";".join(CSV_COLUMNS) + "\n")
+
+        def write_lap(df):
+            for col in BOOL_CSV_COLUMNS: df[col] = np.where(df[col].to_numpy(dtype=bool), 'True', 'False')
+            df.to_csv(f, sep=';', header=False, index=False, float_format='%.5f', lineterminator='\n')
+            return len(df)
+
+        # Out lap (desde ~60% de la vuelta)
+        df, t_now = generate_lap_frame(lap_number, t_now, rate_hz, track_length_m, rng, start_pct=0.6, pace=0.9,
+                                       fuel_start=fuel, wear_start=wear, tyre_temp_offset=temp_offset)
+        fuel = float(df['Fuel Level (l)'].iloc[-1]); wear = float(df['LF Wear'].iloc[-1]); rows += write_lap(df); lap_number += 1
+
+        while True:
+            if target_bytes is None and lap_number > n_laps + 1: break
+            if target_bytes is not None and f.tell() >= target_bytes: break
+            pace = 1.0 - abs(rng.normal(0, 0.006))
+            is_valid = bool(rng.random() >= invalid_lap_ratio)
+            temp_offset = min(0.0, temp_offset + 4.0)
+            df, t_now = generate_lap_frame(lap_number, t_now, rate_hz, track_length_m, rng, pace=pace, is_valid=is_valid,
+                                           fuel_start=fuel, wear_start=wear, tyre_temp_offset=temp_offset)
+            fuel = max(0.0, float(df['Fuel Level (l)'].iloc[-1])); wear = float(df['LF Wear'].iloc[-1])
+            rows += write_lap(df); lap_number += 1
+            if verbose and (lap_number % 10 == 0): print(f"  ... {lap_number - 1} vueltas, {f.tell() / 1e6:.1f} MB")
+
+        # In lap (hasta ~40% de la vuelta)
+        df, t_now = generate_lap_frame(lap_number, t_now, rate_hz, track_length_m, rng, end_pct=0.4, pace=0.85,
+                                       fuel_start=fuel, wear_start=wear)
+        rows += write_lap(df)
+        size = f.tell()
+
+    summary = {"path": filepath, "rows": rows, "laps": lap_number, "bytes": size, "seconds": time.perf_counter() - t0}
+    if verbose: print(f"CSV sintético generado: {filepath} ({rows} filas, {lap_number} vueltas, {size / 1e6:.1f} MB, {summary['seconds']:.1f} s)")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un Telemetry.csv sintético en formato Rennsport.")
+    parser.add_argument("output", help="Ruta del CSV a generar")
+    parser.add_argument("--laps", type=int, default=10, help="Vueltas cronometradas (además de out/in lap)")
+    parser.add_argument("--rate", type=float, default=60, help="Frecuencia de muestreo en Hz")
+    parser.add_argument("--track-length", type=float, default=DEFAULT_TRACK_LENGTH_M, help="Longitud de pista (m)")
+    parser.add_argument("--target-size-mb", type=float, default=None, help="Generar vueltas hasta alcanzar este tamaño (MB)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    out_dir = os.path.dirname(os.path.abspath(args.output)); os.makedirs(out_dir, exist_ok=True)
+    generate_session_csv(args.output, n_laps=args.laps, rate_hz=args.rate, track_length_m=args.track_length,
+                         target_size_mb=args.target_size_mb, seed=args.seed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+# track_map.py (Mapa de pista desde GPS: proyección local métrica con línea central en caché por circuito)
+#
+# Latitude/Longitude se proyectan a metros con una proyección equirectangular local
+# (origen = primer punto de la línea central). La línea central (x, y sobre una rejilla
+# de distancia) se calcula una vez por circuito y se guarda en CACHE_DIR/track_maps/,
+# con clave 'Track' + hash de la extensión GPS (distintos trazados con el mismo nombre no
+# comparten caché; sin 'Track' no se guarda).
+# Las vueltas se dibujan re-muestreadas por distancia (trazado diezmado).
+
+import hashlib
+import os
+import re
+
+from app_cache import load_json_cache, save_json_cache
+from lap_alignment import align_session_laps, build_distance_grid
+from lazy_imports import lazy_import
+from profiling import profiled
+
+np = lazy_import('numpy')
+
+EARTH_RADIUS_M = 6371000.0
+CENTERLINE_STEP_M = 2.0 # Resolución de la línea central en caché
+MAP_STEP_M = 4.0 # Resolución del trazado dibujado (diezmado)
+TRACK_MAP_CACHE_DIR = "track_maps"
+TRACK_MAP_CACHE_VERSION = 1
+GPS_KEY_DECIMALS = 3 # Redondeo (~100 m) de la extensión GPS en la clave de caché
+
+
+def project_latlon(lat, lon, origin):
+    """Proyección equirectangular local: grados -> metros (x Este, y Norte) respecto a `origin` (lat0, lon0)."""
+    lat0, lon0 = origin
+    x = np.radians(np.asarray(lon, dtype=float) - lon0) * EARTH_RADIUS_M * np.cos(np.radians(lat0))
+    y = np.radians(np.asarray(lat, dtype=float) - lat0) * EARTH_RADIUS_M
+    return x, y
+
+
+def has_gps(df):
+    """True si hay Latitude/Longitude con valores no nulos."""
+    if 'Latitude' not in df.columns or 'Longitude' not in df.columns: return False
+    lat = df['Latitude'].to_numpy(dtype=float, na_value=np.nan)
+    return bool(np.any(np.isfinite(lat) & (lat != 0)))
+
+
+def gps_extent(df):
+    """(lat_min, lat_max, lon_min, lon_max) de las muestras GPS válidas, o None."""
+    lat = df['Latitude'].to_numpy(dtype=float, na_value=np.nan); lon = df['Longitude'].to_numpy(dtype=float, na_value=np.nan)
+    ok = np.isfinite(lat) & np.isfinite(lon) & (lat != 0)
+    if not ok.any(): return None
+    return float(lat[ok].min()), float(lat[ok].max()), float(lon[ok].min()), float(lon[ok].max())
+
+
+def track_cache_key(metadata, df):
+    """Archivo de caché del circuito: slug de 'Track' + hash de la extensión GPS. None (sin caché) si falta 'Track' o GPS."""
+    track = str((metadata or {}).get('Track') or '').strip()
+    slug = re.sub(r'[^a-z0-9]+', '_', track.lower()).strip('_')
+    extent = gps_extent(df) if slug and has_gps(df) else None
+    if extent is None: return None
+    digest = hashlib.sha1(",".join(f"{v:.{GPS_KEY_DECIMALS}f}" for v in extent).encode('ascii')).hexdigest()[:10]
+    return os.path.join(TRACK_MAP_CACHE_DIR, f"{slug}_{digest}.json")
+
+
+def _reference_lap(df, laps_info_df=None):
+    """Vuelta usada para la línea central: la más rápida válida o, si no hay, la que tiene más muestras."""
+    if laps_info_df is not None and not laps_info_df.empty:
+        valid = laps_info_df[laps_info_df['IsTimeValid'] & (laps_info_df['LapType'] == 'Timed Lap')]
+        if not valid.empty: return int(valid.loc[valid['LapTime'].idxmin(), 'Lap'])
+    return int(df['Lap'].value_counts().idxmax())
+
+
+@profiled("track_centerline")
+def get_track_centerline(df, metadata, laps_info_df=None, refresh=False, verbose=True):
+    """
+    Línea central proyectada del circuito (desde caché si existe; sin caché si falta 'Track').
+
+    Returns:
+        dict: {'origin': [lat0, lon0], 'step_m', 'dist', 'x', 'y', 'source_lap'} o None si no hay GPS.
+    """
+    key = track_cache_key(metadata, df)
+    if key is not None and not refresh:
+        cached = load_json_cache(key)
+        if cached and cached.get('version') == TRACK_MAP_CACHE_VERSION:
+            if verbose: print(f"Línea central de pista desde caché: {key}")
+            for name in ('dist', 'x', 'y'): cached[name] = np.asarray(cached[name], dtype=float)
+            return cached
+    if not has_gps(df): print("Adv: Sin datos GPS (Latitude/Longitude) para el mapa de pista."); return None
+
+    lap = _reference_lap(df, laps_info_df)
+    grid, aligned, _ = align_session_laps(df, [lap], ('Latitude', 'Longitude'), grid_step=CENTERLINE_STEP_M)
+    lat, lon = aligned['Latitude'][0], aligned['Longitude'][0]
+    ok = np.isfinite(lat) & np.isfinite(lon)
+    if ok.sum() < 10: print("Adv: Datos GPS insuficientes para la línea central."); return None
+    origin = (float(lat[ok][0]), float(lon[ok][0]))
+    x, y = project_latlon(lat[ok], lon[ok], origin)
+    centerline = {'version': TRACK_MAP_CACHE_VERSION, 'track': metadata.get('Track', ''), 'origin': list(origin),
+                  'step_m': CENTERLINE_STEP_M, 'source_lap': lap, 'dist': np.round(grid[ok], 2).tolist(),
+                  'x': np.round(x, 2).tolist(), 'y': np.round(y, 2).tolist()}
+    if key is not None: save_json_cache(key, centerline)
+    if verbose: print(f"Línea central calculada (V{lap}, {ok.sum()} puntos)" + (f" y guardada en caché: {key}" if key else " (sin 'Track' en metadatos: no se guarda en caché)"))
+    for name in ('dist', 'x', 'y'): centerline[name] = np.asarray(centerline[name], dtype=float)
+    return centerline
+
+
+@profiled("track_map_paths")
+def lap_map_paths(df, lap_numbers, channels, centerline, step_m=MAP_STEP_M):
+    """
+    Trazados diezmados (x, y + canales) de varias vueltas, re-muestreados cada `step_m` metros.
+
+    Returns:
+        tuple: (grid, x (n_laps, n), y (n_laps, n), {canal: (n_laps, n)})
+    """
+    channels = [c for c in channels if c in df.columns and c not in ('Latitude', 'Longitude')]
+    grid = build_distance_grid(float(centerline['dist'][-1]), step_m)
+    grid, aligned, _ = align_session_laps(df, lap_numbers, ['Latitude', 'Longitude'] + channels, grid=grid)
+    x, y = project_latlon(aligned['Latitude'], aligned['Longitude'], centerline['origin'])
+    return grid, x, y, {c: aligned[c] for c in channels}
+
+
+def lap_time_delta(df, lap_number, reference_lap_number, grid):
+    """Delta de tiempo (s) de `lap_number` respecto a la referencia sobre la rejilla de distancia (>0 = más lento)."""
+    _, aligned, _ = align_session_laps(df, [lap_number, reference_lap_number], ('Time',), grid=grid)
+    elapsed = aligned['Time'] - np.nanmin(aligned['Time'], axis=1, keepdims=True)
+    return elapsed[0] - elapsed[1]
@@ -0,0 +1,204 @@
+# tyre_analysis.py (Análisis de neumáticos en las 4 ruedas: ventanas de temperatura/presión, desgaste, patinaje y balance)
+#
+# Los canales por rueda (LF_/RF_/LR_/RR_) se apilan en arrays (rueda x muestra) y todas
+# las métricas se calculan con reducciones segmentadas sobre los tramos de cada vuelta
+# (mismos tramos que lap_stats), sin bucles por vuelta.
+
+from lap_stats import lap_segments
+from lazy_imports import lazy_import
+from plotter import GRAVITY
+from profiling import profiled
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+CORNERS = ('LF', 'RF', 'LR', 'RR')
+FRONT, REAR = (0, 1), (2, 3) # Índices de rueda en CORNERS
+TYRE_CHANNELS = ('Temp_Surface', 'Temp_Inner', 'Pressure', 'Wear', 'SlipAngle', 'WheelRPM', 'RideHeight')
+
+DEFAULT_WHEEL_RADIUS_M = 0.34 # Radio de rodadura (m) para convertir RPM de rueda a velocidad
+MIN_SLIP_SPEED_MS = 5.0 # Por debajo de esta velocidad no se evalúa el ratio de deslizamiento
+WHEELSPIN_SLIP_RATIO = 0.10 # Rueda > 10% más rápida que el coche -> patinaje
+LOCKUP_SLIP_RATIO = -0.10 # Rueda > 10% más lenta que el coche -> bloqueo
+CORNERING_MIN_G = 0.5 # Muestras con |G lateral| >= umbral cuentan para el balance de deriva
+STINT_REFUEL_L = 1.0 # Subida de combustible entre vueltas que indica parada en boxes
+STINT_WEAR_RESET = 1e-4 # Bajada de desgaste entre vueltas que indica cambio de neumáticos
+
+
+def stack_corner_channels(df, channels=TYRE_CHANNELS):
+    """
+    Apila los canales por rueda en arrays (4, n) en el orden de CORNERS.
+
+    Returns:
+        dict: {canal: np.ndarray (4, n)}; filas NaN si falta la columna de esa rueda.
+    """
+    n = len(df); stacked = {}
+    for channel in channels:
+        arr = np.full((len(CORNERS), n), np.nan)
+        for i, corner in enumerate(CORNERS):
+            col = f"{corner}_{channel}"
+            if col in df.columns: arr[i] = df[col].to_numpy(dtype=float, na_value=np.nan)
+        stacked[channel] = arr
+    return stacked
+
+
+def vehicle_speed_ms(df):
+    """Velocidad del vehículo en m/s ('Speed_ms' o 'Speed' en Kmh)."""
+    if 'Speed_ms' in df.columns: return df['Speed_ms'].to_numpy(dtype=float, na_value=np.nan)
+    return df['Speed'].to_numpy(dtype=float, na_value=np.nan) / 3.6
+
+
+def wheel_slip_ratio(wheel_rpm, speed_ms, wheel_radius_m=DEFAULT_WHEEL_RADIUS_M):
+    """
+    Ratio de deslizamiento longitudinal (v_rueda - v_coche) / v_coche para cada rueda.
+
+    Args:
+        wheel_rpm (np.ndarray): (4, n) RPM de rueda.
+        speed_ms (np.ndarray): (n,) velocidad del coche en m/s.
+
+    Returns:
+        np.ndarray: (4, n); NaN a baja velocidad.
+    """
+    wheel_speed = wheel_rpm * (2.0 * np.pi * wheel_radius_m / 60.0)
+    valid_speed = np.where(speed_ms >= MIN_SLIP_SPEED_MS, speed_ms, np.nan)
+    return (wheel_speed - valid_speed[None, :]) / valid_speed[None, :]
+
+
+def _rising_edges(mask, first_row):
+    """Flancos de subida por fila (4, n); la primera fila de cada vuelta no abre evento."""
+    edges = np.zeros_like(mask)
+    edges[:, 1:] = mask[:, 1:] & ~mask[:, :-1]
+    edges[:, first_row] = False
+    return edges
+
+
+def _seg_nan_stat(arr, starts, how):
+    """Reducción segmentada (4, n) -> (4, n_laps) ignorando NaN ('mean', 'min' o 'max')."""
+    finite = np.isfinite(arr); counts = np.add.reduceat(finite, starts, axis=1)
+    if how == 'mean': result = np.add.reduceat(np.where(finite, arr, 0.0), starts, axis=1) / np.where(counts > 0, counts, 1)
+    elif how == 'min': result = np.minimum.reduceat(np.where(finite, arr, np.inf), starts, axis=1)
+    else: result = np.maximum.reduceat(np.where(finite, arr, -np.inf), starts, axis=1)
+    return np.where(counts > 0, result, np.nan)
+
+
+@profiled("tyre_lap_stats")
+def compute_tyre_lap_stats(df, laps_info_df=None, wheel_radius_m=DEFAULT_WHEEL_RADIUS_M):
+    """
+    Métricas por vuelta y rueda.
+
+    Returns:
+        pandas.DataFrame: Filas (Lap, Corner) con ventanas de temperatura/presión, desgaste,
+        deriva media y eventos de patinaje/bloqueo.
+    """
+    if not df['Time'].is_monotonic_increasing: df = df.sort_values('Time', kind='stable')
+    lap_numbers, starts, ends = lap_segments(df, laps_info_df)
+    keep = ends > starts; lap_numbers, starts, ends = lap_numbers[keep], starts[keep], ends[keep]
+    if len(starts) == 0: return pd.DataFrame()
+    tyres = stack_corner_channels(df)
+    first_row = np.zeros(len(df), dtype=bool); first_row[starts] = True
+
+    slip = wheel_slip_ratio(tyres['WheelRPM'], vehicle_speed_ms(df), wheel_radius_m)
+    with np.errstate(invalid='ignore'):
+        spin_events = np.add.reduceat(_rising_edges(slip > WHEELSPIN_SLIP_RATIO, first_row), starts, axis=1)
+        lock_events = np.add.reduceat(_rising_edges(slip < LOCKUP_SLIP_RATIO, first_row), starts, axis=1)
+
+    wear = tyres['Wear']
+    columns = {
+        'TempSurfMean': _seg_nan_stat(tyres['Temp_Surface'], starts, 'mean'),
+        'TempSurfMin': _seg_nan_stat(tyres['Temp_Surface'], starts, 'min'),
+        'TempSurfMax': _seg_nan_stat(tyres['Temp_Surface'], starts, 'max'),
+        'TempInnerMean': _seg_nan_stat(tyres['Temp_Inner'], starts, 'mean'),
+        'PressureMean': _seg_nan_stat(tyres['Pressure'], starts, 'mean'),
+        'PressureMin': _seg_nan_stat(tyres['Pressure'], starts, 'min'),
+        'PressureMax': _seg_nan_stat(tyres['Pressure'], starts, 'max'),
+        'WearStart': wear[:, starts], 'WearEnd': wear[:, ends - 1],
+        'SlipAngleMeanDeg': np.degrees(_seg_nan_stat(np.abs(tyres['SlipAngle']), starts, 'mean')),
+        'WheelspinEvents': spin_events, 'LockupEvents': lock_events,
+    }
+    n_laps = len(lap_numbers)
+    # (4, n_laps) -> filas ordenadas por vuelta y luego rueda
+    result = pd.DataFrame({'Lap': np.repeat(lap_numbers, len(CORNERS)),
+                           'Corner': pd.Categorical(np.tile(CORNERS, n_laps), categories=CORNERS, ordered=True)})
+    for name, values in columns.items(): result[name] = values.T.ravel()
+    result['WearDelta'] = result['WearEnd'] - result['WearStart']
+    return result
+
+
+@profiled("tyre_slip_balance")
+def compute_slip_balance(df, laps_info_df=None):
+    """
+    Balance de deriva delantero/trasero por vuelta en curva (|G lat| >= CORNERING_MIN_G).
+    SlipBalanceDeg > 0: el eje delantero desliza más (tendencia subviradora).
+    """
+    if not df['Time'].is_monotonic_increasing: df = df.sort_values('Time', kind='stable')
+    lap_numbers, starts, ends = lap_segments(df, laps_info_df)
+    keep = ends > starts; lap_numbers, starts = lap_numbers[keep], starts[keep]
+    if len(starts) == 0: return pd.DataFrame(columns=['Lap', 'FrontSlipDeg', 'RearSlipDeg', 'SlipBalanceDeg'])
+    slip = np.abs(stack_corner_channels(df, ('SlipAngle',))['SlipAngle'])
+    if 'G_Lat' in df.columns:
+        cornering = np.abs(df['G_Lat'].to_numpy(dtype=float, na_value=np.nan)) >= CORNERING_MIN_G * GRAVITY
+        slip = np.where(cornering[None, :], slip, np.nan)
+    def axle_mean(rows):
+        finite = np.isfinite(slip[list(rows)]); counts = finite.sum(axis=0)
+        return np.where(counts > 0, np.where(finite, slip[list(rows)], 0.0).sum(axis=0) / np.maximum(counts, 1), np.nan)
+    axle_slip = np.vstack([axle_mean(FRONT), axle_mean(REAR)])
+    per_lap = np.degrees(_seg_nan_stat(axle_slip, starts, 'mean'))
+    return pd.DataFrame({'Lap': lap_numbers, 'FrontSlipDeg': per_lap[0], 'RearSlipDeg': per_lap[1], 'SlipBalanceDeg': per_lap[0] - per_lap[1]})
+
+
+def detect_stints(tyre_lap_df, df=None, laps_info_df=None):
+    """
+    Asigna un número de stint a cada vuelta: nuevo stint si baja el desgaste (cambio de neumáticos)
+    o sube el combustible (repostaje) respecto a la vuelta anterior.
+
+    Returns:
+        pandas.Series: Stint (1..N) indexado por Lap.
+    """
+    wear = tyre_lap_df.groupby('Lap', sort=True)[['WearStart', 'WearEnd']].mean()
+    new_stint = (wear['WearStart'].to_numpy() < wear['WearEnd'].shift(1).to_numpy() - STINT_WEAR_RESET)
+    if df is not None and 'Fuel' in df.columns:
+        lap_numbers, starts, ends = lap_segments(df, laps_info_df); keep = ends > starts
+        fuel = df['Fuel'].to_numpy(dtype=float, na_value=np.nan)
+        fuel_by_lap = pd.DataFrame({'start': fuel[starts[keep]], 'end': fuel[ends[keep] - 1]}, index=lap_numbers[keep]).reindex(wear.index)
+        new_stint |= (fuel_by_lap['start'].to_numpy() > fuel_by_lap['end'].shift(1).to_numpy() + STINT_REFUEL_L)
+    return pd.Series(np.cumsum(new_stint) + 1, index=wear.index, name='Stint')
+
+
+def compute_stint_summary(tyre_lap_df, stints, laps_info_df=None):
+    """
+    Ventanas de temperatura/presión y tasa de desgaste por stint y rueda.
+    La tasa de desgaste es la pendiente (desgaste por vuelta) del ajuste lineal sobre las vueltas cronometradas.
+    """
+    data = tyre_lap_df.merge(stints.rename('Stint'), left_on='Lap', right_index=True)
+    if laps_info_df is not None and not laps_info_df.empty:
+        timed = laps_info_df.loc[laps_info_df['LapType'] == 'Timed Lap', 'Lap']
+        if not timed.empty: data = data[data['Lap'].isin(timed)]
+    grouped = data.groupby(['Stint', 'Corner'], sort=True, observed=True)
+    summary = grouped.agg(Laps=('Lap', 'nunique'), TempSurfMin=('TempSurfMin', 'min'), TempSurfMean=('TempSurfMean', 'mean'),
+                          TempSurfMax=('TempSurfMax', 'max'), PressureMin=('PressureMin', 'min'),
+                          PressureMean=('PressureMean', 'mean'), PressureMax=('PressureMax', 'max'),
+                          WearTotal=('WearDelta', 'sum'), WheelspinEvents=('WheelspinEvents', 'sum'),
+                          LockupEvents=('LockupEvents', 'sum'))
+    # Pendiente por mínimos cuadrados con sumas agrupadas: cov(lap, wear) / var(lap)
+    data = data.assign(_x=data['Lap'].astype(float), _y=data['WearEnd'])
+    data = data.assign(_xy=data['_x'] * data['_y'], _xx=data['_x'] ** 2)
+    sums = data.groupby(['Stint', 'Corner'], sort=True, observed=True)[['_x', '_y', '_xy', '_xx']].mean()
+    var_x = sums['_xx'] - sums['_x'] ** 2
+    summary['WearPerLap'] = np.where(var_x > 0, (sums['_xy'] - sums['_x'] * sums['_y']) / var_x.where(var_x > 0, 1.0), summary['WearTotal'])
+    return summary.reset_index()
+
+
+def analyze_tyres(df, laps_info_df=None, wheel_radius_m=DEFAULT_WHEEL_RADIUS_M):
+    """
+    Análisis completo de neumáticos.
+
+    Returns:
+        dict: {'laps': por vuelta y rueda, 'balance': balance de deriva por vuelta,
+               'stints': stint de cada vuelta, 'stint_summary': ventanas y desgaste por stint y rueda}
+    """
+    if not df['Time'].is_monotonic_increasing: df = df.sort_values('Time', kind='stable')
+    tyre_laps = compute_tyre_lap_stats(df, laps_info_df, wheel_radius_m)
+    if tyre_laps.empty: return {'laps': tyre_laps, 'balance': pd.DataFrame(), 'stints': pd.Series(dtype=int), 'stint_summary': pd.DataFrame()}
+    stints = detect_stints(tyre_laps, df, laps_info_df)
+    return {'laps': tyre_laps, 'balance': compute_slip_balance(df, laps_info_df), 'stints': stints,
+            'stint_summary': compute_stint_summary(tyre_laps, stints, laps_info_df)}